@@ -1,14 +1,29 @@
 import argparse
+import functools
 import logging
 import re
+import weakref
 from datetime import datetime
 from pathlib import Path
 from typing import Literal
 
+import prsv_tools.utility.bag as prsvbag
 import prsv_tools.utility.cli as prsvcli
+import prsv_tools.utility.lint as prsvlint
+import prsv_tools.utility.tree as prsvtree
 
 LOGGER = logging.getLogger(__name__)
 
+# one match per name finds every naming issue, each lookahead is optional
+DATA_NAME_ISSUES = re.compile(
+    r"(?=.*?(?P<part>p\d\d))?"
+    r"(?=.*?(?P<stream>s\d\d))?"
+    r"(?=.*?(?P<region>r(?:0[3-9]|[1-9]\d)))?"
+)
+UNCOMPRESSED_TYPES = [".mov", ".wav"]
+
+_DATA_FILE_ISSUES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
 
 def _configure_logging(log_folder: Path):
     log_fn = datetime.now().strftime("lint_%Y_%m_%d_%H_%M.log")
@@ -28,11 +43,19 @@ def parse_args() -> argparse.Namespace:
     parser.add_package()
     parser.add_packagedirectory()
     parser.add_logdirectory()
+    parser.add_workers()
+    parser.add_cachedirectory()
+    parser.add_lintreport()
+    parser.add_argument(
+        "--verify_bags",
+        action="store_true",
+        help="Optional. Also check every payload file against the bag manifests",
+    )
     return parser.parse_args()
 
 
-def package_has_valid_name(package: Path) -> bool:
-    """Top level folder name has to conform to """
+def package_has_valid_name(package: Path | prsvtree.PackageTree) -> bool:
+    """Top level folder name has to conform to"""
     folder_name = package.name
     match = re.fullmatch(r"\d{6,7}", folder_name)
     if match:
@@ -42,64 +65,86 @@ def package_has_valid_name(package: Path) -> bool:
         return False
 
 
-def package_has_valid_subfolder_names(package: Path) -> bool:
+def package_has_valid_subfolder_names(package: Path | prsvtree.PackageTree) -> bool:
     """Second level folders must have data and may have tags folder"""
+    package = prsvtree.as_tree(package)
     expected = set(["data", "tags"])
-    found = set([x.name for x in package.iterdir() if x.is_dir()])
+    found = set([x.name for x in package.children() if x.is_dir])
     if found <= expected and "data" in found:
         return True
     else:
         LOGGER.error(
-            f"{package.name} data folders should only be {', '.join(expected)}, found {found}"
+            f"{package.name} data folders should only be {', '.join(expected)}, found {found}",
+            extra={
+                "paths": [x.path for x in package.children() if x.name not in expected]
+            },
         )
         return False
 
 
-def data_folder_has_valid_subfolders(package: Path) -> bool:
+def data_folder_has_valid_subfolders(package: Path | prsvtree.PackageTree) -> bool:
     """Third level folders must have objects and metadata folder"""
+    package = prsvtree.as_tree(package)
     expected = set(
         ["PreservationMasters", "Mezzanines", "EditMasters", "ServiceCopies", "Images"]
     )
-    found = set([x.name for x in (package / "data").iterdir() if x.is_dir()])
+    found = set([x.name for x in package.children("data") if x.is_dir])
     if found <= expected:
         return True
     else:
         LOGGER.error(
-            f"{package.name} data folders should only be {', '.join(expected)} should have data and tags, found {found}"
+            f"{package.name} data folders should only be {', '.join(expected)} should have data and tags, found {found}",
+            extra={
+                "paths": [
+                    x.path
+                    for x in package.children("data")
+                    if x.is_dir and x.name not in expected
+                ]
+            },
         )
         return False
 
 
-def data_folder_has_valid_servicecopies_subfolder(package: Path) -> bool:
+def data_folder_has_valid_servicecopies_subfolder(
+    package: Path | prsvtree.PackageTree,
+) -> bool:
     """Third level folders must include a ServiceCopies folder"""
-    if (package / "data" / "ServiceCopies").exists():
+    package = prsvtree.as_tree(package)
+    if package.exists("data/ServiceCopies"):
         return True
     else:
         LOGGER.error(
-            f"{package.name} does not have a ServiceCopies folder, service files should be created"
+            f"{package.name} does not have a ServiceCopies folder, service files should be created",
+            extra={"paths": [package.root / "data"]},
         )
         return False
 
 
-def data_folder_has_no_empty_folder(package: Path) -> bool:
+def data_folder_has_no_empty_folder(package: Path | prsvtree.PackageTree) -> bool:
     """The data folder should not have any empty folders"""
-    objects_path = package / "data"
-    for i in objects_path.rglob("*"):
-        if i.is_dir() and not any(i.iterdir()):
-            LOGGER.error(f"{package.name} has empty folder in this package: {i.name}")
+    package = prsvtree.as_tree(package)
+    for i in package.walk("data"):
+        if i.is_dir and package.is_empty(i.relpath):
+            LOGGER.error(
+                f"{package.name} has empty folder in this package: {i.name}",
+                extra={"paths": [i.path]},
+            )
             return False
     return True
 
 
-def data_files_are_expected_types(package: Path) -> bool:
+def data_files_are_expected_types(package: Path | prsvtree.PackageTree) -> bool:
     """The data folder can only have media files, json, and carrier photograph(s)"""
-    data_path = package / "data"
-    data_file_ls = [x for x in data_path.iterdir() if x.is_file()]
+    package = prsvtree.as_tree(package)
+    data_file_ls = [x.path for x in package.children("data") if x.is_file]
     expected = True
     expected_types = [".mkv", ".flac", ".json", ".jpeg", ".jpg", ".dv", ".mov"]
     for file in data_file_ls:
         if not file.suffix.lower() in expected_types:
-            LOGGER.error(f"{package.name} has unexpected file {file.name}")
+            LOGGER.error(
+                f"{package.name} has unexpected file {file.name}",
+                extra={"paths": [file]},
+            )
             expected = False
     if not expected:
         return False
@@ -107,39 +152,43 @@ def data_files_are_expected_types(package: Path) -> bool:
         return True
 
 
-def tags_folder_is_flat(package: Path) -> bool:
+def tags_folder_is_flat(package: Path | prsvtree.PackageTree) -> bool:
     """The tags folder should not have folder structure"""
-    metadata_path = package / "tags"
-    if not metadata_path.exists():
+    package = prsvtree.as_tree(package)
+    if not package.exists("tags"):
         return True
-    md_dir_ls = [x for x in metadata_path.iterdir() if x.is_dir()]
+    md_dir_ls = [x.path for x in package.children("tags") if x.is_dir]
     if md_dir_ls:
-        LOGGER.error(f"{package.name} has unexpected directory: {md_dir_ls}")
+        LOGGER.error(
+            f"{package.name} has unexpected directory: {md_dir_ls}",
+            extra={"paths": md_dir_ls},
+        )
         return False
     else:
         return True
 
 
-def tags_folder_has_one_to_four_files(package: Path) -> bool:
+def tags_folder_has_one_to_four_files(package: Path | prsvtree.PackageTree) -> bool:
     """The metadata folder should have zero to 3 files"""
-    tags_path = package / "tags"
-    if not tags_path.exists():
+    package = prsvtree.as_tree(package)
+    if not package.exists("tags"):
         return True
-    md_file_ls = [x for x in tags_path.iterdir() if x.is_file()]
+    md_file_ls = [x.path for x in package.children("tags") if x.is_file]
     if len(md_file_ls) > 3:
         LOGGER.warning(
-            f"{package.name} has more than four files in the metadata folder: {md_file_ls}"
+            f"{package.name} has more than four files in the metadata folder: {md_file_ls}",
+            extra={"paths": md_file_ls},
         )
         return False
     else:
         return True
 
 
-def tag_file_is_expected_types(package: Path) -> bool:
+def tag_file_is_expected_types(package: Path | prsvtree.PackageTree) -> bool:
     """The metadata folder can only have FTK report and/or carrier photograph(s)"""
-    tags_path = package / "tags"
-    if tags_path.exists():
-        md_file_ls = [x for x in tags_path.iterdir() if x.is_file()]
+    package = prsvtree.as_tree(package)
+    if package.exists("tags"):
+        md_file_ls = [x.path for x in package.children("tags") if x.is_file]
     else:
         return True
     expected = True
@@ -149,16 +198,21 @@ def tag_file_is_expected_types(package: Path) -> bool:
             parts = file.stem.split(".")
             if "mkv" not in parts and "dv" not in parts:
                 LOGGER.warning(
-                    f"{package.name} has a gz file of an untracked category: {file.name}"
+                    f"{package.name} has a gz file of an untracked category: {file.name}",
+                    extra={"paths": [file]},
                 )
                 expected = False
         if file.suffix.lower() == ".txt" and not file.name.endswith("timecodes.txt"):
             LOGGER.warning(
-                f"{package.name} has a txt file of an untracked category: {file.name}"
+                f"{package.name} has a txt file of an untracked category: {file.name}",
+                extra={"paths": [file]},
             )
             expected = False
         if not file.suffix.lower() in expected_types:
-            LOGGER.error(f"{package.name} has unexpected file {file.name}")
+            LOGGER.error(
+                f"{package.name} has unexpected file {file.name}",
+                extra={"paths": [file]},
+            )
             expected = False
     if not expected:
         return False
@@ -166,125 +220,174 @@ def tag_file_is_expected_types(package: Path) -> bool:
         return True
 
 
-def data_folder_has_no_uncompressed_formats(package: Path) -> bool:
+def classify_data_files(package: prsvtree.PackageTree) -> dict[str, list[Path]]:
+    """sort every name in the data folder by naming issue in one pass,
+    the result is kept for as long as the package index is"""
+    if package in _DATA_FILE_ISSUES:
+        return _DATA_FILE_ISSUES[package]
+
+    issues = {"uncompressed": [], "part": [], "stream": [], "region": []}
+    for entry in package.walk("data"):
+        uncompressed = entry.path.suffix.lower() in UNCOMPRESSED_TYPES
+        # mezzanines are expected to be mov
+        if uncompressed and not entry.name.endswith("mz.mov"):
+            issues["uncompressed"].append(entry.path)
+        for issue, found in DATA_NAME_ISSUES.match(entry.name).groupdict().items():
+            if found:
+                issues[issue].append(entry.path)
+
+    _DATA_FILE_ISSUES[package] = issues
+    return issues
+
+
+def data_folder_has_no_uncompressed_formats(
+    package: Path | prsvtree.PackageTree,
+) -> bool:
     """no wav or mov files should be ingested, transcode first"""
-    data_path = package / "data"
-    uncompressed_files = [
-        x for x in data_path.rglob("*") if x.suffix.lower() in [".mov", ".wav"]
-    ]
-    # filter out mezzanines
-    uncompressed_files = [
-        x for x in uncompressed_files if not str(x).endswith("mz.mov")
-    ]
+    package = prsvtree.as_tree(package)
+    uncompressed_files = classify_data_files(package)["uncompressed"]
     if uncompressed_files:
         LOGGER.error(
-            f"{package.name} has uncompressed format files, {uncompressed_files}."
+            f"{package.name} has uncompressed format files, {uncompressed_files}.",
+            extra={"paths": uncompressed_files},
         )
         return False
     else:
         return True
 
 
-def data_folder_has_no_part_files(package: Path) -> bool:
+def data_folder_has_no_part_files(package: Path | prsvtree.PackageTree) -> bool:
     """no media file should be a 'part' file, e.g. div_id_v##..p##_"""
-    data_path = package / "data"
-    part_files = [x for x in data_path.rglob("*") if re.search(r"p\d\d", x.name)]
+    package = prsvtree.as_tree(package)
+    part_files = classify_data_files(package)["part"]
     if part_files:
-        LOGGER.error(f"{package.name} has part files, {part_files}.")
+        LOGGER.error(
+            f"{package.name} has part files, {part_files}.",
+            extra={"paths": part_files},
+        )
         return False
     else:
         return True
 
 
-def data_folder_uses_streams(package: Path) -> bool:
+def data_folder_uses_streams(package: Path | prsvtree.PackageTree) -> bool:
     """streams should be flagged to check service file"""
-    data_path = package / "data"
-    stream_files = [x for x in data_path.rglob("*") if re.search(r"s\d\d", x.name)]
+    package = prsvtree.as_tree(package)
+    stream_files = classify_data_files(package)["stream"]
 
     if stream_files:
-        LOGGER.warning(f"{package.name} has streams, {stream_files}.")
+        LOGGER.warning(
+            f"{package.name} has streams, {stream_files}.",
+            extra={"paths": stream_files},
+        )
         return False
     else:
         return True
 
 
-def region_files_used_correctly(package: Path) -> bool:
+def region_files_used_correctly(package: Path | prsvtree.PackageTree) -> bool:
     """media files shouldn't use region for stream"""
-    data_path = package / "data"
-    high_region_counts = [
-        x for x in data_path.rglob("*") if re.search(r"r(0[3-9]|[1-9]\d)", x.name)
-    ]
-    high_region_counts = [x for x in data_path.rglob("*") if re.search(r"r(0[3-9]|[1-9]\d)", x.name)]
+    package = prsvtree.as_tree(package)
+    high_region_counts = classify_data_files(package)["region"]
 
     if high_region_counts:
-        LOGGER.error(f"{package.name} has more than 2 regions, {high_region_counts}.")
+        LOGGER.error(
+            f"{package.name} has more than 2 regions, {high_region_counts}.",
+            extra={"paths": high_region_counts},
+        )
         return False
     else:
         return True
 
 
-def data_folders_have_at_least_two_files(package: Path) -> bool:
+def data_folders_have_at_least_two_files(package: Path | prsvtree.PackageTree) -> bool:
     """The data folders must have two or more files, which can be in folder(s)"""
-    objects_path = package / "data"
-    data_folders = [x for x in objects_path.iterdir() if x.is_dir()]
+    package = prsvtree.as_tree(package)
+    data_folders = [x for x in package.children("data") if x.is_dir]
     for folder_path in data_folders:
         if folder_path.name in ["Images", "ServiceCopies"]:
             continue
-        data_filepaths = []
-        data_filepaths = [x for x in folder_path.rglob("*") if x.is_file()]
+        data_filepaths = [x.path for x in package.files(folder_path.relpath)]
         if len(data_filepaths) < 2:
             LOGGER.error(
-                f"{package.name} {folder_path.name} does not have 2 or more files: {data_filepaths}"
+                f"{package.name} {folder_path.name} does not have 2 or more files: {data_filepaths}",
+                extra={"paths": [folder_path.path]},
             )
             return False
     return True
 
 
-def package_is_a_bag(package: Path) -> bool:
+def package_is_a_bag(package: Path | prsvtree.PackageTree) -> bool:
     """The whole package should be a bag"""
-    if not (package / "bagit.txt").exists():
+    package = prsvtree.as_tree(package)
+    if not package.exists("bagit.txt"):
         LOGGER.error(f"{package.name} is not a bag structure")
         return False
     else:
         return True
 
 
-def package_has_no_hidden_file(package: Path) -> bool:
+def package_bag_is_valid(package: Path | prsvtree.PackageTree) -> bool:
+    """The payload should match the bag manifests, every file is hashed"""
+    package = prsvtree.as_tree(package)
+    if not package.exists("bagit.txt"):
+        # reported by package_is_a_bag
+        return True
+    problems = prsvbag.validate_bag(
+        package, progress=prsvbag.log_progress(package.name)
+    )
+    for problem, paths in problems:
+        LOGGER.error(
+            f"{package.name} bag {problem}: {[x.name for x in paths]}",
+            extra={"paths": paths},
+        )
+    return not problems
+
+
+def package_has_no_hidden_file(package: Path | prsvtree.PackageTree) -> bool:
     """The package should not have any hidden or system file"""
+    package = prsvtree.as_tree(package)
     hidden_ls = [
-        h
-        for h in package.rglob("*")
+        h.path
+        for h in package.walk()
         if h.name.startswith(".") or h.name.startswith("Thumbs")
     ]
     if hidden_ls:
-        LOGGER.warning(f"{package.name} has hidden or system files {hidden_ls}")
+        LOGGER.warning(
+            f"{package.name} has hidden or system files {hidden_ls}",
+            extra={"paths": hidden_ls},
+        )
         return False
     else:
         return True
 
 
-def package_has_no_zero_bytes_file(package: Path) -> bool:
+def package_has_no_zero_bytes_file(package: Path | prsvtree.PackageTree) -> bool:
     """The package should not have any zero bytes file"""
-    all_file = [f for f in package.rglob("*") if f.is_file()]
-    zero_bytes_ls = [f for f in all_file if f.stat().st_size == 0]
+    package = prsvtree.as_tree(package)
+    zero_bytes_ls = [f.path for f in package.files() if f.size == 0]
     if zero_bytes_ls:
-        LOGGER.error(f"{package.name} has zero bytes file {zero_bytes_ls}")
+        LOGGER.error(
+            f"{package.name} has zero bytes file {zero_bytes_ls}",
+            extra={"paths": zero_bytes_ls},
+        )
         return False
     else:
         return True
 
 
-def lint_package(package: Path) -> Literal["valid", "invalid", "needs review"]:
-    """Run all linting tests against a package"""
-    result = "valid"
+def lint_result(
+    package: Path | prsvtree.PackageTree, verify_bags: bool = False
+) -> prsvlint.LintResult:
+    """Run all linting tests against a package, walking it only once,
+    and return the verdict with every failed test
+    verify_bags also hashes every payload file against the bag manifests"""
+    package = prsvtree.as_tree(package)
     less_strict_tests = [
         tags_folder_has_one_to_four_files,
         package_has_no_hidden_file,
         region_files_used_correctly,
     ]
-    for test in less_strict_tests:
-        if not test(package):
-            result = "needs review"
     strict_tests = [
         package_has_valid_name,
         package_has_valid_subfolder_names,
@@ -301,25 +404,52 @@ def lint_package(package: Path) -> Literal["valid", "invalid", "needs review"]:
         package_is_a_bag,
         package_has_no_zero_bytes_file,
     ]
-    for test in strict_tests:
-        if not test(package):
-            result = "invalid"
-    return result
-
-
-def lint_packages(packages: Path):
+    if verify_bags:
+        strict_tests.append(package_bag_is_valid)
+    return prsvlint.run_checks(package, strict_tests, less_strict_tests)
+
+
+def lint_package(
+    package: Path | prsvtree.PackageTree,
+) -> Literal["valid", "invalid", "needs review"]:
+    """Run all linting tests against a package, walking it only once"""
+    return lint_result(package).verdict
+
+
+def lint_results(
+    packages: list[Path],
+    workers: int = 1,
+    cache_dir: Path | None = None,
+    verify_bags: bool = False,
+) -> list[prsvlint.LintResult]:
+    """Lint packages in sorted order, returning the result of each"""
+    lint = (
+        functools.partial(lint_result, verify_bags=True) if verify_bags else lint_result
+    )
+    if cache_dir:
+        lint = prsvlint.CachedLint(lint, cache_dir)
+    results = [x for _, x in prsvlint.lint_in_pool(lint, packages, workers)]
+    for result in results:
+        LOGGER.info(f"{result.verdict}, {result.package}")
+    return results
+
+
+def lint_packages(
+    packages: list[Path],
+    workers: int = 1,
+    cache_dir: Path | None = None,
+    verify_bags: bool = False,
+):
     valid = []
     invalid = []
     needs_review = []
-    for package in sorted(packages):
-        result = lint_package(package)
-        LOGGER.info(f"{result}, {package}")
-        if result == "valid":
-            valid.append(package)
-        elif result == "invalid":
-            invalid.append(package)
+    for result in lint_results(packages, workers, cache_dir, verify_bags):
+        if result.verdict == "valid":
+            valid.append(result.package)
+        elif result.verdict == "invalid":
+            invalid.append(result.package)
         else:
-            needs_review.append(package)
+            needs_review.append(result.package)
 
     return invalid, needs_review, valid
 
@@ -328,7 +458,15 @@ def main():
     args = parse_args()
     _configure_logging(args.log_folder)
 
-    invalid, needs_review, valid = lint_packages(args.packages)
+    results = lint_results(
+        args.packages, args.workers, args.cache_dir, args.verify_bags
+    )
+    if args.report:
+        prsvlint.write_report(results, args.report)
+
+    valid = [x.package for x in results if x.verdict == "valid"]
+    invalid = [x.package for x in results if x.verdict == "invalid"]
+    needs_review = [x.package for x in results if x.verdict == "needs review"]
 
     # print(f"\nTotal packages ran: {counter}")
     if valid:
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Literal
 
 import prsv_tools.utility.cli as prsvcli
+import prsv_tools.utility.lint as prsvlint
+import prsv_tools.utility.tree as prsvtree
 
 LOGGER = logging.getLogger(__name__)
 
@@ -33,11 +35,14 @@ def parse_args() -> argparse.Namespace:
     parser.add_package()
     parser.add_packagedirectory()
     parser.add_logdirectory()
+    parser.add_workers()
+    parser.add_cachedirectory()
+    parser.add_lintreport()
 
     return parser.parse_args()
 
 
-def package_has_valid_name(package: Path) -> bool:
+def package_has_valid_name(package: Path | prsvtree.PackageTree) -> bool:
     """Top level folder name has to conform to M###_(ER|DI|EM)_####"""
     folder_name = package.name
     match = re.fullmatch(r"M\d+_(ER|DI|EM)_\d+", folder_name)
@@ -49,187 +54,222 @@ def package_has_valid_name(package: Path) -> bool:
         return False
 
 
-def package_has_valid_subfolder_names(package: Path) -> bool:
+def package_has_valid_subfolder_names(package: Path | prsvtree.PackageTree) -> bool:
     """Second level folders must have objects and metadata folder
     It could also include an 'access' folder"""
+    package = prsvtree.as_tree(package)
     expected_a = set(["objects", "metadata"])
     expected_b = set(["objects", "metadata", "access"])
-    found = set([x.name for x in package.iterdir()])
+    found = set([x.name for x in package.children()])
 
     if found in [expected_a, expected_b]:
         return True
     else:
         LOGGER.error(
-            f"{package.name} subfolders should have objects and metadata and/or access, found {found}"
+            f"{package.name} subfolders should have objects and metadata and/or access, found {found}",
+            extra={
+                "paths": [
+                    x.path for x in package.children() if x.name not in expected_b
+                ]
+            },
         )
         return False
 
 
-def objects_folder_has_no_access_folder(package: Path) -> bool:
+def objects_folder_has_no_access_folder(
+    package: Path | prsvtree.PackageTree,
+) -> bool:
     """An access folder within the objects folder indicates it is an older package,
     and the files within the access folder was created by the Library,
     and should be worked on before being ingested"""
-    access_dir = package / "objects" / "access"
+    package = prsvtree.as_tree(package)
+    access_dir = package.root / "objects" / "access"
 
-    if access_dir.is_dir():
+    if package.is_dir("objects/access"):
         LOGGER.error(
-            f"{package.name} has an access folder in this package: {access_dir}"
+            f"{package.name} has an access folder in this package: {access_dir}",
+            extra={"paths": [access_dir]},
         )
         return False
     else:
         return True
 
 
-def objects_folder_has_no_empty_folder(package: Path) -> bool:
+def objects_folder_has_no_empty_folder(package: Path | prsvtree.PackageTree) -> bool:
     """The objects folder should not have any empty folders, which may indicate
     an incorrect FTK export"""
-    objects_path = package / "objects"
-    for i in objects_path.rglob("*"):
-        if i.is_dir() and not any(i.iterdir()):
-            LOGGER.error(f"{package.name} has empty folder in this package: {i.name}")
+    package = prsvtree.as_tree(package)
+    for i in package.walk("objects"):
+        if i.is_dir and package.is_empty(i.relpath):
+            LOGGER.error(
+                f"{package.name} has empty folder in this package: {i.name}",
+                extra={"paths": [i.path]},
+            )
             return False
 
     return True
 
 
-def metadata_folder_is_flat(package: Path) -> bool:
+def metadata_folder_is_flat(package: Path | prsvtree.PackageTree) -> bool:
     """The metadata folder should not have folder structure"""
-    metadata_path = package / "metadata"
-    md_dir_ls = [x for x in metadata_path.iterdir() if x.is_dir()]
+    package = prsvtree.as_tree(package)
+    md_dir_ls = [x.path for x in package.children("metadata") if x.is_dir]
     if md_dir_ls:
-        LOGGER.error(f"{package.name} has unexpected directory: {md_dir_ls}")
+        LOGGER.error(
+            f"{package.name} has unexpected directory: {md_dir_ls}",
+            extra={"paths": md_dir_ls},
+        )
         return False
     else:
         return True
 
 
-def metadata_folder_has_one_or_less_file(package: Path) -> bool:
+def metadata_folder_has_one_or_less_file(
+    package: Path | prsvtree.PackageTree,
+) -> bool:
     """The metadata folder should have zero to one file"""
-    metadata_path = package / "metadata"
-    md_file_ls = [x for x in metadata_path.iterdir() if x.is_file()]
+    package = prsvtree.as_tree(package)
+    md_file_ls = [x.path for x in package.children("metadata") if x.is_file]
     if len(md_file_ls) > 1:
         LOGGER.warning(
-            f"{package.name} has more than one file in the metadata folder: {md_file_ls}"
+            f"{package.name} has more than one file in the metadata folder: {md_file_ls}",
+            extra={"paths": md_file_ls},
         )
         return False
     else:
         return True
 
 
-def metadata_file_is_expected_types(package: Path) -> bool:
+def metadata_file_is_expected_types(package: Path | prsvtree.PackageTree) -> bool:
     """The metadata folder can only have FTK report and/or carrier photograph(s)"""
-    metadata_path = package / "metadata"
-    md_file_ls = [x for x in metadata_path.iterdir() if x.is_file()]
+    package = prsvtree.as_tree(package)
+    md_file_ls = [x.path for x in package.children("metadata") if x.is_file]
 
     expected_types = [".csv", ".tsv", ".jpg"]
     for file in md_file_ls:
         if file.suffix.lower() in expected_types:
             return True
         else:
-            LOGGER.error(f"{package.name} has unexpected file {file.name}")
+            LOGGER.error(
+                f"{package.name} has unexpected file {file.name}",
+                extra={"paths": [file]},
+            )
             return False
 
 
-def metadata_FTK_file_has_valid_filename(package: Path) -> bool:
+def metadata_FTK_file_has_valid_filename(
+    package: Path | prsvtree.PackageTree,
+) -> bool:
     """FTK metadata name should conform to M###_(ER|DI|EM)_####.[ct]sv"""
-    metadata_path = package / "metadata"
+    package = prsvtree.as_tree(package)
     ctsv_file_ls = [
-        x
-        for x in metadata_path.iterdir()
-        if x.is_file() and x.suffix.lower() in [".csv", ".tsv"]
+        x.path
+        for x in package.children("metadata")
+        if x.is_file and x.path.suffix.lower() in [".csv", ".tsv"]
     ]
 
     for ctsv in ctsv_file_ls:
         if re.fullmatch(r"M\d+_(ER|DI|EM)_\d+", ctsv.stem):
             return True
         else:
-            LOGGER.error(f"{package.name} has nonconforming FTK file, {ctsv.name}.")
+            LOGGER.error(
+                f"{package.name} has nonconforming FTK file, {ctsv.name}.",
+                extra={"paths": [ctsv]},
+            )
             return False
 
 
-def objects_folder_has_file(package: Path) -> bool:
+def objects_folder_has_file(package: Path | prsvtree.PackageTree) -> bool:
     """The objects folder must have one or more files, which can be in folder(s)"""
-    objects_path = package / "objects"
-    obj_filepaths = [x for x in objects_path.rglob("*") if x.is_file()]
+    package = prsvtree.as_tree(package)
+    obj_filepaths = package.files("objects")
 
     if not any(obj_filepaths):
-        LOGGER.error(f"{package.name} objects folder does not have any file")
+        LOGGER.error(
+            f"{package.name} objects folder does not have any file",
+            extra={"paths": [package.root / "objects"]},
+        )
         return False
     return True
 
 
-def package_has_no_bag(package: Path) -> bool:
+def package_has_no_bag(package: Path | prsvtree.PackageTree) -> bool:
     """The whole package should not contain any bag"""
-    if list(package.rglob("bagit.txt")):
-        LOGGER.error(f"{package.name} has bag structure")
+    package = prsvtree.as_tree(package)
+    bag_ls = [x.path for x in package.walk() if x.name == "bagit.txt"]
+    if bag_ls:
+        LOGGER.error(f"{package.name} has bag structure", extra={"paths": bag_ls})
         return False
     else:
         return True
 
 
-def package_has_no_hidden_file(package: Path) -> bool:
+def package_has_no_hidden_file(package: Path | prsvtree.PackageTree) -> bool:
     """The package should not have any hidden file"""
+    package = prsvtree.as_tree(package)
     hidden_ls = [
-        h
-        for h in package.rglob("*")
+        h.path
+        for h in package.walk()
         if h.name.startswith(".") or h.name.startswith("Thumbs")
     ]
     if hidden_ls:
-        LOGGER.warning(f"{package.name} has hidden files {hidden_ls}")
+        LOGGER.warning(
+            f"{package.name} has hidden files {hidden_ls}", extra={"paths": hidden_ls}
+        )
         return False
     else:
         return True
 
 
-def package_has_no_zero_bytes_file(package: Path) -> bool:
+def package_has_no_zero_bytes_file(package: Path | prsvtree.PackageTree) -> bool:
     """The package should not have any zero bytes file"""
-    all_file = [f for f in package.rglob("*") if f.is_file()]
-    zero_bytes_ls = [f for f in all_file if f.stat().st_size == 0]
+    package = prsvtree.as_tree(package)
+    zero_bytes_ls = [f.path for f in package.files() if f.size == 0]
     if zero_bytes_ls:
-        LOGGER.error(f"{package.name} has zero bytes file {zero_bytes_ls}")
+        LOGGER.error(
+            f"{package.name} has zero bytes file {zero_bytes_ls}",
+            extra={"paths": zero_bytes_ls},
+        )
         return False
     else:
         return True
 
 
-def access_files_match_with_objects(package: Path) -> bool:
+def access_files_match_with_objects(package: Path | prsvtree.PackageTree) -> bool:
     """Matching files in access folder with ones in objects folder"""
-    access_dir = package / "access"
-    objects_dir = package / "objects"
+    package = prsvtree.as_tree(package)
 
-    if not access_dir.exists():
+    if not package.exists("access"):
         LOGGER.info(f"{package.name} does not have access folder. It will be skipped")
         return True
     else:
-        access_fn = [
-            f.name for f in access_dir.rglob("*") if f.is_file()
-        ]  # accessfile.wpd.txt
-        access_fn_to_match = list()
-        objects_fn = [f.name for f in objects_dir.rglob("*") if f.is_file()]
-
-        for fn in access_fn:
-            match = re.match(r"(.+)\.+", fn)
-            access_fn_to_match.append(match.group(1))
+        access_files = package.files("access")  # accessfile.wpd.txt
+        objects_fn = [f.name for f in package.files("objects")]
 
         issue_ls = list()
+        issue_paths = list()
 
-        for matchfn in access_fn_to_match:
+        for access_file in access_files:
+            matchfn = re.match(r"(.+)\.+", access_file.name).group(1)
             if matchfn not in objects_fn:
                 issue_ls.append(matchfn)
+                issue_paths.append(access_file.path)
 
         if issue_ls:
             LOGGER.warning(
                 f"""These files have matching issues:
-                           {issue_ls}"""
+                           {issue_ls}""",
+                extra={"paths": issue_paths},
             )
             return False
         else:
             return True
 
 
-def lint_package(package: Path) -> Literal["valid", "invalid", "needs review"]:
-    """Run all linting tests against a package"""
-    result = "valid"
+def lint_result(package: Path | prsvtree.PackageTree) -> prsvlint.LintResult:
+    """Run all linting tests against a package, walking it only once,
+    and return the verdict with every failed test"""
+    package = prsvtree.as_tree(package)
 
     less_strict_tests = [
         metadata_folder_has_one_or_less_file,
@@ -237,10 +277,6 @@ def lint_package(package: Path) -> Literal["valid", "invalid", "needs review"]:
         access_files_match_with_objects,
     ]
 
-    for test in less_strict_tests:
-        if not test(package):
-            result = "needs review"
-
     strict_tests = [
         package_has_valid_name,
         package_has_valid_subfolder_names,
@@ -254,32 +290,56 @@ def lint_package(package: Path) -> Literal["valid", "invalid", "needs review"]:
         package_has_no_zero_bytes_file,
     ]
 
-    for test in strict_tests:
-        if not test(package):
-            result = "invalid"
+    return prsvlint.run_checks(package, strict_tests, less_strict_tests)
 
-    return result
 
+def lint_package(
+    package: Path | prsvtree.PackageTree,
+) -> Literal["valid", "invalid", "needs review"]:
+    """Run all linting tests against a package, walking it only once"""
+    return lint_result(package).verdict
+
+
+def lint_results(
+    packages: list[Path], workers: int = 1, cache_dir: Path | None = None
+) -> list[prsvlint.LintResult]:
+    """Lint packages in sorted order, returning the result of each"""
+    lint = prsvlint.CachedLint(lint_result, cache_dir) if cache_dir else lint_result
+    return [result for _, result in prsvlint.lint_in_pool(lint, packages, workers)]
 
-def main():
-    args = parse_args()
-    _configure_logging(args.log_folder)
 
+def lint_packages(
+    packages: list[Path], workers: int = 1, cache_dir: Path | None = None
+) -> tuple[list[Path], list[Path], list[Path]]:
+    """Lint packages in sorted order, returning invalid, needs review
+    and valid packages"""
     valid = []
     invalid = []
     needs_review = []
+    for result in lint_results(packages, workers, cache_dir):
+        if result.verdict == "valid":
+            valid.append(result.package)
+        elif result.verdict == "invalid":
+            invalid.append(result.package)
+        else:
+            needs_review.append(result.package)
 
-    counter = 0
+    return invalid, needs_review, valid
 
-    for package in args.packages:
-        counter += 1
-        result = lint_package(package)
-        if result == "valid":
-            valid.append(package.name)
-        elif result == "invalid":
-            invalid.append(package.name)
-        else:
-            needs_review.append(package.name)
+
+def main():
+    args = parse_args()
+    _configure_logging(args.log_folder)
+
+    results = lint_results(args.packages, args.workers, args.cache_dir)
+    if args.report:
+        prsvlint.write_report(results, args.report)
+
+    valid = [x.package.name for x in results if x.verdict == "valid"]
+    invalid = [x.package.name for x in results if x.verdict == "invalid"]
+    needs_review = [x.package.name for x in results if x.verdict == "needs review"]
+
+    counter = len(valid) + len(invalid) + len(needs_review)
     print(f"\nTotal packages ran: {counter}")
     if valid:
         print(
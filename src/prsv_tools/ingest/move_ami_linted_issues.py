@@ -1,13 +1,41 @@
 import argparse
 import logging
-import shutil
 from pathlib import Path
 
 import prsv_tools.ingest.lint_ami as prsvlintami
 import prsv_tools.utility.cli as prsvcli
+import prsv_tools.utility.lint as prsvlint
+import prsv_tools.utility.move as prsvmove
 
 logging.basicConfig(level=logging.INFO)
 
+# failed lint check and the folder it is moved to, the first failed check
+# in this order decides where a package goes
+ROUTES = {
+    "data_folder_has_valid_servicecopies_subfolder": "create_scs",
+    "package_has_valid_name": "no_valid_name",
+    "package_has_valid_subfolder_names": "need_valid_subfolder_name",
+    "data_folder_has_valid_subfolders": "need_valid_subfolders",
+    "data_folder_has_no_empty_folder": "empty_folders",
+    "data_files_are_expected_types": "unexpected_file_types",
+    "tags_folder_is_flat": "tags_subfolder",
+    "tags_folder_has_one_to_four_files": "tags_invalid_file_count",
+    "tag_file_is_expected_types": "tags_unexpected_file_types",
+    "data_folder_has_no_uncompressed_formats": "uncompressed_files",
+    "data_folder_has_no_part_files": "has_parts",
+    "data_folders_have_at_least_two_files": "invalid_file_count",
+    "package_is_a_bag": "not_bagged",
+    "package_bag_is_valid": "bag_not_valid",
+    "package_has_no_zero_bytes_file": "0byte_files",
+    "region_files_used_correctly": "multiple_regions",
+    "data_folder_uses_streams": "has_streams",
+    "package_has_no_hidden_file": "has_hidden_files",
+}
+
+# checks that only decide where a package goes, lint_ami does not run them
+# for its verdict, so they are run on the package when it is routed
+ROUTE_ONLY_CHECKS = [prsvlintami.data_files_are_expected_types]
+
 
 def parse_args() -> argparse.Namespace:
     """Validate and return command-line args"""
@@ -23,7 +51,25 @@ def parse_args() -> argparse.Namespace:
         help="path to a destination directory",
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--lint_report",
+        type=Path,
+        help="""Optional. Move the packages of a report saved by lint_ami --report
+        instead of linting them again""",
+    )
+
+    parser.add_workers()
+
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Optional. Print where each package would go without moving any",
+    )
+
+    args = parser.parse_args()
+    if not args.packages and not args.lint_report:
+        parser.error("a package, a directory or a lint report is required")
+    return args
 
 
 def set_dir(base_dir: Path, package: Path, new_folder_name: str):
@@ -34,141 +80,105 @@ def set_dir(base_dir: Path, package: Path, new_folder_name: str):
 
     try:
         new_dir.mkdir(parents=True, exist_ok=True)
-        shutil.move(package, new_dir)
+        prsvmove.move(package, new_dir / package.name)
+    except OSError as e:
+        log_move(package, new_dir, e)
+    else:
+        log_move(package, new_dir)
+
+
+def log_move(package: Path, new_dir: Path, error: OSError | None = None):
+    if error is None:
         print(package, new_dir)
         logging.info(f"{package.name} has been moved to {new_dir}.")
-    except PermissionError:
+    elif isinstance(error, PermissionError):
         logging.error(f"{package.name} not moved - permission error.")
-    except shutil.Error:
+    elif isinstance(error, FileExistsError):
         logging.error(
             f"{package.name} not moved - file already exists in destination path."
         )
-
-
-def move_ifs(package: Path, destination: Path):
-    base_dir = destination
-    new_folder_name = ""
-    # pkg != valid sc subfolder
-    if prsvlintami.data_folder_has_valid_servicecopies_subfolder(package) == False:
-        new_folder_name = "create_scs"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # pkg != valid name
-    elif prsvlintami.package_has_valid_name(package) == False:
-        new_folder_name = "no_valid_name"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # pkg != valid subfolder name
-    elif prsvlintami.package_has_valid_subfolder_names(package) == False:
-        new_folder_name = "need_valid_subfolder_name"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # pkg != valid subfolders
-    elif prsvlintami.data_folder_has_valid_subfolders(package) == False:
-        new_folder_name = "need_valid_subfolders"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # has empty folders
-    elif prsvlintami.data_folder_has_no_empty_folder(package) == False:
-        new_folder_name = "empty_folders"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # unexpected file types
-    elif prsvlintami.data_files_are_expected_types(package) == False:
-        new_folder_name = "unexpected_file_types"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # tags does not have subfolders
-    elif prsvlintami.tags_folder_is_flat(package) == False:
-        new_folder_name = "tags_subfolder"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # tags folder != 0-3 files \\less strict
-    elif prsvlintami.tags_folder_has_one_to_four_files(package) == False:
-        new_folder_name = "tags_invalid_file_count"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # tags != expected file types
-    elif prsvlintami.tag_file_is_expected_types(package) == False:
-        new_folder_name = "tags_unexpected_file_types"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # uncompressed wavs/movs
-    elif prsvlintami.data_folder_has_no_uncompressed_formats(package) == False:
-        new_folder_name = "uncompressed_files"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # has parts
-    elif prsvlintami.data_folder_has_no_part_files(package) == False:
-        new_folder_name = "has_parts"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # pkg folder(s) have invalid file count
-    elif prsvlintami.data_folders_have_at_least_two_files(package) == False:
-        new_folder_name = "invalid_file_count"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # not bagged
-    elif prsvlintami.package_is_a_bag(package) == False:
-        new_folder_name = "not_bagged"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # has 0byte files
-    elif prsvlintami.package_has_no_zero_bytes_file(package) == False:
-        new_folder_name = "0byte_files"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # has multiple regions
-    elif prsvlintami.region_files_used_correctly(package) == False:
-        new_folder_name = "multiple_regions"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # has streams \\less strict
-    elif prsvlintami.data_folder_uses_streams(package) == False:
-        new_folder_name = "has_streams"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
-    # has hidden files \\less strict
-    elif prsvlintami.package_has_no_hidden_file(package) == False:
-        new_folder_name = "has_hidden_files"
-        result = set_dir(base_dir, package, new_folder_name)
-        return result, new_folder_name
-
     else:
+        logging.error(f"{package.name} not moved - {error}.")
+
+
+def route(result: prsvlint.LintResult) -> str | None:
+    """return the folder for the first failed check in ROUTES order, from the
+    lint result and the route only checks"""
+    failed = set(result.failed_checks)
+    for check in ROUTE_ONLY_CHECKS:
+        try:
+            if not check(result.package):
+                failed.add(check.__name__)
+        except FileNotFoundError:
+            # e.g. no data folder, which the lint result already names
+            continue
+    return next((folder for check, folder in ROUTES.items() if check in failed), None)
+
+
+def move_ifs(
+    package: Path, destination: Path, result: prsvlint.LintResult | None = None
+):
+    """move a package to the folder of its highest priority issue,
+    the package is only linted if no lint result is given"""
+    if result is None:
+        result = prsvlintami.lint_result(package)
+
+    new_folder_name = route(result)
+    if not new_folder_name:
         logging.error(f"{package} has not been moved.")
+        return None, None
+
+    result = set_dir(destination, package, new_folder_name)
+    return result, new_folder_name
+
+
+def plan_results(
+    results: list[prsvlint.LintResult], destination: Path
+) -> dict[Path, list[prsvmove.Move]]:
+    """plan the move of every package that is not valid to its route folder"""
+    moves = []
+    for result in results:
+        pkg = result.package
+        new_folder_name = route(result)
+        if not new_folder_name:
+            if result.verdict == "valid":
+                logging.info(f"{pkg} : VALID, has not been moved.")
+            else:
+                logging.error(f"{pkg} has not been moved.")
+            continue
+        new_dir = destination / new_folder_name / pkg.name[:3]
+        moves.append((pkg, new_dir / pkg.name))
+
+    return prsvmove.plan_moves(moves)
+
+
+def move_results(
+    results: list[prsvlint.LintResult],
+    destination: Path,
+    workers: int = 1,
+    dry_run: bool = False,
+) -> None:
+    plan = plan_results(results, destination)
+    if dry_run:
+        print(prsvmove.describe_plan(plan))
+        return
+
+    for move, error in prsvmove.run_moves(plan, workers):
+        log_move(move.source, move.target.parent, error)
 
 
 def main():
     args = parse_args()
 
-    invalid, needs_review, valid = prsvlintami.lint_packages(args.packages)
-
-    for pkg in valid:
-        logging.info(f"{pkg} : VALID, has not been moved.")
-
-    for pkg in invalid:
-        result = move_ifs(pkg, args.destination)
-        logging.info(f"{pkg} : INVALID, has been moved to {result[1]}.")
+    if args.lint_report:
+        results = prsvlint.read_report(args.lint_report)
+        if args.packages:
+            packages = set(x.resolve() for x in args.packages)
+            results = [x for x in results if x.package.resolve() in packages]
+    else:
+        results = prsvlintami.lint_results(args.packages, args.workers)
 
-    if pkg not in invalid and pkg in needs_review:
-        result = move_ifs(pkg, args.destination)
-        logging.info(f"{pkg} : NEEDS REVIEW, has been moved to {result[1]}.")
+    move_results(results, args.destination, args.workers, args.dry_run)
 
 
 if __name__ == "__main__":
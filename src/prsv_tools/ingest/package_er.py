@@ -65,7 +65,6 @@ import argparse
 # from tkinter import simpledialog
 import configparser
 import getopt
-import hashlib
 import io
 import json
 import logging
@@ -93,6 +92,9 @@ import lxml.etree
 import requests
 from boto3.s3.transfer import S3Transfer
 
+import prsv_tools.utility.api as prsvapi
+import prsv_tools.utility.checksum as prsvchecksum
+import prsv_tools.utility.staging as prsvstaging
 from prsv_tools.ingest.preservicatoken import securitytoken
 
 
@@ -183,8 +185,6 @@ list_replace = ["&amp;", "&lt;", "&gt;"]
 
 list_manifest_directories = []
 list_container = []
-list_folders_in_dir = []
-list_files_in_dir = []
 list_metadata_files = []
 list_unpacked_export_zips = []
 list_longest_path = []
@@ -237,13 +237,6 @@ list_sub_paths = []
 
 list_available_pres_extension = []
 
-list_excepted_files = []
-
-c_list_folders_in_dir = []
-c_list_files_in_dir = []
-
-list_contents_folder = []
-list_metadata_folder = []
 
 dict_fs_resources = []
 
@@ -302,8 +295,6 @@ dict_frh_m_files = {}
 def fReset_Lists_Dicts():
     list_manifest_directories.clear()
     list_container.clear()
-    list_files_in_dir.clear()
-    list_folders_in_dir.clear()
     list_metadata_files.clear()
     list_unpacked_export_zips.clear()
     list_longest_path.clear()
@@ -350,14 +341,6 @@ def fReset_Lists_Dicts():
 
     list_sub_paths.clear()
 
-    list_contents_folder.clear()
-    list_metadata_folder.clear()
-
-    c_list_folders_in_dir.clear()
-    c_list_files_in_dir.clear()
-
-    list_excepted_files.clear()
-
     dict_fs_resources.clear()
 
     dict_folder_folderlevel.clear()
@@ -413,6 +396,111 @@ def fReset_Lists_Dicts():
 ##########################################################################################################
 # Classes
 ##########################################################################################################
+class PackageJob(object):
+    # everything known about one package while its container is built, passed through
+    # the copy, scan, construct and opex stages so packages can be built concurrently
+
+    def __init__(self, package, workflow_type):
+        sub_r = "PackageJob"
+        self.package = package
+        self.workflow_type = workflow_type
+
+        array_package_breakdown = package.split("_")
+        if len(array_package_breakdown) != 3:
+            raise ValueError(
+                str(sub_r)
+                + " : package breakdown. The package name is not consistent "
+                + str(array_package_breakdown)
+            )
+        self.CMSCollectionID = array_package_breakdown[0]  # M#####_xx_xxxxx
+        self.FAComponentIdNo = package  # Mxxxxx_##_xxxxx
+        self.SOCategoryContainer = array_package_breakdown[1] + "Container"
+        self.SOCategoryContents = array_package_breakdown[1] + "Contents"
+        self.SOCategoryMetadata = array_package_breakdown[1] + "Metadata"
+        self.SOCategoryElement = array_package_breakdown[1] + "Element"
+        self.IOCategoryElement = array_package_breakdown[1] + "Element"
+        self.RecordNumber = array_package_breakdown[2]  # Mxxxxx_xx_#####
+        self.Ident_Biblio_Key = "SOCategory"
+
+        # Sub Folder Titles
+        self.opex_title_content = package + "_contents"
+        self.opex_title_metadata = package + "_metadata"
+
+        self.container = "Container_" + package + "_" + fTime()
+        self.sourcef_wf = os.path.join(sourcef, workflow_type)
+        self.sourcef_wf_package = os.path.join(self.sourcef_wf, package)
+        # the working folders are named after the package, as fGetPackages always
+        # did, so concurrent jobs never share a working root
+        self.workingf_wf = os.path.join(workingf, package)
+        self.workingf_wf_package = os.path.join(self.workingf_wf, package)
+        self.workingPAXf_wf = os.path.join(workingPAXf, package)
+        self.targetf_container = os.path.join(targetf, self.container)
+        self.targetf_container_wf = os.path.join(targetf, self.container, workflow_type)
+        self.targetf_container_wf_package = os.path.join(
+            self.targetf_container_wf, package
+        )
+
+        # filled by fScanSource_ApprovedFormats
+        self.list_contents_folder = []
+        self.list_metadata_folder = []
+        self.list_excepted_files = []
+
+        # seconds spent in each stage of fBuildPackage
+        self.timings = {}
+
+        # copies or links the package into the working and target folders,
+        # keeping the MD5 of every file for the OPEX fixities
+        self.stager = prsvstaging.Stager(["md5"], staging_mode)
+
+    def log_paths(self):
+        for name in [
+            "package",
+            "sourcef_wf",
+            "sourcef_wf_package",
+            "workingf_wf",
+            "workingf_wf_package",
+            "workingPAXf_wf",
+            "container",
+            "targetf_container",
+            "targetf_container_wf",
+            "targetf_container_wf_package",
+        ]:
+            root_logger.info("PackageJob : " + name + " " + str(getattr(self, name)))
+
+    def timed(self, stage, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0) + (
+                time.perf_counter() - start
+            )
+
+    def write_exceptions(self):
+        # one exceptions log per worker, a worker builds one package at a time
+        exceptions_file = os.path.join(
+            log_folder,
+            "Exceptions_" + threading.current_thread().name + "_" + run_time + ".log",
+        )
+        with open(exceptions_file, "a", encoding="utf-8") as Exceptions:
+            Exceptions.write("Exceptions file for package " + str(self.package) + "\n")
+            Exceptions.write(
+                "The following files have been removed from the opex package"
+            )
+            Exceptions.write("\n".join(self.list_excepted_files))
+            Exceptions.write("\n")
+
+    def remove_working_copy(self):
+        # only this package's working folder, other jobs may still be using theirs
+        if os.path.isdir(self.workingf_wf):
+            try:
+                shutil.rmtree(self.workingf_wf)
+            except OSError:
+                root_logger.warning(
+                    "PackageJob : Failed on delete of " + str(self.workingf_wf)
+                )
+
+
 class ProgressPercentage(object):
     global prog_val
 
@@ -454,11 +542,8 @@ def fCheckWorkflowStatus(fc_wf_id):
             sys.exit()
         time.sleep(60)
         url = "https://" + hostval + "/sdb/rest/workflow/instances/" + fc_wf_id
-        headers = {
-            "Preservica-Access-Token": securitytoken(config_input),
-            "Content-Type": "application/xml",
-        }
-        r_wf_start_response = requests.request("GET", url, headers=headers)
+        headers = fPreservicaHeaders({"Content-Type": "application/xml"})
+        r_wf_start_response = fPreservicaClient().get(url, headers=headers)
         root_logger.info(
             "fCheckWorkflowStatus : Workflow Response " + r_wf_start_response.text
         )
@@ -479,10 +564,10 @@ def fCheckWorkflowStatus(fc_wf_id):
         wf_loop_count += 1
 
 
-def fCopyAllFiles(ca_target_folder):
+def fCopyAllFiles(ca_target_folder, ca_container):
     root_logger.info("fCopyAllFiles")
     sub_r = "fCopyAllFiles"
-    target_path = os.path.join(ca_target_folder, container)
+    target_path = os.path.join(ca_target_folder, ca_container)
     root_logger.info("fCopyAllFiles : target_path " + str(target_path))
     list_filepath = dict_filepath.keys()
     for ind_file in list_filepath:
@@ -497,7 +582,7 @@ def fCopyAllFiles(ca_target_folder):
         fCopyData(source_file, target_file, fCopyData)
 
 
-def fCopyData(cd_package_source, cd_package_working, cd_sub_r):
+def fCopyData(cd_package_source, cd_package_working, cd_sub_r, cd_stager=None):
     root_logger.info("fCopyData")
     root_logger.info("fCopyData : " + str(cd_sub_r))
     cd_working_parent = os.path.dirname(cd_package_working)
@@ -505,7 +590,10 @@ def fCopyData(cd_package_source, cd_package_working, cd_sub_r):
         fCreateFolderStructure(cd_working_parent)
 
     try:
-        shutil.copy(cd_package_source, cd_package_working)
+        if cd_stager is None:
+            shutil.copy(cd_package_source, cd_package_working)
+        else:
+            cd_stager.stage_file(cd_package_source, cd_package_working)
         root_logger.info(
             ": fCopyData : "
             + str(cd_sub_r)
@@ -515,7 +603,7 @@ def fCopyData(cd_package_source, cd_package_working, cd_sub_r):
             + str(cd_package_working)
         )
         return True
-    except shutil.Error as err:
+    except (shutil.Error, OSError) as err:
         print(err.args[0])
         root_logger.info(
             " : fCopyData : "
@@ -528,10 +616,13 @@ def fCopyData(cd_package_source, cd_package_working, cd_sub_r):
         return False
 
 
-def fCopytreeData(cd_package_source, cd_package_working):
+def fCopytreeData(cd_package_source, cd_package_working, cd_stager=None):
     root_logger.info("fCopytreeData")
     try:
-        shutil.copytree(cd_package_source, cd_package_working)
+        if cd_stager is None:
+            shutil.copytree(cd_package_source, cd_package_working)
+        else:
+            cd_stager.stage_tree(cd_package_source, cd_package_working)
         root_logger.info(
             ": fCopytreeData : Copy completed from "
             + str(cd_package_source)
@@ -549,14 +640,14 @@ def fCopytreeData(cd_package_source, cd_package_working):
         return False
 
 
-def fCreateContainerFolderOpexFragment(ccf_target_folder):
+def fCreateContainerFolderOpexFragment(ccf_target_folder, job):
     root_logger.info("fCreateContainerFolderOpexFragment")
-    c_folder_val = container
+    c_folder_val = job.container
     root_logger.info(
         "fCreateContainerFolderOpexFragment : directory in scope " + c_folder_val
     )
-    c_list_folders_in_dir.clear()
-    c_list_files_in_dir.clear()
+    c_list_folders_in_dir = []
+    c_list_files_in_dir = []
     c_folder_val_full_path = os.path.join(ccf_target_folder, c_folder_val)
     if os.path.isdir(c_folder_val_full_path):
         c_opex_data_folder = ""
@@ -567,7 +658,7 @@ def fCreateContainerFolderOpexFragment(ccf_target_folder):
             if os.path.isdir(os.path.join(c_folder_val_full_path, c_child)):
                 c_list_folders_in_dir.append(c_child)
             if os.path.isfile(os.path.join(c_folder_val_full_path, c_child)):
-                list_files_in_dir.append(c_child)
+                c_list_files_in_dir.append(c_child)
         for c_lfd in range(len(c_list_folders_in_dir)):
             c_opex_data_folder = (
                 c_opex_data_folder
@@ -611,7 +702,7 @@ def fCreateContainerFolderOpexFragment(ccf_target_folder):
             opex_fixity_type,
             opex_fixity_checksum,
             LegacyXIP,
-            Ident_Biblio_Key,
+            job.Ident_Biblio_Key,
             Identifiers_biblio,
             Identifiers_catalog,
             source_ID,
@@ -637,12 +728,22 @@ def fCreateContainerFolderOpexFragment(ccf_target_folder):
             )
 
 
-def fCreateFileOpexFragments(cf_target_folder, security_tag, cf_package):
+def fCreateFileOpexFragments(cf_target_folder, security_tag, job):
+    cf_package = job.package
     Identifiers_biblio = ""
     pax_type = ""
     objects_io_flag = 0
     metadata_io_flag = 0
     root_logger.info("fCreateFileOpexFragments")
+    # files staged by the job were hashed as they were copied, hash the rest
+    # of the package up front, several files at a time
+    list_opex_files = [
+        os.path.join(opex_r, fil)
+        for opex_r, opex_d, opex_f in os.walk(cf_target_folder)
+        for fil in opex_f
+        if job.stager.fixity(os.path.join(opex_r, fil), "md5") is None
+    ]
+    dict_opex_fixity = prsvchecksum.hash_files(list_opex_files, ["md5"])
     for opex_r, opex_d, opex_f in os.walk(cf_target_folder):
         print("opex_d " + str(opex_d))
         for fil in opex_f:
@@ -717,7 +818,11 @@ def fCreateFileOpexFragments(cf_target_folder, security_tag, cf_package):
                 opex_data_folder = ""
                 opex_data_file = ""
                 opex_fixity_type = "MD5"
-                opex_fixity_checksum = fv6Checksum(opex_file, "md5")
+                opex_fixity_checksum = job.stager.fixity(opex_file, "md5")
+                if opex_file in dict_opex_fixity:
+                    opex_fixity_checksum = dict_opex_fixity[opex_file]["md5"]
+                elif opex_fixity_checksum is None:
+                    opex_fixity_checksum = fv6Checksum(opex_file, "md5")
                 LegacyXIP = ""
                 Identifiers_catalog = ""
                 source_ID = ""
@@ -725,7 +830,7 @@ def fCreateFileOpexFragments(cf_target_folder, security_tag, cf_package):
                 ref_file_desc = ""
 
                 if objects_io_flag == 1:
-                    Identifiers_biblio = IOCategoryElement
+                    Identifiers_biblio = job.IOCategoryElement
                     Ident_Biblio_Key = "ioCategory"
                 elif metadata_io_flag == 1:
                     Identifiers_biblio = "string value to be confirmed"
@@ -752,7 +857,7 @@ def fCreateFileOpexFragments(cf_target_folder, security_tag, cf_package):
 
                 opex_file_withext = os.path.join(opex_file + ".opex")
                 opex_filepath = os.path.join(
-                    cf_target_folder, container, opex_file_withext
+                    cf_target_folder, job.container, opex_file_withext
                 )
 
                 if not os.path.exists(opex_filepath):
@@ -774,9 +879,9 @@ def fCreateFileOpexFragments(cf_target_folder, security_tag, cf_package):
                         )
 
 
-def fCreateFolderOpexFragments(
-    cf_target_folder, security_tag, ref_title, cf_wflow_type, cf_package
-):
+def fCreateFolderOpexFragments(cf_target_folder, security_tag, ref_title, job):
+    cf_wflow_type = job.workflow_type
+    cf_package = job.package
     Ident_Biblio_Key = ""
     Identifiers_biblio = ""
     Identifiers_catalog = ""
@@ -791,7 +896,7 @@ def fCreateFolderOpexFragments(
             ## determine folder depth
             opex_fol = os.path.join(fol_root, fol_d)
 
-            array_targetf_container_wf = targetf_container_wf.split(os.sep)
+            array_targetf_container_wf = job.targetf_container_wf.split(os.sep)
             baseline_folder_depth = len(array_targetf_container_wf)
 
             array_opex_folder = opex_fol.split(os.sep)
@@ -812,32 +917,32 @@ def fCreateFolderOpexFragments(
             print("fol_d " + str(fol_d.lower()))
 
             if actual_folder_depth == 1:
-                curr_fol_identifier = SOCategoryContainer
+                curr_fol_identifier = job.SOCategoryContainer
                 Ident_Biblio_Key = "soCategory"
                 desc_metadata_xml = fCreateDigArchMetadataFragments(
-                    "mdfrag1", CMSCollectionID
+                    "mdfrag1", job.CMSCollectionID
                 )
                 ref_fldr_title = fol_d
             elif actual_folder_depth == 2:
                 if fol_d.lower() == cf_package.lower() + "_metadata":
                     metadata_flag = 1
                     objects_flag = 0
-                    curr_fol_identifier = SOCategoryMetadata
+                    curr_fol_identifier = job.SOCategoryMetadata
                     Ident_Biblio_Key = "soCategory"
-                    ref_fldr_title = opex_title_metadata
+                    ref_fldr_title = job.opex_title_metadata
                 elif fol_d.lower() == cf_package.lower() + "_contents":
                     objects_flag = 1
                     metadata_flag = 0
                     desc_metadata_xml = fCreateDigArchMetadataFragments(
-                        "mdfrag4", FAComponentIdNo
+                        "mdfrag4", job.FAComponentIdNo
                     )
-                    curr_fol_identifier = SOCategoryContents
+                    curr_fol_identifier = job.SOCategoryContents
                     Ident_Biblio_Key = "soCategory"
-                    ref_fldr_title = opex_title_content
+                    ref_fldr_title = job.opex_title_content
                 else:
                     curr_fol_identifier = ""
             elif actual_folder_depth >= 3:
-                curr_fol_identifier = SOCategoryElement
+                curr_fol_identifier = job.SOCategoryElement
                 Ident_Biblio_Key = "soCategory"
             # elif actual_folder_depth    == 3 and metadata_flag == 1:
             #    curr_fol_identifier     = SOCategoryElement
@@ -849,8 +954,8 @@ def fCreateFolderOpexFragments(
             if os.path.isdir(opex_fol):
                 LegacyXIP = ""
                 Identifiers_catalog = ""
-                list_folders_in_dir.clear()
-                list_files_in_dir.clear()
+                list_folders_in_dir = []
+                list_files_in_dir = []
                 opex_data_folder = ""
                 opex_data_file = ""
                 opex_file_name = os.path.basename(opex_fol) + ".opex"
@@ -1325,6 +1430,18 @@ def gettoken(config_input):
     return accesstoken
 
 
+def fPreservicaClient():
+    return prsvapi.get_client(credential_set or None)
+
+
+def fPreservicaHeaders(headers):
+    # without a credential set the token comes from the config file and is sent
+    # with each request
+    if credential_set:
+        return headers
+    return {"Preservica-Access-Token": gettoken(config_input), **headers}
+
+
 def fOutputDictionaries():
     root_logger.info("fOutputDictionaries ")
     for aa, bb in dict_filepath.items():
@@ -1660,7 +1777,7 @@ def fScanSource(p_directory):
     #    return False
 
 
-def fScanSource_ApprovedFormats(p_directory):
+def fScanSource_ApprovedFormats(p_directory, job):
     sub_r = "fScanSource_ApprovedFormats"
     root_logger.info(sub_r)
     root_logger.info(sub_r + " : p_directory " + str(p_directory))
@@ -1681,20 +1798,21 @@ def fScanSource_ApprovedFormats(p_directory):
                         + " the following file is non approved and has been deleted from the working folder "
                         + str(p_f_path)
                     )
-                    os.remove(p_f_path)
-                    list_excepted_files.append(p_f_path)
+                    # the working copy may be linked to the source, only unlink it
+                    job.stager.remove(p_f_path)
+                    job.list_excepted_files.append(p_f_path)
                 elif p_file in list_non_approved:
                     root_logger.warning(
                         str(sub_r)
                         + " the following file is non approved and has been deleted from the working folder "
                         + str(p_f_path)
                     )
-                    os.remove(p_f_path)
+                    job.stager.remove(p_f_path)
                 else:
                     if "objects" in p_f_parent:
-                        list_contents_folder.append(p_f_path)
+                        job.list_contents_folder.append(p_f_path)
                     elif "metadata" in p_f_parent:
-                        list_metadata_folder.append(p_f_path)
+                        job.list_metadata_folder.append(p_f_path)
 
     return True
 
@@ -1892,14 +2010,18 @@ def fScanJSON(fs_p_f_path):
             )
 
 
-def fCreatePAX(fc_workingf_wf_package, fc_package):
+def fCreatePAX(job):
     sub_r = "fCreatePAX"
+    fc_workingf_wf_package = job.workingf_wf_package
+    workingPAXf_wf_package = job.workingPAXf_wf
+    sourcef_wf_package_name = job.package
+
     root_logger.info(sub_r)
 
     print("dict_PAX_asset " + str(dict_PAX_asset))
     print("fc_workingf_wf_package " + str(fc_workingf_wf_package))
 
-    workingPAXf_container = os.path.join(workingPAXf_wf, sourcef_wf_package_name)
+    workingPAXf_container = os.path.join(job.workingPAXf_wf, sourcef_wf_package_name)
     root_logger.info(
         "fCreatePAX :  workingPAXf_container " + str(workingPAXf_container)
     )
@@ -1960,8 +2082,8 @@ def fCreateFolderStructure(fc_folder_path):
     for affp in range(fc_index, len(array_fc_folder_path)):
         new_path = os.path.join(temp_path, array_fc_folder_path[affp])
         print(new_path)
-        if not os.path.isdir(new_path):
-            os.mkdir(new_path)
+        # another package may create the same folder at the same time
+        os.makedirs(new_path, exist_ok=True)
         temp_path = new_path
 
 
@@ -2065,13 +2187,10 @@ def fStart_Workflow(fss_container):
 
     print(payload)
 
-    headers = {
-        "Preservica-Access-Token": gettoken(config_input),
-        "Content-Type": "application/xml",
-    }
+    headers = fPreservicaHeaders({"Content-Type": "application/xml"})
 
-    wf_start_response = requests.request(
-        "POST", url, data=payload, headers=headers, params=querystring
+    wf_start_response = fPreservicaClient().post(
+        url, data=payload, headers=headers, params=querystring
     )
 
     print(wf_start_response.status_code)
@@ -2218,48 +2337,14 @@ def fUnzipData(ue_package_source, ue_package_working_folder):
 
 
 def fv6Checksum(file_path, sum_type):
-    root_logger.info("fv6Checksum")
-    sum_type = sum_type.replace("-", "")
-    if sum_type.lower() == "md5":
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.md5()
-            chunk = f.read(8192)
-            while chunk:
-                file_hash.update(chunk)
-                chunk = f.read(8192)
-        root_logger.info("fv6Checksum : file_path " + str(file_path))
-        root_logger.info("fv6Checksum : hash " + file_hash.hexdigest())
-        return file_hash.hexdigest()
-    elif sum_type.lower() == "sha1":
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.sha1()
-            chunk = f.read(8192)
-            while chunk:
-                file_hash.update(chunk)
-                chunk = f.read(8192)
-        root_logger.info("fv6Checksum : file_path " + str(file_path))
-        root_logger.info("fv6Checksum : hash " + file_hash.hexdigest())
-        return file_hash.hexdigest()
-    elif sum_type.lower() == "sha256":
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.sha256()
-            chunk = f.read(8192)
-            while chunk:
-                file_hash.update(chunk)
-                chunk = f.read(8192)
-        root_logger.info("fv6Checksum : file_path " + str(file_path))
-        root_logger.info("fv6Checksum : hash " + file_hash.hexdigest())
-        return file_hash.hexdigest()
-    elif sum_type.lower() == "sha512":
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.sha512()
-            chunk = f.read(8192)
-            while chunk:
-                file_hash.update(chunk)
-                chunk = f.read(8192)
-        root_logger.info("fv6Checksum : file_path " + str(file_path))
-        root_logger.info("fv6Checksum : hash " + file_hash.hexdigest())
-        return file_hash.hexdigest()
+    try:
+        sum_type = prsvchecksum.normalize(sum_type)
+    except ValueError as e:
+        root_logger.error("fv6Checksum : " + str(e))
+        return None
+    file_hash = prsvchecksum.hash_file(file_path, [sum_type])[sum_type]
+    root_logger.info("fv6Checksum : " + str(file_path) + " " + file_hash)
+    return file_hash
 
 
 def fZipPAX():
@@ -2348,191 +2433,138 @@ def fListPackages(fl_wflow_type):
 
 def fGetPackages(fg_workflow_type):
     sub_r = "fGetBagsPackage"
-    global sourcef_wf
-    global workingf_wf
-    global workingPAXf_wf
-    global container
-    global targetf_container
-    global targetf_container_wf
-    global targetf_wf
-    global sourcef_wf_package
-    global sourcef_wf_package_name
-    global workingf_wf_package
-    global workingPAXf_wf_package
-    global targetf_wf_package
-
-    global FAComponentIdNo  # Mxxxxx_##_xxxxx
-    global SOCategoryContainer  # Mxxxxx_##_xxxxx
-    global SOCategoryContents  # Mxxxxx_##_xxxxx
-    global SOCategoryMetadata  # Mxxxxx_##_xxxxx
-    global SOCategoryElement  # Mxxxxx_##_xxxxx
-    global IOCategoryElement  # Mxxxxx_##_xxxxx
-    global CMSCollectionID  # M#####_xx_xxxxx
-    global RecordNumber  # Mxxxxx_xx_#####
-
-    global Ident_Biblio_Key
-
-    global opex_title_content
-    global opex_title_metadata
-
-    Ident_Biblio_Key = "SOCategory"
-
     sourcef_wf = os.path.join(sourcef, fg_workflow_type)
 
     print(dict_frh_orig_folder_name.items())
 
-    for package in os.listdir(sourcef_wf):
-        fReset_Lists_Dicts()
-
-        # ExceptionsReport
-        ExceptionsFile = os.path.join(log_folder, "Exceptions_" + str(fTime()) + ".log")
-        Exceptions = open(ExceptionsFile, "w", encoding="utf-8")
-        Exceptions.write("Exceptions file for package " + str(package) + "\n")
-        Exceptions.write("The following files have been removed from the opex package")
+    # the build stages keep the state of a package in its PackageJob and only read
+    # the module lists and dictionaries, so they are cleared once for the run
+    fReset_Lists_Dicts()
 
-        # Sub Folder Titles
-        opex_title_content = package + "_contents"
-        opex_title_metadata = package + "_metadata"
-
-        wflow_type = package
-
-        array_package_breakdown = package.split("_")
-        if len(array_package_breakdown) != 3:
-            root_logger.info(
-                str(sub_r)
-                + " : package breakdown. The package name is not consistent "
-                + str(array_package_breakdown)
-            )
+    list_jobs = []
+    for package in os.listdir(sourcef_wf):
+        try:
+            list_jobs.append(PackageJob(package, fg_workflow_type))
+        except ValueError as e:
+            root_logger.info(str(sub_r) + " : " + str(e))
             sys.exit()
-        else:
-            CMSCollectionID = array_package_breakdown[0]
-            FAComponentIdNo = package
-            SOCategoryContainer = array_package_breakdown[1] + "Container"
-            SOCategoryContents = array_package_breakdown[1] + "Contents"
-            SOCategoryMetadata = array_package_breakdown[1] + "Metadata"
-            SOCategoryElement = array_package_breakdown[1] + "Element"
-            IOCategoryElement = array_package_breakdown[1] + "Element"
-            RecordNumber = array_package_breakdown[2]
-
-        print("package |" + str(package) + "|")
-        # print("wflow_type " + str(wflow_type))
-        # if wflow_type == "NA":
-        #    print("The source package is not listed in the hierarchy csv " + str(package))
-        #    root_logger.error("fGetPackages : The source package is not listed in the hierarchy csv " + str(package))
-        #    continue
-
-        workingf_wf = os.path.join(workingf, wflow_type)
-        workingPAXf_wf = os.path.join(workingPAXf, wflow_type)
-        extended_path = ""
-        workingPAXf_wf_extended = os.path.join(workingPAXf_wf, extended_path)
-        ##
-        # extended_path           = dict_frh_subpaths.get(package, "error")
-        # if extended_path        == "error":
-        #    root_logger.error(sub_r + " : the extended path for this package was not present in the hierarchy manifest " + str(package))
-        #    root_logger.error(sub_r + " : skipping package : " + str(package))
-        #    continue
-
-        targetf_wf = os.path.join(targetf, wflow_type)
-
-        container = "Container_" + package + "_" + fTime()
-        targetf_container = os.path.join(targetf, container)
-
-        sourcef_wf_package = os.path.join(sourcef_wf, package)
-        sourcef_wf_package_name = package
-        workingf_wf_package = os.path.join(workingf_wf, package)
-        workingPAXf_wf_package = os.path.join(workingPAXf_wf_extended)
-        targetf_container_wf = os.path.join(targetf, container, fg_workflow_type)
-        targetf_container_wf_package = os.path.join(targetf_container_wf, package)
-
-        root_logger.info(sub_r + " : package " + str(package))
-        root_logger.info(sub_r + " : sourcef_wf " + str(sourcef_wf))
-        root_logger.info(sub_r + " : sourcef_wf_package " + str(sourcef_wf_package))
-        root_logger.info(
-            sub_r + " : sourcef_wf_package_name " + str(sourcef_wf_package_name)
-        )
-        root_logger.info(sub_r + " : workingf_wf " + str(workingf_wf))
-        root_logger.info(sub_r + " : workingf_wf_package " + str(workingf_wf_package))
-        root_logger.info(sub_r + " : workingPAXf_wf " + str(workingPAXf_wf))
-        root_logger.info(
-            sub_r + " : workingPAXf_wf_extended " + str(workingPAXf_wf_extended)
+
+    dict_job_result = {}
+    with ThreadPoolExecutor(
+        max_workers=max(max_package_workers, 1), thread_name_prefix="package"
+    ) as executor:
+        dict_task_job = {executor.submit(fBuildPackage, job): job for job in list_jobs}
+        for task in as_completed(dict_task_job):
+            job = dict_task_job[task]
+            try:
+                dict_job_result[job] = task.result()
+            except Exception:
+                root_logger.exception(
+                    sub_r + " : building package failed : " + str(job.package)
+                )
+                dict_job_result[job] = False
+
+    fOutputDictionaries()
+    fSummariseBuilds(dict_job_result)
+    return dict_job_result
+
+
+def fSummariseBuilds(dict_job_result):
+    sub_r = "fSummariseBuilds"
+    list_built = [job for job, result in dict_job_result.items() if result]
+    list_failed = [job for job, result in dict_job_result.items() if not result]
+    summary = [
+        sub_r
+        + " : "
+        + str(len(list_built))
+        + " packages built, "
+        + str(len(list_failed))
+        + " failed"
+    ]
+    for job in list_failed:
+        summary.append(sub_r + " : failed " + str(job.package))
+
+    dict_stage_timings = {}
+    for job in dict_job_result:
+        for stage, seconds in job.timings.items():
+            dict_stage_timings.setdefault(stage, []).append(seconds)
+    for stage, list_seconds in dict_stage_timings.items():
+        summary.append(
+            sub_r
+            + " : "
+            + stage
+            + " total "
+            + str(round(sum(list_seconds), 2))
+            + "s, slowest package "
+            + str(round(max(list_seconds), 2))
+            + "s"
         )
+
+    for line in summary:
+        root_logger.info(line)
+        print(line)
+    return summary
+
+
+def fBuildPackage(job):
+    # build the opex container of one package, the state of the package is kept in
+    # job so several packages can be built at the same time
+    sub_r = "fBuildPackage"
+    print("package |" + str(job.package) + "|")
+    root_logger.info(sub_r + " : package " + str(job.package))
+    job.log_paths()
+
+    if not job.timed(
+        "copy",
+        fCopytreeData,
+        job.sourcef_wf_package,
+        job.workingf_wf_package,
+        job.stager,
+    ):
         root_logger.info(
-            sub_r + " : workingPAXf_wf_package " + str(workingPAXf_wf_package)
+            "fProcessPackages : fCopytreeData error : Skipping package : "
+            + str(job.sourcef_wf_package)
         )
-        root_logger.info(sub_r + " : container " + str(container))
-        root_logger.info(sub_r + " : targetf_wf " + str(targetf_wf))
-        root_logger.info(sub_r + " : targetf_container " + str(targetf_container))
-        root_logger.info(sub_r + " : targetf_container_wf " + str(targetf_container_wf))
+        return False
+
+    if not job.timed("scan", fScanSource_ApprovedFormats, job.workingf_wf_package, job):
         root_logger.info(
-            sub_r
-            + " : targetf_container_wf_package "
-            + str(targetf_container_wf_package)
+            "fProcessPackages : fScanSource error : Skipping package : "
+            + str(job.sourcef_wf_package)
         )
+        return False
+    job.write_exceptions()
 
-        # if os.path.isdir(sourcef_wf_package):
-        #    root_logger.info(": fGetPackages : Copy from source (no zips present) : " + str(sourcef_wf_package))
-        #    root_logger.info(": fGetPackages : Processing package source : " + str(sourcef_wf_package))
-        #    root_logger.info(": fGetPackages : Processing package working : " + str(workingf_wf_package))
-        #    # copy source package from "source" folder to "working" folder
-        #    if not fCopytreeData(sourcef_wf_package, workingf_wf_package):
-        #        root_logger.info(": fProcessPackages : fCopytreeData error " + str(sourcef_wf_package))
-        #        continue
-        #    # may not require a wait
-        #    time.sleep(10)
-        # else:
-        #    root_logger.warning(": fGetPackages : something other than a folder was found in the source folder")
-
-        #############
-
-        if not fCopytreeData(sourcef_wf_package, workingf_wf_package):
-            root_logger.info(
-                "fProcessPackages : fCopytreeData error : Skipping package : "
-                + str(sourcef_wf_package)
-            )
-            continue
-
-        if not fScanSource_ApprovedFormats(workingf_wf_package):
-            root_logger.info(
-                "fProcessPackages : fScanSource error : Skipping package : "
-                + str(sourcef_wf_package)
-            )
-            continue
-        Exceptions.write("\n".join(list_excepted_files))
-        Exceptions.close()
-        # fCreatePAX(workingf_wf_package, package)
-        # fZipPAX()
-        # fDeletePAX()
-        # fReadFileSystem(workingf_wf_package)
-
-        # indented on 100222
-
-        # inspect list_contents_folder and list_metadata_folder entities, construct resulting package (which will exclude extraneous folders)
-
-        fConstructTarget(targetf_container_wf_package)
-
-        # if not fCopytreeData(workingf_wf_package, targetf_container_wf_package):
-        #    root_logger.info("fProcessPackages : fCopytreeData error : Skipping package : " + str(sourcef_wf_package))
-        #    continue
+    # inspect list_contents_folder and list_metadata_folder entities, construct resulting package (which will exclude extraneous folders)
+    job.timed("construct", fConstructTarget, job)
 
-        fCreateFileOpexFragments(targetf_container, security_tag, package)
-        fCreateFolderOpexFragments(
-            targetf_container, security_tag, ref_title, fg_workflow_type, package
-        )
-        fCreateContainerFolderOpexFragment(targetf)
-        fOutputDictionaries()
-        fSanitiseFolders()
+    job.timed(
+        "opex", fCreateFileOpexFragments, job.targetf_container, security_tag, job
+    )
+    job.timed(
+        "opex",
+        fCreateFolderOpexFragments,
+        job.targetf_container,
+        security_tag,
+        ref_title,
+        job,
+    )
+    job.timed("opex", fCreateContainerFolderOpexFragment, targetf, job)
+    job.remove_working_copy()
+    return True
 
 
-def fConstructTarget(fc_targetf_container_wf_package):
+def fConstructTarget(job):
     sub_r = "fConstructTarget"
+    fc_targetf_container_wf_package = job.targetf_container_wf_package
     package_target_folder_content = os.path.join(
-        fc_targetf_container_wf_package, opex_title_content
+        fc_targetf_container_wf_package, job.opex_title_content
     )
     package_target_folder_metadata = os.path.join(
-        fc_targetf_container_wf_package, opex_title_metadata
+        fc_targetf_container_wf_package, job.opex_title_metadata
     )
     list_acpf = []
-    for lcf in list_contents_folder:
+    for lcf in job.list_contents_folder:
         list_acpf.clear()
         content_file_name = os.path.basename(lcf)
         content_parent_folder = os.path.dirname(lcf)
@@ -2550,23 +2582,23 @@ def fConstructTarget(fc_targetf_container_wf_package):
         print(list_acpf)
         package_target_folder_content_file = os.path.join(
             fc_targetf_container_wf_package,
-            opex_title_content,
+            job.opex_title_content,
             (os.sep).join(list_acpf),
             content_file_name,
         )
         print(package_target_folder_content_file)
-        fCopyData(lcf, package_target_folder_content_file, sub_r)
+        fCopyData(lcf, package_target_folder_content_file, sub_r, job.stager)
 
-    if len(list_metadata_folder) == 0:
+    if len(job.list_metadata_folder) == 0:
         fCreateFolderStructure(package_target_folder_metadata)
     else:
-        for lmf in list_metadata_folder:
+        for lmf in job.list_metadata_folder:
             metadata_file_name = os.path.basename(lmf)
             print(metadata_file_name)
             package_target_folder_metadata_file = os.path.join(
                 package_target_folder_metadata, metadata_file_name
             )
-            fCopyData(lmf, package_target_folder_metadata_file, sub_r)
+            fCopyData(lmf, package_target_folder_metadata_file, sub_r, job.stager)
 
 
 def fCreateDigArchMetadataFragments(mdfrag_type, md_value):
@@ -2796,6 +2828,8 @@ config.read(config_input)
 
 # read folder variables from config.ini file
 hostval = config["DEFAULT"]["Host"]
+# a credentials.ini set, the shared client then adds and refreshes the token
+credential_set = str(config["DEFAULT"].get("Credential_Set") or "")
 masterdirectory = config["DEFAULT"]["MasterDirectory"]
 workingdirectory = config["DEFAULT"]["WorkingDirectory"]
 uploaddirectory = config["DEFAULT"]["UploadDirectory"]
@@ -2859,6 +2893,10 @@ AWS_Secret = str(config["BUCKET"]["SECRET"])
 wfcontextID = str(config["BUCKET"]["Workflow_contextID"])
 
 max_worker_count = int(config["BUCKET"]["Max_Worker_Count"])
+# packages whose containers are built at the same time by fGetPackages
+max_package_workers = int(config["VARIABLES"].get("Max_Package_Workers") or 1)
+# how packages are staged into the working and target folders
+staging_mode = str(config["VARIABLES"].get("Staging_Mode") or "auto")
 
 
 # define working folders
@@ -2882,7 +2920,8 @@ list_working_folders = [workingf, workingPAXf]
 ##########################################################################################################
 if not os.path.exists(log_folder):
     log_folder = tempfile.mkdtemp()
-LogFile = os.path.join(log_folder, "Log_" + str(fTime()) + ".log")
+run_time = str(fTime())
+LogFile = os.path.join(log_folder, "Log_" + run_time + ".log")
 root_logger = logging.getLogger()
 root_logger.setLevel(logging.DEBUG)
 handler = logging.FileHandler(LogFile, "w", "utf-8")
@@ -2894,6 +2933,7 @@ root_logger.info("log file for " + str(os.path.basename(__file__)))
 # Log variables
 
 root_logger.info("hostval " + str(hostval))
+root_logger.info("credential_set " + str(credential_set))
 root_logger.info("masterdirectory " + str(masterdirectory))
 root_logger.info("workingdirectory " + str(workingdirectory))
 root_logger.info("source " + str(source))
@@ -2949,6 +2989,8 @@ root_logger.info(
 )
 root_logger.info("csv_columns " + str(csv_columns))
 root_logger.info("null_keyword " + str(null_keyword))
+root_logger.info("max_package_workers " + str(max_package_workers))
+root_logger.info("staging_mode " + str(staging_mode))
 
 
 # user input
@@ -1,8 +1,6 @@
 import logging
 import xml.etree.ElementTree as ET
 
-import requests
-
 import prsv_tools.utility.api as prsvapi
 import prsv_tools.utility.cli as prsvcli
 
@@ -28,13 +26,12 @@ def parse_args() -> prsvcli.argparse.Namespace:
     return parser.parse_args()
 
 
-def retry_stalled_workflows(token: str) -> None:
+def retry_stalled_workflows(credentials: str) -> None:
     headers = {
-        "Preservica-Access-Token": token,
         "Content-Type": "application/xml",
     }
     url = "https://nypl.preservica.com/sdb/rest/workflow/instances/retry?workflowInstanceIds="
-    response = requests.request("POST", url, headers=headers)
+    response = prsvapi.get_client(credentials).post(url, headers=headers)
 
     root = ET.fromstring(response.text)
     ns = {"": "http://workflow.preservica.com"}
@@ -53,9 +50,7 @@ def main() -> None:
 
     args = parse_args()
 
-    token = prsvapi.get_token(args.credentials)
-
-    retry_stalled_workflows(token)
+    retry_stalled_workflows(args.credentials)
 
     return None
 
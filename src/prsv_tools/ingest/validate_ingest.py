@@ -1,18 +1,43 @@
+import functools
 import json
 import logging
 import re
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Tuple
 
 import requests
 
 import prsv_tools.utility.api as prsvapi
+import prsv_tools.utility.cache as prsvcache
 import prsv_tools.utility.cli as prsvcli
 
 logging.basicConfig(level=logging.INFO)
 
+# requests in flight at once, matched to the connections kept by the API client
+DEFAULT_WORKERS = prsvapi.DEFAULT_POOL_SIZE
+# children returned per page of the children endpoint
+CHILDREN_PAGE_SIZE = 1000
+# seconds a cached entity is used without asking Preservica if it changed,
+# by default every cached entity is revalidated with If-Modified-Since
+DEFAULT_CACHE_TTL = 0
+
+# metadata returned with every search hit, enough to build the IO and SO objects
+SEARCH_METADATA = [
+    "xip.title",
+    "xip.identifier",
+    "xip.securitytag",
+    "xip.parent_ref",
+    "spec.specCollectionID",
+    "findingAid.faComponentId",
+    "findingAid.faCollectionId",
+    "findingAid.erNumber",
+]
+
 
 def parse_args():
     parser = prsvcli.Parser()
@@ -28,8 +53,17 @@ def parse_args():
     parser.add_argument(
         "--collectionID",
         type=str,
-        required=True,
-        help="the collection you'd like to check for, M\\d+",
+        nargs="+",
+        action="extend",
+        dest="collection_ids",
+        default=[],
+        help="the collection(s) you'd like to check for, M\\d+",
+    )
+
+    parser.add_argument(
+        "--collection_file",
+        type=Path,
+        help="a text file with a collection ID on each line",
     )
 
     parser.add_argument(
@@ -39,7 +73,58 @@ def parse_args():
         help="the source directory you want to compare to, usually ICA path to 'faComponents'",
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"number of concurrent API requests, default {DEFAULT_WORKERS}",
+    )
+
+    parser.add_argument(
+        "--entity_api",
+        action="store_true",
+        help="get every SO and IO from the entity API instead of the search index, "
+        "e.g. right after ingest, before indexing has finished",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of packages validated in parallel processes, default 1",
+    )
+
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="write the result of every check to this file as JSON lines",
+    )
+
+    parser.add_cachedirectory()
+
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help="seconds a cached SO or IO is used without asking Preservica if it "
+        f"changed, default {DEFAULT_CACHE_TTL}",
+    )
+
+    args = parser.parse_args()
+
+    # only the entity API crawl reads and writes the cache
+    if args.cache_dir and not args.entity_api:
+        parser.error("--cache_dir can only be used with --entity_api")
+
+    if args.collection_file:
+        lines = args.collection_file.read_text().splitlines()
+        args.collection_ids.extend(line.strip() for line in lines if line.strip())
+    if not args.collection_ids:
+        parser.error("at least one of --collectionID or --collection_file is required")
+    # a collection listed twice is only validated once
+    args.collection_ids = list(dict.fromkeys(args.collection_ids))
+
+    return args
 
 
 @dataclass
@@ -72,14 +157,70 @@ class prsv_Information_Object:
     ioCategory: str
 
 
-def get_api_results(credentials: str, url: str) -> requests.Response:
+_CHECK_RESULTS: ContextVar[list | None] = ContextVar("check_results", default=None)
+_CHECK_MESSAGES: ContextVar[list | None] = ContextVar("check_messages", default=None)
+
+
+class CheckMessageHandler(logging.Handler):
+    """keep the messages logged by the check that is running"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        messages = _CHECK_MESSAGES.get()
+        if messages is not None:
+            messages.append(record.getMessage())
+
+
+logging.getLogger().addHandler(CheckMessageHandler())
+
+
+def record_check(check: Callable) -> Callable:
+    """decorator to record the outcome of a check while results are collected,
+    with the entity it was run on and the messages it logged"""
+
+    @functools.wraps(check)
+    def wrapper(*args, **kwargs):
+        results = _CHECK_RESULTS.get()
+        if results is None:
+            return check(*args, **kwargs)
+
+        messages = []
+        token = _CHECK_MESSAGES.set(messages)
+        try:
+            valid = check(*args, **kwargs)
+        finally:
+            _CHECK_MESSAGES.reset(token)
+
+        result = {"check": check.__name__, "valid": bool(valid)}
+        entity = args[0] if args else None
+        if hasattr(entity, "uuid"):
+            result.update(uuid=entity.uuid, title=entity.title)
+        elif isinstance(entity, str):
+            result.update(title=entity)
+        result["messages"] = messages
+        results.append(result)
+
+        return valid
+
+    return wrapper
+
+
+@contextmanager
+def collect_check_results() -> Iterator[list]:
+    """collect a record of every check run inside the block"""
+    results = []
+    token = _CHECK_RESULTS.set(results)
+    try:
+        yield results
+    finally:
+        _CHECK_RESULTS.reset(token)
+
+
+def get_api_results(
+    credentials: str, url: str, headers: dict | None = None
+) -> requests.Response:
     """function to get api results"""
-    accesstoken = prsvapi.get_token(credentials)
-    headers = {
-        "Preservica-Access-Token": accesstoken,
-        "Content-Type": "application/xml",
-    }
-    response = requests.request("GET", url, headers=headers)
+    headers = {"Content-Type": "application/xml", **(headers or {})}
+    response = prsvapi.get_client(credentials).get(url, headers=headers)
     return response
 
 
@@ -96,6 +237,61 @@ def search_within_DigArch(
     return res
 
 
+def search_within(
+    credentials: str, fields, parentuuid: str, metadata: list
+) -> requests.Response:
+    """function to search within a folder in Preservica, returning every hit
+    with the requested metadata fields"""
+    query = {"q": "", "fields": fields}
+    q = json.dumps(query)
+    md = ",".join(metadata)
+    url = f"https://nypl.preservica.com/api/content/search-within?q={q}&parenthierarchy={parentuuid}&start=0&max=-1&metadata={md}"  # noqa
+    res = get_api_results(credentials, url)
+
+    return res
+
+
+def parse_search_entities(
+    res: requests.Response,
+) -> List[Tuple[prsv_Information_Object | prsv_Structural_Object, str]]:
+    """function to parse json search results with SEARCH_METADATA into
+    IO and SO dataclass objects, each paired with the UUID of its parent"""
+    entities = []
+    json_obj = json.loads(res.text)
+    for obj_id, md in zip(
+        json_obj["value"]["objectIds"], json_obj["value"]["metadata"]
+    ):
+        fields = {field["name"]: field.get("value") for field in md}
+        identifier = fields["xip.identifier"]
+        if isinstance(identifier, list):
+            identifier = identifier[0]
+        id_type, category = identifier.split(" ", 1)
+        uuid = obj_id.split("|")[-1]
+        title = fields["xip.title"]
+        sectag = fields["xip.securitytag"]
+
+        if obj_id.startswith("sdb:IO"):
+            entity = prsv_Information_Object(uuid, title, id_type, sectag, category)
+        else:
+            if category.endswith("Container"):
+                md_frag = {"speccolID": fields.get("spec.specCollectionID")}
+            elif category.endswith("Contents"):
+                md_frag = {
+                    "faComponentId": fields.get("findingAid.faComponentId"),
+                    "faCollectionId": fields.get("findingAid.faCollectionId"),
+                    "erNumber": fields.get("findingAid.erNumber"),
+                }
+            else:
+                # a mis-categorised SO still has fragments to check against
+                md_frag = {}
+            entity = prsv_Structural_Object(
+                uuid, title, id_type, sectag, category, md_frag, dict()
+            )
+        entities.append((entity, fields["xip.parent_ref"]))
+
+    return entities
+
+
 def parse_structural_object_uuid(res: requests.Response) -> list:
     """function to parse json API response into a list of UUIDs"""
     uuid_ls = list()
@@ -107,6 +303,7 @@ def parse_structural_object_uuid(res: requests.Response) -> list:
     return uuid_ls
 
 
+@record_check
 def ingest_has_correct_ER_number(
     collection_id: str, da_source: Path, uuid_ls: list
 ) -> bool:
@@ -140,11 +337,37 @@ def ingest_has_correct_ER_number(
 
 
 def get_so(
-    uuid: str, credentials: str, namespaces: dict, so_type: str
+    uuid: str,
+    credentials: str,
+    namespaces: dict,
+    so_type: str,
+    cache: prsvcache.EntityCache | None = None,
 ) -> prsv_Structural_Object:
-    """function to parse API result and return a prsv_Structural_Object data class object"""
+    """function to get a prsv_Structural_Object data class object, from the
+    cache if it is fresh or Preservica reports it unchanged"""
     url = f"https://nypl.preservica.com/api/entity/structural-objects/{uuid}"
-    res = get_api_results(credentials, url)
+    cached = cache.lookup(uuid, "so") if cache else None
+    if cached and cache.is_fresh(cached):
+        return prsv_Structural_Object(**cached.data)
+
+    headers = prsvcache.if_modified_since(cached) if cached else None
+    res = get_api_results(credentials, url, headers)
+    if cached and res.status_code == 304:
+        so = prsv_Structural_Object(**cached.data)
+        # children are added and removed without changing the SO itself
+        so.children = get_so_children(credentials, uuid, namespaces)
+    else:
+        so = parse_so(res, credentials, namespaces, so_type)
+
+    if cache:
+        cache.put(uuid, "so", asdict(so))
+    return so
+
+
+def parse_so(
+    res: requests.Response, credentials: str, namespaces: dict, so_type: str
+) -> prsv_Structural_Object:
+    """function to parse API result and return a prsv_Structural_Object data class object"""
     root = ET.fromstring(res.text)
 
     uuid = root.find(f".//{namespaces['xip_ns']}Ref").text
@@ -220,27 +443,68 @@ def get_so_children(credentials: str, so_uuid: str, namespaces: dict) -> dict:
             type = child.attrib.get("type")
             children_dict[title] = {"objType": type, "uuid": ref}
 
-    children_url = f"https://nypl.preservica.com/api/entity/structural-objects/{so_uuid}/children?start=0&max=1000"  # noqa
+    children_url = f"https://nypl.preservica.com/api/entity/structural-objects/{so_uuid}/children"  # noqa
 
-    children_res = get_api_results(credentials, children_url)
+    children_res = get_api_results(
+        credentials, f"{children_url}?start=0&max={CHILDREN_PAGE_SIZE}"
+    )
     children_root = ET.fromstring(children_res.text)
     process_children_root(children_root)
 
-    if len(children_root.findall(f".//{namespaces['entity_ns']}Next")) > 0:
-        next_children = children_root.findall(f".//{namespaces['entity_ns']}Next")
-        for next_child in next_children:
-            next_url = next_child.text
-            next_res = get_api_results(credentials, next_url)
+    next_elem = children_root.find(f".//{namespaces['entity_ns']}Next")
+    total_elem = children_root.find(f".//{namespaces['entity_ns']}TotalResults")
+    if next_elem is None:
+        return children_dict
+
+    if total_elem is not None:
+        # the page offsets are known from the total, the pages are fetched one
+        # after another since the crawl already runs --threads requests at once
+        for start in range(
+            CHILDREN_PAGE_SIZE, int(total_elem.text), CHILDREN_PAGE_SIZE
+        ):
+            page = get_api_results(
+                credentials, f"{children_url}?start={start}&max={CHILDREN_PAGE_SIZE}"
+            )
+            process_children_root(ET.fromstring(page.text))
+    else:
+        while next_elem is not None:
+            next_res = get_api_results(credentials, next_elem.text)
             next_root = ET.fromstring(next_res.text)
             process_children_root(next_root)
+            next_elem = next_root.find(f".//{namespaces['entity_ns']}Next")
 
     return children_dict
 
 
-def get_io(uuid: str, credentials: str, namespaces: dict) -> prsv_Information_Object:
-    """function to get and parse API to get an Information Object dataclass object"""
+def get_io(
+    uuid: str,
+    credentials: str,
+    namespaces: dict,
+    cache: prsvcache.EntityCache | None = None,
+) -> prsv_Information_Object:
+    """function to get an Information Object dataclass object, from the
+    cache if it is fresh or Preservica reports it unchanged"""
     url = f"https://nypl.preservica.com/api/entity/information-objects/{uuid}"
-    res = get_api_results(credentials, url)
+    cached = cache.lookup(uuid, "io") if cache else None
+    if cached and cache.is_fresh(cached):
+        return prsv_Information_Object(**cached.data)
+
+    headers = prsvcache.if_modified_since(cached) if cached else None
+    res = get_api_results(credentials, url, headers)
+    if cached and res.status_code == 304:
+        cache.touch(uuid, "io")
+        return prsv_Information_Object(**cached.data)
+
+    io = parse_io(res, credentials, namespaces)
+    if cache:
+        cache.put(uuid, "io", asdict(io))
+    return io
+
+
+def parse_io(
+    res: requests.Response, credentials: str, namespaces: dict
+) -> prsv_Information_Object:
+    """function to parse API result and return an Information Object dataclass object"""
     root = ET.fromstring(res.text)
 
     uuid = root.find(f".//{namespaces['xip_ns']}Ref").text
@@ -260,6 +524,7 @@ def get_io(uuid: str, credentials: str, namespaces: dict) -> prsv_Information_Ob
     return prsv_Information_Object(uuid, title, type, sectag, ioCat)
 
 
+@record_check
 def validate_so_title(so: prsv_Structural_Object, pattern: str) -> bool:
     """function to validate title pattern of a prsv Structural Object"""
     if re.fullmatch(pattern, so.title):
@@ -269,6 +534,7 @@ def validate_so_title(so: prsv_Structural_Object, pattern: str) -> bool:
         return False
 
 
+@record_check
 def valid_sectag(
     io_so: prsv_Structural_Object | prsv_Information_Object, expected: str
 ) -> bool:
@@ -280,6 +546,7 @@ def valid_sectag(
         return False
 
 
+@record_check
 def valid_so_type(so: prsv_Structural_Object) -> bool:
     """function to validate Structural Object type, which must be soCategory
     return True if so; False if not"""
@@ -290,6 +557,7 @@ def valid_so_type(so: prsv_Structural_Object) -> bool:
         return False
 
 
+@record_check
 def valid_soCategory(
     so: prsv_Structural_Object, pkg_type: str, expected_category: str
 ) -> bool:
@@ -301,17 +569,19 @@ def valid_soCategory(
         return False
 
 
+@record_check
 def validate_mdfrag(
     prsv_object: prsv_Structural_Object, field_name: str, expected_value: str
 ) -> bool:
     """function to validate Structural Object metadata fragment values.
     Return True if it is as expected; False if not"""
-    # mdFragments is a dictionary
-    if prsv_object.mdFragments.get(field_name) == expected_value:
+    # mdFragments is a dictionary, or None for SOs that are not expected to have any
+    md_fragments = prsv_object.mdFragments or {}
+    if md_fragments.get(field_name) == expected_value:
         return True
     else:
         logging.error(
-            f"{prsv_object.title} has incorrect {field_name}: {prsv_object.mdFragments.get(field_name)}"
+            f"{prsv_object.title} has incorrect {field_name}: {md_fragments.get(field_name)}"
         )
         return False
 
@@ -380,29 +650,125 @@ def valid_all_metadata_level_so_conditions(
     valid_soCategory(metadata_so, pkg_type, "Metadata")
 
 
+def get_child(
+    child: dict,
+    credentials: str,
+    namespaces: dict,
+    cache: prsvcache.EntityCache | None = None,
+) -> prsv_Information_Object | prsv_Structural_Object:
+    """function to get a child of a contents SO as an IO or SO dataclass object"""
+    if child["objType"] == "IO":
+        return get_io(child["uuid"], credentials, namespaces, cache)
+    else:
+        return get_so(child["uuid"], credentials, namespaces, "contents_element", cache)
+
+
+def fetch_contents(
+    so: prsv_Structural_Object,
+    credentials: str,
+    namespaces: dict,
+    workers: int = DEFAULT_WORKERS,
+    cache: prsvcache.EntityCache | None = None,
+) -> dict:
+    """function to get all the elements below an SO from the entity API,
+    returning them by UUID. Each level of the tree is fetched concurrently"""
+    fetched = dict()
+    level = [so]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while level:
+            children = [
+                child
+                for parent in level
+                for child in parent.children.values()
+                if child["objType"] in ("IO", "SO")
+            ]
+            elements = list(
+                executor.map(
+                    lambda child: get_child(child, credentials, namespaces, cache),
+                    children,
+                )
+            )
+            for child, element in zip(children, elements):
+                fetched[child["uuid"]] = element
+            level = [x for x in elements if isinstance(x, prsv_Structural_Object)]
+
+    return fetched
+
+
 def get_contents_io_so(
-    so: list, credentials: str, namespaces: dict
+    so: prsv_Structural_Object,
+    credentials: str,
+    namespaces: dict,
+    workers: int = DEFAULT_WORKERS,
+    cache: prsvcache.EntityCache | None = None,
 ) -> Tuple[List[prsv_Information_Object], List[prsv_Structural_Object]]:
     """function to get all the elements within the contents level SO,
-    returning a list of IOs and a list of SOs, if applicable"""
+    returning a list of IOs and a list of SOs, if applicable.
+    The lists keep the depth-first order of the tree"""
+    fetched = fetch_contents(so, credentials, namespaces, workers, cache)
+    return collect_contents_io_so(so, fetched)
+
+
+def collect_contents_io_so(
+    so: prsv_Structural_Object, fetched: dict
+) -> Tuple[List[prsv_Information_Object], List[prsv_Structural_Object]]:
+    """function to list the fetched elements below an SO depth-first"""
     contents_io = []
     contents_element_so = []
-    for child in so.children:
-        uuid = so.children[child]["uuid"]
-        if so.children[child]["objType"] == "IO":
-            io = get_io(uuid, credentials, namespaces)
-            contents_io.append(io)
-        elif so.children[child]["objType"] == "SO":
-            element_so = get_so(uuid, credentials, namespaces, "contents_element")
-            contents_element_so.append(element_so)
-            new_io, new_element_so = get_contents_io_so(
-                element_so, credentials, namespaces
-            )
+    for child in so.children.values():
+        element = fetched.get(child["uuid"])
+        if isinstance(element, prsv_Information_Object):
+            contents_io.append(element)
+        elif isinstance(element, prsv_Structural_Object):
+            contents_element_so.append(element)
+            new_io, new_element_so = collect_contents_io_so(element, fetched)
             contents_io.extend(new_io)
             contents_element_so.extend(new_element_so)
     return contents_io, contents_element_so
 
 
+def crawl_package(
+    uuid: str,
+    credentials: str,
+    namespaces: dict,
+    workers: int = DEFAULT_WORKERS,
+    cache: prsvcache.EntityCache | None = None,
+) -> dict:
+    """function to get all SOs and IOs of a package one by one from the
+    entity API, returning them by UUID"""
+    top_level_so = get_so(uuid, credentials, namespaces, "top", cache)
+    entities = {top_level_so.uuid: top_level_so}
+    for so_type in ["contents", "metadata"]:
+        child = top_level_so.children[f"{top_level_so.title}_{so_type}"]
+        so = get_so(child["uuid"], credentials, namespaces, so_type, cache)
+        entities[so.uuid] = so
+        entities.update(fetch_contents(so, credentials, namespaces, workers, cache))
+
+    return entities
+
+
+def search_package(top_level_so: prsv_Structural_Object, credentials: str) -> dict:
+    """function to get all SOs and IOs of a package with one search within
+    its top level SO, returning them by UUID with the children of every SO
+    filled in"""
+    res = search_within(credentials, [], top_level_so.uuid, SEARCH_METADATA)
+    hits = parse_search_entities(res)
+
+    entities = {top_level_so.uuid: top_level_so}
+    entities.update({entity.uuid: entity for entity, _ in hits})
+    for entity, parent in hits:
+        parent_so = entities.get(parent)
+        if isinstance(parent_so, prsv_Structural_Object):
+            obj_type = "IO" if isinstance(entity, prsv_Information_Object) else "SO"
+            parent_so.children[entity.title] = {
+                "objType": obj_type,
+                "uuid": entity.uuid,
+            }
+
+    return entities
+
+
+@record_check
 def validate_contents_element_title(
     contents_element: prsv_Information_Object | prsv_Structural_Object,
 ) -> bool:
@@ -415,6 +781,7 @@ def validate_contents_element_title(
         return False
 
 
+@record_check
 def validate_io_type(io_element: prsv_Information_Object) -> bool:
     """function to validate IO type, which must be ioCategory.
     Return True if so; False if not"""
@@ -427,6 +794,7 @@ def validate_io_type(io_element: prsv_Information_Object) -> bool:
         return False
 
 
+@record_check
 def valid_contents_ioCategory(
     io_element: prsv_Information_Object, pkg_type: str
 ) -> bool:
@@ -441,6 +809,7 @@ def valid_contents_ioCategory(
         return False
 
 
+@record_check
 def valid_metadata_ioCategory(metadata_io: prsv_Information_Object) -> bool:
     """function to validate metadata ioCategory, which must be either FTK report
     or Carrier photograph, depending on the file extension"""
@@ -515,6 +884,7 @@ def get_source_file_folder_count(
     return len(file_list), len(folder_list)
 
 
+@record_check
 def valid_contents_count(
     contents_io_ct: int,
     contents_element_so_ct: int,
@@ -540,6 +910,152 @@ def valid_contents_count(
         return False
 
 
+def validate_package(
+    top_level_so: prsv_Structural_Object,
+    entities: dict,
+    da_source: Path,
+    collectionId: str,
+) -> None:
+    """function to run all checks on a package, from its top level SO and
+    all of its SOs and IOs by UUID"""
+    pkg_type = re.search(r"(ER|EM|DI)", top_level_so.title).group(0)
+    contents_f = f"{top_level_so.title}_contents"
+    metadata_f = f"{top_level_so.title}_metadata"
+    contents_so = entities[top_level_so.children[contents_f]["uuid"]]
+    metadata_so = entities[top_level_so.children[metadata_f]["uuid"]]
+
+    valid_all_top_level_so_conditions(top_level_so, pkg_type, collectionId)
+    valid_all_contents_level_so_conditions(contents_so, pkg_type, collectionId)
+    valid_all_metadata_level_so_conditions(metadata_so, pkg_type)
+
+    # validate objects in contents folder, both IOs and SOs
+    contents_io, contents_element_so = collect_contents_io_so(contents_so, entities)
+    contents_io_ct, contents_element_so_ct = get_contents_io_so_count(
+        contents_io, contents_element_so
+    )
+
+    file_ct, folder_ct = get_source_file_folder_count(
+        da_source, collectionId, top_level_so.title
+    )
+    valid_contents_count(contents_io_ct, contents_element_so_ct, file_ct, folder_ct)
+
+    for io in contents_io:
+        validate_all_contents_element_io_conditions(io, pkg_type)
+
+    for so in contents_element_so:
+        validate_all_contents_element_so_conditions(so, pkg_type)
+
+    # validate objects in metadata folder, None or IOs
+    metadata_ios, _ = collect_contents_io_so(metadata_so, entities)
+    for metadata_io in metadata_ios:
+        validate_all_metadata_io_conditions(metadata_io)
+
+
+def error_result(check: str, error: Exception, **fields) -> dict:
+    """function to record an error that stopped a package or a collection
+    from being validated as a failed result"""
+    logging.error(f"{check} failed for {fields}: {error!r}")
+    return {
+        "check": check,
+        "valid": False,
+        **fields,
+        "messages": [f"{type(error).__name__}: {error}"],
+    }
+
+
+def validate_package_uuid(
+    uuid: str,
+    top_level_so: prsv_Structural_Object,
+    collection_id: str,
+    credentials: str,
+    namespaces: dict,
+    da_source: Path,
+    entity_api: bool,
+    threads: int,
+    cache_dir: Path | None = None,
+    cache_ttl: float = DEFAULT_CACHE_TTL,
+) -> list:
+    """function to get and validate a package, returning the result of every
+    check. Runs in a worker process, so it takes and returns plain data"""
+    cache = prsvcache.EntityCache(cache_dir, cache_ttl) if cache_dir else None
+    with collect_check_results() as results:
+        try:
+            if entity_api:
+                entities = crawl_package(uuid, credentials, namespaces, threads, cache)
+            else:
+                entities = search_package(top_level_so, credentials)
+            validate_package(entities[uuid], entities, da_source, collection_id)
+        except Exception as e:
+            # the results of the checks that ran are kept
+            results.append(
+                error_result("validate_package", e, uuid=uuid, title=top_level_so.title)
+            )
+
+    for result in results:
+        result.update(collection=collection_id, package=top_level_so.title)
+    return results
+
+
+def validate_collection(
+    collection_id: str,
+    credentials: str,
+    parentuuid: str,
+    da_source: Path,
+    validate: Callable,
+    executor: ProcessPoolExecutor | None = None,
+) -> Iterator[dict]:
+    """function to validate every package of a collection, yielding the
+    result of every check in package order"""
+    fields_top = [{"name": "spec.specCollectionID", "values": [collection_id]}]
+    res_top = search_within(credentials, fields_top, parentuuid, SEARCH_METADATA)
+    tops = [so for so, _ in parse_search_entities(res_top)]
+    uuid_ls = [so.uuid for so in tops]
+
+    with collect_check_results() as results:
+        ingest_has_correct_ER_number(collection_id, da_source, uuid_ls)
+    for result in results:
+        result.update(collection=collection_id)
+        yield result
+
+    packages = [(uuid, top, collection_id) for uuid, top in zip(uuid_ls, tops)]
+    if executor:
+        futures = [executor.submit(validate, *package) for package in packages]
+        outcomes = [future.result for future in futures]
+    else:
+        outcomes = [functools.partial(validate, *package) for package in packages]
+
+    for (uuid, top, _), outcome in zip(packages, outcomes):
+        try:
+            package_results = outcome()
+        except Exception as e:
+            # e.g. a worker process that died
+            package_results = [
+                error_result(
+                    "validate_package",
+                    e,
+                    uuid=uuid,
+                    title=top.title,
+                    collection=collection_id,
+                    package=top.title,
+                )
+            ]
+        yield from package_results
+
+
+def write_results(results: Iterator[dict], collection_id: str, report) -> None:
+    """function to write the results of a collection to the report, an error
+    that stops the collection is written as a failed result"""
+    try:
+        for result in results:
+            if report:
+                report.write(json.dumps(result) + "\n")
+    except Exception as e:
+        # e.g. the collection search failed, carry on with the next one
+        result = error_result("validate_collection", e, collection=collection_id)
+        if report:
+            report.write(json.dumps(result) + "\n")
+
+
 def main():
     """
     First type of check:
@@ -555,67 +1071,50 @@ def main():
 
     if "test" in args.credentials:
         parentuuid = "c0b9b47a-5552-4277-874e-092b3cc53af6"
-        version = prsvapi.find_apiversion(args.credentials)
         da_source = Path(args.source)
 
     else:
         parentuuid = "e80315bc-42f5-44da-807f-446f78621c08"
-        version = prsvapi.find_apiversion(args.credentials)
         da_source = Path(args.source)
 
-    namespaces = {
-        "xip_ns": f"{{http://preservica.com/XIP/v{version}}}",
-        "entity_ns": f"{{http://preservica.com/EntityAPI/v{version}}}",
-        "spec_ns": "{http://nypl.org/prsv_schemas/specCollection}",
-        "fa_ns": "{http://nypl.org/prsv_schemas/findingAid}",
-    }
-
-    fields_top = [{"name": "spec.specCollectionID", "values": [args.collectionID]}]
-    res_uuid = search_within_DigArch(args.credentials, fields_top, parentuuid)
-    uuid_ls = parse_structural_object_uuid(res_uuid)
-
-    ingest_has_correct_ER_number(args.collectionID, da_source, uuid_ls)
-
-    for uuid in uuid_ls:
-        top_level_so = get_so(uuid, args.credentials, namespaces, "top")
-        pkg_type = re.search(r"(ER|EM|DI)", top_level_so.title).group(0)
-        contents_f = f"{top_level_so.title}_contents"
-        metadata_f = f"{top_level_so.title}_metadata"
-        contents_uuid = top_level_so.children[contents_f]["uuid"]
-        contents_so = get_so(contents_uuid, args.credentials, namespaces, "contents")
-        metadata_uuid = top_level_so.children[metadata_f]["uuid"]
-        metadata_so = get_so(metadata_uuid, args.credentials, namespaces, "metadata")
-
-        valid_all_top_level_so_conditions(top_level_so, pkg_type, args.collectionID)
-        valid_all_contents_level_so_conditions(contents_so, pkg_type, args.collectionID)
-        valid_all_metadata_level_so_conditions(metadata_so, pkg_type)
-
-        # validate objects in contents folder, both IOs and SOs
-        contents_io, contents_element_so = get_contents_io_so(
-            contents_so, args.credentials, namespaces
-        )
-        contents_io_ct, contents_element_so_ct = get_contents_io_so_count(
-            contents_io, contents_element_so
-        )
-
-        file_ct, folder_ct = get_source_file_folder_count(
-            da_source, args.collectionID, top_level_so.title
-        )
-        valid_contents_count(contents_io_ct, contents_element_so_ct, file_ct, folder_ct)
-
-        for io in contents_io:
-            validate_all_contents_element_io_conditions(io, pkg_type)
-
-        for so in contents_element_so:
-            validate_all_contents_element_so_conditions(so, pkg_type)
+    namespaces = prsvapi.get_namespaces(args.credentials)
+
+    if args.report:
+        # the report has every result, keep the console for problems,
+        # checks still log to the root logger so their messages are recorded
+        for handler in logging.getLogger().handlers:
+            if not isinstance(handler, CheckMessageHandler):
+                handler.setLevel(logging.WARNING)
+
+    validate = functools.partial(
+        validate_package_uuid,
+        credentials=args.credentials,
+        namespaces=namespaces,
+        da_source=da_source,
+        entity_api=args.entity_api,
+        threads=args.threads,
+        cache_dir=args.cache_dir,
+        cache_ttl=args.cache_ttl,
+    )
 
-        # validate objects in metadata folder, None or IOs
-        if metadata_so.children:
-            for child in metadata_so.children:
-                metadata_io = get_io(
-                    metadata_so.children[child]["uuid"], args.credentials, namespaces
-                )
-                validate_all_metadata_io_conditions(metadata_io)
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    report = open(args.report, "w") if args.report else None
+    try:
+        for collection_id in args.collection_ids:
+            results = validate_collection(
+                collection_id,
+                args.credentials,
+                parentuuid,
+                da_source,
+                validate,
+                executor,
+            )
+            write_results(results, collection_id, report)
+    finally:
+        if report:
+            report.close()
+        if executor:
+            executor.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import prsv_tools.ingest.lint_ami as prsvlintami
+import prsv_tools.ingest.lint_er as prsvlinter
+import prsv_tools.ingest.move_ami_linted_issues as prsvmoveami
+import prsv_tools.utility.cli as prsvcli
+import prsv_tools.utility.lint as prsvlint
+import prsv_tools.utility.tree as prsvtree
+
+LOGGER = logging.getLogger(__name__)
+
+LINTERS = {"er": prsvlinter, "ami": prsvlintami}
+# seconds a package must stay unchanged before it is linted
+DEFAULT_QUIET_PERIOD = 300
+DEFAULT_INTERVAL = 60
+
+
+def parse_args() -> argparse.Namespace:
+    """Validate and return command-line args"""
+
+    parser = prsvcli.Parser()
+
+    parser.add_argument(
+        "--watch",
+        type=prsvcli.extant_dir,
+        nargs="+",
+        required=True,
+        help="staging directories whose packages are linted as they land",
+    )
+    parser.add_argument(
+        "--type",
+        choices=list(LINTERS),
+        required=True,
+        help="which linter to run on the packages",
+    )
+    parser.add_argument(
+        "--quiet_period",
+        type=int,
+        default=DEFAULT_QUIET_PERIOD,
+        help=f"""Optional. Seconds a package must stay unchanged before it is
+        linted, default {DEFAULT_QUIET_PERIOD}""",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=DEFAULT_INTERVAL,
+        help=f"Optional. Seconds between scans, default {DEFAULT_INTERVAL}",
+    )
+    parser.add_argument(
+        "--destination",
+        type=prsvcli.extant_dir,
+        help="Optional. AMI only, move linted packages with issues here",
+    )
+    parser.add_workers()
+    parser.add_cachedirectory()
+
+    args = parser.parse_args()
+    if args.destination and args.type != "ami":
+        parser.error("--destination can only be used with --type ami")
+    return args
+
+
+class PackageWatcher:
+    """
+    poll staging directories for packages that stopped changing
+    a package is compared by the fingerprint of its index, since inotify
+    does not see writes made by other machines to NFS/ICA mounted shares
+    a linted package is only walked again once the modification time of its
+    folder or of one of its top level entries changes
+    """
+
+    def __init__(
+        self,
+        folders: list[Path],
+        quiet_period: float = DEFAULT_QUIET_PERIOD,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.folders = [Path(x) for x in folders]
+        self.quiet_period = quiet_period
+        self.clock = clock
+        # fingerprint of each package and when it was first seen like that
+        self.seen: dict[Path, tuple[str, float]] = {}
+        # fingerprint of each package when it was last linted
+        self.linted: dict[Path, str] = {}
+        # top level modification times of each package when it was last walked,
+        # and when it was last linted
+        self.stamps: dict[Path, tuple] = {}
+        self.linted_stamps: dict[Path, tuple] = {}
+
+    def packages(self) -> list[Path]:
+        packages = []
+        for folder in self.folders:
+            try:
+                with os.scandir(folder) as it:
+                    packages.extend(Path(x.path) for x in it if x.is_dir())
+            except OSError as e:
+                LOGGER.warning(f"{folder} cannot be read: {e}")
+        return packages
+
+    def stamp(self, package: Path) -> tuple:
+        """return the modification times of a package folder and its top level
+        entries, read without walking the package"""
+        with os.scandir(package) as it:
+            entries = sorted((x.name, x.stat().st_mtime_ns) for x in it)
+        return package.stat().st_mtime_ns, tuple(entries)
+
+    def poll(self) -> list[Path]:
+        """return the packages that have not changed for the quiet period
+        and were not linted as they are now"""
+        now = self.clock()
+        ready = []
+        packages = self.packages()
+        for package in packages:
+            try:
+                stamp = self.stamp(package)
+                if self.linted_stamps.get(package) == stamp:
+                    # linted and not changed since, no need to walk it
+                    continue
+                self.stamps[package] = stamp
+                fingerprint = prsvlint.fingerprint(prsvtree.PackageTree(package))
+            except OSError as e:
+                # e.g. a file renamed or deleted while the package is copied in,
+                # it is still changing so its quiet period starts again
+                LOGGER.info(f"{package} changed while it was read: {e}")
+                self.seen[package] = ("", now)
+                continue
+            if self.linted.get(package) == fingerprint:
+                # e.g. only touched, it is still as it was linted
+                self.linted_stamps[package] = stamp
+            last = self.seen.get(package)
+            if not last or last[0] != fingerprint:
+                self.seen[package] = (fingerprint, now)
+                continue
+            quiet = now - last[1] >= self.quiet_period
+            if quiet and self.linted.get(package) != fingerprint:
+                ready.append(package)
+
+        # forget packages that were moved or deleted
+        for package in set(self.seen) - set(packages):
+            del self.seen[package]
+            self.linted.pop(package, None)
+            self.stamps.pop(package, None)
+            self.linted_stamps.pop(package, None)
+
+        return sorted(ready)
+
+    def mark_linted(self, packages: list[Path]) -> None:
+        for package in packages:
+            if package in self.seen:
+                self.linted[package] = self.seen[package][0]
+                self.linted_stamps[package] = self.stamps[package]
+
+
+def lint_ready(
+    watcher: PackageWatcher,
+    linter,
+    workers: int = 1,
+    cache_dir: Path | None = None,
+    destination: Path | None = None,
+) -> list[prsvlint.LintResult]:
+    """lint the packages that are ready and move the ones with issues
+    if a destination is given"""
+    ready = watcher.poll()
+    if not ready:
+        return []
+
+    results = linter.lint_results(ready, workers, cache_dir)
+    for result in results:
+        LOGGER.info(f"{result.package.name}: {result.verdict} {result.failed_checks}")
+    watcher.mark_linted(ready)
+
+    if destination:
+        prsvmoveami.move_results(results, destination, workers)
+    return results
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)8s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    watcher = PackageWatcher(args.watch, args.quiet_period)
+    linter = LINTERS[args.type]
+    LOGGER.info(f"watching {', '.join(str(x) for x in args.watch)}")
+    while True:
+        try:
+            lint_ready(watcher, linter, args.workers, args.cache_dir, args.destination)
+        except Exception:
+            # packages that were not linted are picked up again by the next scan
+            LOGGER.exception("linting ready packages failed, still watching")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ from multiprocessing import Pool
 import requests
 
 import prsv_tools.utility.api as prsvapi
+import prsv_tools.utility.cache as prsvcache
 import prsv_tools.utility.cli as prsvcli
 
 logging.basicConfig(level=logging.INFO)
@@ -74,6 +75,7 @@ def parse_args():
         action='store_true',
         help="""uses today and yesterday's date as parameters, takes no argument""",
     )
+    parser.add_cachedirectory()
     return parser.parse_args()
 
 
@@ -89,34 +91,33 @@ def parse_structural_object_uuid(res: requests.Response) -> list:
 
 
 def search_preservica_api(
-    accesstoken: str, query_params: dict, parentuuid: str
+    credentials: str, query_params: dict, parentuuid: str
 ) -> requests.Response:
     query = json.dumps(query_params)
     #search_url = f"https://nypl.preservica.com/api/content/search?q={query}&start=0&max=-1&metadata=''"
     #search-within
     search_url = f"https://nypl.preservica.com/api/content/search-within?q={query}&parenthierarchy={parentuuid}&start=0&max=-1&metadata=''"
     search_headers = {
-        "Preservica-Access-Token": accesstoken,
         "Content-Type": "application/xml;charset=UTF-8",
     }
     logging.info("")
-    search_response = requests.get(search_url, headers=search_headers)
+    search_response = prsvapi.get_client(credentials).get(search_url, headers=search_headers)
     logging.info("")
     return search_response
 
 
 def get_collection_uuids(
-    accesstoken: str, id: str, parentuuid: str
+    credentials: str, id: str, parentuuid: str
 ) -> requests.Response:
     query_params = {
         "q": "",
         "fields": [{"name": "spec.specCollectionID", "values": [id]}],
     }
-    return search_preservica_api(accesstoken, query_params, parentuuid)
+    return search_preservica_api(credentials, query_params, parentuuid)
 
 
 def get_packages_uuids(
-    accesstoken: str, pkg_id: str, parentuuid: str
+    credentials: str, pkg_id: str, parentuuid: str
 ) -> requests.Response:
     col_id = re.search(r"(M\d+)_(ER|DI|EM)_\d+", pkg_id).group(1)
     query_params = {
@@ -126,11 +127,11 @@ def get_packages_uuids(
             {"name": "spec.specCollectionID", "values": [col_id]},
         ],
     }
-    return search_preservica_api(accesstoken, query_params, parentuuid)
+    return search_preservica_api(credentials, query_params, parentuuid)
 
 
 def get_amipackages_uuids(
-        accesstoken: str, pkg_id: str, parentuuid: str
+        credentials: str, pkg_id: str, parentuuid: str
 ) -> requests.Response:
     """get AMI uuids based on first 3 digits of AMI ID"""
     query_params = {
@@ -140,10 +141,10 @@ def get_amipackages_uuids(
             {"name": "xip.identifier", "values": ["DigitizedAMIContainer"]}
         ]
     }
-    return search_preservica_api(accesstoken, query_params, parentuuid)
+    return search_preservica_api(credentials, query_params, parentuuid)
 
 def get_amibydate_uuids(
-        accesstoken: str, start_date, end_date, parentuuid: str 
+        credentials: str, start_date, end_date, parentuuid: str 
 ) -> requests.Response:
     """get AMI uuids based on a date range"""
     query_params = {
@@ -153,10 +154,10 @@ def get_amibydate_uuids(
             {"name": "xip.identifier", "values": ["DigitizedAMIContainer"]}
         ]
     }
-    return search_preservica_api(accesstoken, query_params, parentuuid)
+    return search_preservica_api(credentials, query_params, parentuuid)
 
 def get_amifromdate_uuids(
-        accesstoken: str, end_date, parentuuid: str 
+        credentials: str, end_date, parentuuid: str 
 ) -> requests.Response:
     """get AMI uuids before a specific date"""
     query_params = {
@@ -166,10 +167,10 @@ def get_amifromdate_uuids(
             {"name": "xip.identifier", "values": ["DigitizedAMIContainer"]}
         ]
     }
-    return search_preservica_api(accesstoken, query_params, parentuuid)
+    return search_preservica_api(credentials, query_params, parentuuid)
 
 def get_daily_ami_uuids(
-        accesstoken: str, end_date, parentuuid: str
+        credentials: str, end_date, parentuuid: str
 ) -> requests.Response:
     """get AMI uuids from the last day"""
     today = datetime.now()
@@ -183,29 +184,37 @@ def get_daily_ami_uuids(
             {"name": "xip.identifier", "values": ["DigitizedAMIContainer"]}
         ]
     }
-    return search_preservica_api(accesstoken, query_params, parentuuid)
+    return search_preservica_api(credentials, query_params, parentuuid)
+
+def get_pkg_title(
+    pkg_uuid: str,
+    credentials: str,
+    cache: prsvcache.EntityCache | None = None,
+) -> str:
+    cached = cache.get(pkg_uuid, "title") if cache else None
+    if cached:
+        return cached["title"]
 
-def get_pkg_title(accesstoken: str, pkg_uuid: str, credentials: str) -> str:
     get_so_url = f"https://nypl.preservica.com/api/entity/structural-objects/{pkg_uuid}"
     get_pkg_headers = {
-        "Preservica-Access-Token": accesstoken,
         "Content-Type": "application/xml;charset=UTF-8",
     }
-    res = requests.get(get_so_url, headers=get_pkg_headers)
+    res = prsvapi.get_client(credentials).get(get_so_url, headers=get_pkg_headers)
 
     root = ET.fromstring(res.text)
-    version = prsvapi.find_apiversion(credentials)
-    title = root.find(f".//{{http://preservica.com/XIP/v{version}}}Title").text
+    xip_ns = prsvapi.get_namespaces(credentials)["xip_ns"]
+    title = root.find(f".//{xip_ns}Title").text
 
+    if cache:
+        cache.put(pkg_uuid, "title", {"title": title})
     return title
 
-def post_so_api(uuid: str, accesstoken: str) -> requests.Response:
+def post_so_api(uuid: str, credentials: str) -> requests.Response:
     """Make a POST request to the export Structural Object endpoint"""
     export_so_url = (
         f"https://nypl.preservica.com/api/entity/structural-objects/{uuid}/exports"
     )
     export_headers = {
-        "Preservica-Access-Token": accesstoken,
         "Content-Type": "application/xml;charset=UTF-8",
     }
 
@@ -218,14 +227,16 @@ def post_so_api(uuid: str, accesstoken: str) -> requests.Response:
         + "</ExportAction>"
     )
     # make the API call
-    post_response = requests.post(export_so_url, headers=export_headers, data=xml_str)
+    post_response = prsvapi.get_client(credentials).post(
+        export_so_url, headers=export_headers, data=xml_str
+    )
 
     return post_response
 
-def api_status(pkg_uuid, credentials: str):
-    accesstoken_a = prsvapi.get_token(credentials)
-    post_response = post_so_api(pkg_uuid, accesstoken_a)
-    pkg_id = get_pkg_title(accesstoken_a, pkg_uuid, credentials)
+def api_status(pkg_uuid, credentials: str, cache_dir: Path | None = None):
+    post_response = post_so_api(pkg_uuid, credentials)
+    cache = prsvcache.EntityCache(cache_dir) if cache_dir else None
+    pkg_id = get_pkg_title(pkg_uuid, credentials, cache)
 
     container_path = Path("/containers/metadata_exports")
     pkg_dir_path = container_path / f"{pkg_id[:3]}"
@@ -260,7 +271,7 @@ def api_status(pkg_uuid, credentials: str):
     # checking for API status code for 15 times. with 5 secs interval
     for _ in range(5): # change to keep running until all packages pass
         time.sleep(15)
-        get_progress_response = get_progress_api(progresstoken, accesstoken_a)
+        get_progress_response = get_progress_api(progresstoken, credentials)
         logging.info(get_progress_response.text)
 
         if get_progress_response.status_code != 200:
@@ -273,7 +284,7 @@ def api_status(pkg_uuid, credentials: str):
             logging.info(f"Progress completed. Will proceed to download {pkg_id}")
             time.sleep(10)
             get_export_request = get_export_download_api(
-                progresstoken, accesstoken_a
+                progresstoken, credentials
             )
             # checking for API status code
             if get_export_request.status_code == 200:
@@ -293,32 +304,32 @@ def api_status(pkg_uuid, credentials: str):
                 )
 
 
-def get_progress_api(progresstoken, accesstoken) -> requests.Response:
+def get_progress_api(progresstoken, credentials: str) -> requests.Response:
     """Make a GET request to check progress of the export request"""
     check_progress_url = f"https://nypl.preservica.com/api/entity/progress/{progresstoken}?includeErrors=true"
 
     get_progress_headers = {
-        "Preservica-Access-Token": accesstoken,
         "accept": "application/xml;charset=UTF-8",
     }
     # make the API call
-    get_progress_response = requests.get(
+    get_progress_response = prsvapi.get_client(credentials).get(
         check_progress_url, headers=get_progress_headers
     )
 
     return get_progress_response
 
 
-def get_export_download_api(progresstoken, accesstoken):
+def get_export_download_api(progresstoken, credentials: str):
     """Make a GET request to download the package"""
     get_export_url = f"https://nypl.preservica.com/api/entity/actions/exports/{progresstoken}/content"
 
     get_export_headers = {
-        "Preservica-Access-Token": accesstoken,
         "accept": "application/octet-stream",
         "Content-Type": "application/xml;charset=UTF-8",
     }
-    get_progress_response = requests.get(get_export_url, headers=get_export_headers)
+    get_progress_response = prsvapi.get_client(credentials).get(
+        get_export_url, headers=get_export_headers
+    )
 
     return get_progress_response
 
@@ -326,8 +337,7 @@ def get_export_download_api(progresstoken, accesstoken):
 def main():
     args = parse_args()
 
-    # generate token
-    accesstoken = prsvapi.get_token(args.credentials)
+    cache = prsvcache.EntityCache(args.cache_dir) if args.cache_dir else None
 
     if "test" in args.credentials:
         digarch_uuid = "c0b9b47a-5552-4277-874e-092b3cc53af6"
@@ -342,55 +352,55 @@ def main():
     if args.collection_id:
         col_id_ls = args.collection_id.split()
         for col_id in col_id_ls:
-            res = get_collection_uuids(accesstoken, col_id, digarch_uuid)
+            res = get_collection_uuids(args.credentials, col_id, digarch_uuid)
             so_uuids = parse_structural_object_uuid(res)
 
             for uuid in so_uuids:
-                pkg_title = get_pkg_title(accesstoken, uuid, args.credentials)
+                pkg_title = get_pkg_title(uuid, args.credentials, cache)
                 pkg_dict[pkg_title] = uuid
             print(pkg_dict)
     if args.package_id:
         pkg_id_ls = args.package_id.split()
         for pkg_id in pkg_id_ls:
-            res = get_packages_uuids(accesstoken, pkg_id, digarch_uuid)
+            res = get_packages_uuids(args.credentials, pkg_id, digarch_uuid)
             uuid = parse_structural_object_uuid(res)
             for id in uuid:
-                pkg_title = get_pkg_title(accesstoken, id, args.credentials)
+                pkg_title = get_pkg_title(id, args.credentials, cache)
                 pkg_dict[pkg_title] = uuid[0]
     if args.amipackage_id:
-        res = get_amipackages_uuids(accesstoken, args.amipackage_id, ami_uuid) 
+        res = get_amipackages_uuids(args.credentials, args.amipackage_id, ami_uuid) 
         logging.info(res)
         uuids = parse_structural_object_uuid(res)
         logging.info(uuids)
         for id in uuids:
-            pkg_title = get_pkg_title(accesstoken, id, args.credentials)
+            pkg_title = get_pkg_title(id, args.credentials, cache)
             logging.info(pkg_title)
             pkg_dict[pkg_title] = id
     if args.ami_ingest_start_date and args.ami_ingest_end_date:
-        res = get_amibydate_uuids(accesstoken, args.ami_ingest_start_date, args.ami_ingest_end_date, ami_uuid) 
+        res = get_amibydate_uuids(args.credentials, args.ami_ingest_start_date, args.ami_ingest_end_date, ami_uuid) 
         logging.info(res)
         uuids = parse_structural_object_uuid(res)
         logging.info(uuids)
         for id in uuids:
-            pkg_title = get_pkg_title(accesstoken, id, args.credentials)
+            pkg_title = get_pkg_title(id, args.credentials, cache)
             logging.info(pkg_title)
             pkg_dict[pkg_title] = id
     if args.ami_ingest_end_date:
-        res = get_amifromdate_uuids(accesstoken, args.ami_ingest_end_date, ami_uuid)
+        res = get_amifromdate_uuids(args.credentials, args.ami_ingest_end_date, ami_uuid)
         logging.info(res)
         uuids = parse_structural_object_uuid(res)
         logging.info(uuids)
         for id in uuids:
-            pkg_title = get_pkg_title(accesstoken, id, args.credentials)
+            pkg_title = get_pkg_title(id, args.credentials, cache)
             logging.info(pkg_title)
             pkg_dict[pkg_title] = id
     if args.daily_ami:
-        res = get_daily_ami_uuids(accesstoken, args.ami_ingest_end_date, ami_uuid)
+        res = get_daily_ami_uuids(args.credentials, args.ami_ingest_end_date, ami_uuid)
         logging.info(res)
         uuids = parse_structural_object_uuid(res)
         logging.info(uuids)
         for id in uuids:
-            pkg_title = get_pkg_title(accesstoken, id, args.credentials)
+            pkg_title = get_pkg_title(id, args.credentials, cache)
             logging.info(pkg_title)
             pkg_dict[pkg_title] = id
 
@@ -398,7 +408,9 @@ def main():
     cpu = os.cpu_count()
     status_process = Pool(processes=(cpu-2))
     #apply the list of uuids to api_status(), credentials is a permanent param
-    api_status_f = partial(api_status, credentials=args.credentials)
+    api_status_f = partial(
+        api_status, credentials=args.credentials, cache_dir=args.cache_dir
+    )
     status_result = status_process.map(api_status_f, uuids)
     #close & join Pool
     status_process.close()
@@ -4,6 +4,7 @@ from pathlib import Path
 import requests
 
 import prsv_tools.utility.api as prsvapi
+import prsv_tools.utility.cache as prsvcache
 import prsv_tools.utility.cli as prsvcli
 
 
@@ -31,35 +32,43 @@ def parse_args():
         required=False,
         help="""Optional. Provide filter to search for specific children""",
     )
+    parser.add_cachedirectory()
 
     return parser.parse_args()
 
 
-def get_api_results(accesstoken: str, url: str) -> requests.Response:
+def get_api_results(credentials: str, url: str) -> requests.Response:
     headers = {
-        "Preservica-Access-Token": accesstoken,
         "Content-Type": "application/xml",
     }
-    response = requests.request("GET", url, headers=headers)
+    # the client adds the token and replaces it when it runs out
+    response = prsvapi.get_client(credentials).get(url, headers=headers)
     return response
 
 
-def get_all_category_children(token: str, category_id: str, filter=None) -> list[str]:
-    version = prsvapi.find_apiversion(token)
-    ns = {"": f"{{http://preservica.com/EntityAPI/v{version}}}"}
+def get_entity_ns(root: ET.Element) -> dict:
+    """return the namespace map for an Entity API response, versioned
+    like the response itself so the version is not looked up separately"""
+    version = prsvapi.parse_apiversion(root.tag)
+    return {"": f"{{http://preservica.com/EntityAPI/v{version}}}"}
 
+
+def get_all_category_children(
+    credentials: str, category_id: str, filter=None
+) -> list[str]:
     start = 0
     url = f"https://nypl.preservica.com/api/entity/structural-objects/86531e4f-3370-4944-9b70-6b64873226fa/children?start={start}&max=1"
-    response = get_api_results(token, url)
+    response = get_api_results(credentials, url)
 
     root = ET.fromstring(response.text)
+    ns = get_entity_ns(root)
     end = int(root.find(".//TotalResults", namespaces=ns).text)
     print(end)
     children = []
     while start < end:
 
         url = f"https://nypl.preservica.com/api/entity/structural-objects/86531e4f-3370-4944-9b70-6b64873226fa/children?start={start+1}&max=1000"
-        response = get_api_results(token, url)
+        response = get_api_results(credentials, url)
         root = ET.fromstring(response.text)
         children_results = root.findall(".//Child", namespaces=ns)
         for child in children_results:
@@ -74,27 +83,28 @@ def get_all_category_children(token: str, category_id: str, filter=None) -> list
     return children
 
 
-def get_all_category_grandchildren(token: str, children: list[str]) -> list[str]:
-    version = prsvapi.find_apiversion(token)
-    ns = {"": f"{{http://preservica.com/EntityAPI/v{version}}}"}
+def get_all_category_grandchildren(
+    credentials: str,
+    children: list[str],
+    cache: prsvcache.EntityCache | None = None,
+) -> list[str]:
     good = []
     for child in children:
+        # only good ingests are kept, a bad one may have been re-ingested since
+        if cache and cache.get(child[0], "ingest_check"):
+            good.append(child)
+            continue
         url = f"https://nypl.preservica.com/api/entity/structural-objects/{child[0]}/children?start=1&max=2"
-        response = get_api_results(token, url)
-        if response.status_code != 200:
-            token = prsvapi.get_token("prod-ingest")
-            response = get_api_results(token, url)
+        response = get_api_results(credentials, url)
         root = ET.fromstring(response.text)
+        ns = get_entity_ns(root)
         grandchild_maybe = root.find(".//Child", namespaces=ns)
         if grandchild_maybe is None:
             print(f"{child[1]} was a bad ingest?")
             continue
         grandchild = grandchild_maybe.get("ref")
         url2 = f"https://nypl.preservica.com/api/entity/structural-objects/{grandchild}/children"
-        response2 = get_api_results(token, url2)
-        if response2.status_code != 200:
-            token = prsvapi.get_token("prod-ingest")
-            response2 = get_api_results(token, url2)
+        response2 = get_api_results(credentials, url2)
         root2 = ET.fromstring(response2.text)
         total_ = root2.find(".//TotalResults", namespaces=ns)
         if total_ is None:
@@ -106,6 +116,8 @@ def get_all_category_grandchildren(token: str, children: list[str]) -> list[str]
             print(f"{child[1]} was a bad ingest?")
         else:
             good.append(child)
+            if cache:
+                cache.put(child[0], "ingest_check", {"good": True})
 
     return good
 
@@ -132,11 +144,13 @@ def main():
         "DigImages": "e544e461-3007-4de0-832d-381ec034424b",
     }
 
-    token = prsvapi.get_token(args.credentials)
+    cache = prsvcache.EntityCache(args.cache_dir) if args.cache_dir else None
 
     # Fetch all children of parent
-    results = get_all_category_children(token, categories["DigAMI"], args.filter)
-    child_results = get_all_category_grandchildren(token, results)
+    results = get_all_category_children(
+        args.credentials, categories["DigAMI"], args.filter
+    )
+    child_results = get_all_category_grandchildren(args.credentials, results, cache)
 
     # Write all children to file
     fname = f"DigAMI_{args.filter}"
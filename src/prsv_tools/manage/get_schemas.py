@@ -29,18 +29,18 @@ def parse_args():
     return parser.parse_args()
 
 
-def get_api_results(accesstoken: str, url: str) -> requests.Response:
+def get_api_results(credentials: str, url: str) -> requests.Response:
     headers = {
-        "Preservica-Access-Token": accesstoken,
         "Content-Type": "application/xml",
     }
-    response = requests.request("GET", url, headers=headers)
+    response = prsvapi.get_client(credentials).get(url, headers=headers)
     return response
 
 
-def parse_res_to_dict(response: requests.Response, token) -> dict:
+def parse_res_to_dict(response: requests.Response) -> dict:
     root = ET.fromstring(response.text)
-    version = prsvapi.find_apiversion(token)
+    # the listing is namespaced with the API version, no need to look it up
+    version = prsvapi.parse_apiversion(root.tag)
     ns = f"{{http://preservica.com/AdminAPI/v{version}}}"
     names = [name.text.replace(" ", "_") for name in root.iter(f"{ns}Name")]
     ids = [id.text for id in root.iter(f"{ns}ApiId")]
@@ -50,12 +50,12 @@ def parse_res_to_dict(response: requests.Response, token) -> dict:
     return name_id_dict
 
 
-def fetch_and_write_content(token, url, folder, file_extension) -> None:
-    content_res = get_api_results(token, url)
-    content_dict = parse_res_to_dict(content_res, token)
+def fetch_and_write_content(credentials, url, folder, file_extension) -> None:
+    content_res = get_api_results(credentials, url)
+    content_dict = parse_res_to_dict(content_res)
     for item_name in content_dict:
         item_content_url = f"{url}/{content_dict[item_name]}/content"
-        item_res = get_api_results(token, item_content_url)
+        item_res = get_api_results(credentials, item_content_url)
         filepath = folder.joinpath(folder, f"{item_name}.{file_extension}")
         with open(filepath, "w") as f:
             f.write(item_res.text)
@@ -79,16 +79,14 @@ def main():
     else:
         folder = Path.cwd()
 
-    token = prsvapi.get_token(args.credentials)
-
     # Fetch and write schemas
-    fetch_and_write_content(token, schemas_url, folder, "xsd")
+    fetch_and_write_content(args.credentials, schemas_url, folder, "xsd")
 
     # Fetch and write documents
-    fetch_and_write_content(token, documents_url, folder, "xml")
+    fetch_and_write_content(args.credentials, documents_url, folder, "xml")
 
     # Fetch and write transforms
-    fetch_and_write_content(token, transforms_url, folder, "xslt")
+    fetch_and_write_content(args.credentials, transforms_url, folder, "xslt")
 
 
 if __name__ == "__main__":
@@ -1,30 +1,266 @@
+import json
+import logging
+import os
 import re
+import threading
 import time
+import weakref
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable, Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
 
 import prsv_tools.utility.creds as prsvcreds
 
-TOKEN_BASE_URL = "https://nypl.preservica.com/api/accesstoken/login"
+try:
+    import fcntl
+except ImportError:  # Windows, the token file is only locked between threads
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+BASE_URL = "https://nypl.preservica.com"
+TOKEN_BASE_URL = f"{BASE_URL}/api/accesstoken/login"
+TOKEN_HEADER = "Preservica-Access-Token"
+# token files are shared with other processes started in the same directory
+TOKEN_DIR = Path(".")
+
+# tokens are valid for 500 seconds
+TOKEN_LIFETIME = 500
+# replace tokens this long before they expire, so no request races the expiry
+TOKEN_REFRESH_MARGIN = 60
+
+# connections kept open per host, shared by every thread using a client
+DEFAULT_POOL_SIZE = 10
+
+_CLIENTS: dict[tuple[str | None, int], "PrsvClient"] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# the API version only changes when the instance is upgraded
+APIVERSION_TTL = 24 * 60 * 60
+
+_APIVERSIONS: dict[tuple[str, str], str] = {}
+_APIVERSIONS_LOCK = threading.Lock()
+
+# every live TokenManager, reset in forked children by one handler
+_TOKEN_MANAGERS: "weakref.WeakSet[TokenManager]" = weakref.WeakSet()
+
+
+@contextmanager
+def _file_lock(lock_file: Path) -> Iterator[None]:
+    """hold an exclusive lock on lock_file, shared by every process on the host"""
+    with open(lock_file, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_token_file(token_file: Path) -> tuple[float, str] | None:
+    """return the issue time and token stored in token_file, if any"""
+    if not token_file.is_file():
+        return None
+    try:
+        time_issued, sessiontoken = token_file.read_text().split("\n")
+        return float(time_issued), sessiontoken
+    except ValueError:
+        return None
+
+
+def _is_fresh(time_issued: float) -> bool:
+    return time.time() - time_issued < TOKEN_LIFETIME - TOKEN_REFRESH_MARGIN
+
+
+class TokenManager:
+    """
+    keep tokens in memory, one per credential set
+    the token file is shared between processes and guarded by a lock file,
+    so only one process logs in when a token runs out
+    tokens that are in use are refreshed in the background before they expire
+    """
+
+    def __init__(self, token_dir: Path = TOKEN_DIR, background_refresh: bool = True):
+        self.token_dir = Path(token_dir)
+        self.background_refresh = background_refresh
+        self._tokens: dict[str, tuple[float, str]] = {}
+        self._used: set[str] = set()
+        self._timers: dict[str, threading.Timer] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        _TOKEN_MANAGERS.add(self)
+
+    def _reset_after_fork(self) -> None:
+        self._timers = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def token_file(self, credential_set: str) -> Path:
+        return self.token_dir / f"{credential_set}.token.file"
+
+    def _lock_for(self, credential_set: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(credential_set, threading.Lock())
+
+    def get(self, credential_set: str) -> str:
+        """return a token for credential_set, from memory when it is still fresh"""
+        self._used.add(credential_set)
+        cached = self._tokens.get(credential_set)
+        if cached and _is_fresh(cached[0]):
+            return cached[1]
+
+        return self.refresh(credential_set)
+
+    def refresh(self, credential_set: str, rejected: str | None = None) -> str:
+        """
+        return a fresh token for credential_set
+        a token written by another process is reused unless it is rejected
+        """
+        with self._lock_for(credential_set):
+            # another thread may have refreshed the token while this one waited
+            cached = self._tokens.get(credential_set)
+            if cached and _is_fresh(cached[0]) and cached[1] != rejected:
+                return cached[1]
+
+            token_file = self.token_file(credential_set)
+            with _file_lock(token_file.with_suffix(".lock")):
+                stored = _read_token_file(token_file)
+                if stored and _is_fresh(stored[0]) and stored[1] != rejected:
+                    time_issued, token = stored
+                else:
+                    time_issued = time.time()
+                    token = create_token(credential_set, token_file)
+
+            self._tokens[credential_set] = (time_issued, token)
+            self._schedule_refresh(credential_set, time_issued)
+
+        return token
+
+    def _schedule_refresh(self, credential_set: str, time_issued: float) -> None:
+        if not self.background_refresh:
+            return
+
+        timer = self._timers.pop(credential_set, None)
+        if timer:
+            timer.cancel()
+
+        delay = time_issued + TOKEN_LIFETIME - TOKEN_REFRESH_MARGIN - time.time()
+        timer = threading.Timer(
+            max(delay, 0), self._background_refresh, args=[credential_set]
+        )
+        timer.daemon = True
+        self._timers[credential_set] = timer
+        timer.start()
+
+    def _background_refresh(self, credential_set: str) -> None:
+        # idle credential sets are left to expire
+        if credential_set not in self._used:
+            return
+        self._used.discard(credential_set)
+
+        try:
+            self.refresh(credential_set)
+        except (requests.RequestException, prsvcreds.PrsvCredentialException) as e:
+            LOGGER.warning(f"Background refresh of {credential_set} token failed: {e}")
+
+
+def _reset_token_managers_after_fork() -> None:
+    for token_manager in list(_TOKEN_MANAGERS):
+        token_manager._reset_after_fork()
+
+
+# locks and timers do not survive a fork, e.g. multiprocessing.Pool
+os.register_at_fork(after_in_child=_reset_token_managers_after_fork)
+
+TOKENS = TokenManager()
+
+
+def log_response_time(response: requests.Response, *args, **kwargs) -> None:
+    """response hook, log the method, url, status and round trip time"""
+    LOGGER.debug(
+        f"{response.request.method} {response.url} {response.status_code} "
+        f"{response.elapsed.total_seconds():.3f}s"
+    )
+
+
+class PrsvClient(requests.Session):
+    """
+    keep-alive session for the Preservica API
+    connections are pooled, so the TLS handshake is paid once per host
+    if a credential set is given, every request without a token gets one,
+    and a request rejected with 401 is retried once with a new token
+    """
+
+    def __init__(
+        self,
+        credential_set: str | None = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        response_hook: Callable | None = log_response_time,
+    ):
+        super().__init__()
+        self.credential_set = credential_set
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        if response_hook:
+            self.hooks["response"].append(response_hook)
+
+    def prepare_request(self, request: requests.Request) -> requests.PreparedRequest:
+        if self.credential_set and TOKEN_HEADER not in request.headers:
+            request.headers = {
+                TOKEN_HEADER: get_token(self.credential_set),
+                **request.headers,
+            }
+        return super().prepare_request(request)
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        response = super().request(method, url, *args, **kwargs)
+
+        token_added = TOKEN_HEADER not in (kwargs.get("headers") or {})
+        if response.status_code == 401 and self.credential_set and token_added:
+            LOGGER.info(f"Token for {self.credential_set} rejected, retrying {url}")
+            TOKENS.refresh(
+                self.credential_set, rejected=response.request.headers[TOKEN_HEADER]
+            )
+            response = super().request(method, url, *args, **kwargs)
+
+        return response
+
+
+def get_client(
+    credential_set: str | None = None, pool_size: int = DEFAULT_POOL_SIZE
+) -> PrsvClient:
+    """
+    return the client shared by everything in this process for a credential set
+    without a credential set, callers must send their own token header
+    pool_size only applies when the client is first created
+    """
+    # sockets must not be shared with forked children, e.g. multiprocessing.Pool
+    key = (credential_set, os.getpid())
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = PrsvClient(credential_set, pool_size=pool_size)
+            _CLIENTS[key] = client
+
+    return client
 
 
 def get_token(credential_set: str) -> str:
     """
     return token string
-    check for existing valid token in token file
-    if the file does not exist or the token is out of date, create token
+    tokens are kept in memory and shared with other processes via the token file
+    if neither holds a fresh token, create token
     """
 
-    token_file = Path(f"{credential_set}.token.file")
-    if token_file.is_file():
-        time_issued, sessiontoken = token_file.read_text().split("\n")
-        # tokens are valid for 500 seconds
-        if time.time() - float(time_issued) < 500:
-            return sessiontoken
-
-    return create_token(credential_set, token_file)
+    return TOKENS.get(credential_set)
 
 
 def create_token(credential_set: str, token_file: Path) -> str:
@@ -40,7 +276,7 @@ def create_token(credential_set: str, token_file: Path) -> str:
     url = TOKEN_BASE_URL
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     payload = f"username={user}&password={pw}&tenant={tenant}"
-    response = requests.post(url, headers=headers, data=payload)
+    response = get_client().post(url, headers=headers, data=payload)
     data = response.json()
 
     if not data["success"]:
@@ -54,22 +290,81 @@ def create_token(credential_set: str, token_file: Path) -> str:
     return data["token"]
 
 
-def find_apiversion(credential_set: str) -> str:
-    schemas_url = "https://nypl.preservica.com/api/admin/schemas"
-    token = get_token(credential_set)
-    headers = {
-        "Preservica-Access-Token": token,
-        "Content-Type": "application/xml",
-    }
-    response = requests.request("GET", schemas_url, headers=headers)
-    root = ET.fromstring(response.text)
-
-    version_search = re.search(r"v(\d+\.\d+)\}", root.tag)
+def parse_apiversion(tag: str) -> str:
+    """return the API version from a namespaced tag, e.g. {...XIP/v7.0}Title"""
+    version_search = re.search(r"v(\d+\.\d+)\}", tag)
     if version_search:
         return version_search.group(1)
     else:
         return ""
 
 
+def _read_apiversion_file(version_file: Path, base_url: str) -> str:
+    """return the version stored in version_file if it is recent and for base_url"""
+    try:
+        stored = json.loads(version_file.read_text())
+    except (OSError, ValueError):
+        return ""
+
+    if stored.get("base_url") != base_url:
+        return ""
+    if time.time() - stored.get("time", 0) > APIVERSION_TTL:
+        return ""
+    return stored.get("version", "")
+
+
+def find_apiversion(
+    credential_set: str, base_url: str = BASE_URL, persist: bool = True
+) -> str:
+    """
+    return the API version of the instance, e.g. 7.0
+    the schemas endpoint is only asked once per process per credential set and
+    host, and with persist the answer is kept next to the token file
+    """
+    key = (credential_set, base_url)
+    if key in _APIVERSIONS:
+        return _APIVERSIONS[key]
+
+    with _APIVERSIONS_LOCK:
+        if key in _APIVERSIONS:
+            return _APIVERSIONS[key]
+
+        version_file = TOKENS.token_dir / f"{credential_set}.apiversion.file"
+        version = _read_apiversion_file(version_file, base_url) if persist else ""
+
+        if not version:
+            schemas_url = f"{base_url}/api/admin/schemas"
+            headers = {"Content-Type": "application/xml"}
+            response = get_client(credential_set).get(schemas_url, headers=headers)
+            root = ET.fromstring(response.text)
+            version = parse_apiversion(root.tag)
+
+            # an unknown version is looked up again next time
+            if not version:
+                return version
+            if persist:
+                version_file.write_text(
+                    json.dumps(
+                        {"time": time.time(), "base_url": base_url, "version": version}
+                    )
+                )
+
+        _APIVERSIONS[key] = version
+
+    return version
+
+
+def get_namespaces(credential_set: str) -> dict[str, str]:
+    """return the ElementTree namespace prefixes for the instance's API version"""
+    version = find_apiversion(credential_set)
+    return {
+        "xip_ns": f"{{http://preservica.com/XIP/v{version}}}",
+        "entity_ns": f"{{http://preservica.com/EntityAPI/v{version}}}",
+        "admin_ns": f"{{http://preservica.com/AdminAPI/v{version}}}",
+        "spec_ns": "{http://nypl.org/prsv_schemas/specCollection}",
+        "fa_ns": "{http://nypl.org/prsv_schemas/findingAid}",
+    }
+
+
 def main():
     get_token()
@@ -0,0 +1,130 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import bagit
+
+import prsv_tools.utility.checksum as prsvchecksum
+import prsv_tools.utility.tree as prsvtree
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = prsvchecksum.DEFAULT_WORKERS
+
+
+def log_progress(package: str) -> Callable[[int, int], None]:
+    """return a progress callback that logs every 10% of a bag hashed"""
+    logged = [-1]
+
+    def progress(done: int, total: int) -> None:
+        tenth = done * 10 // total if total else 10
+        if tenth > logged[0]:
+            logged[0] = tenth
+            LOGGER.info(f"{package} {tenth * 10}% of {total} bytes verified")
+
+    return progress
+
+
+def supported_algorithms(bag: bagit.Bag) -> list[str]:
+    """return the manifest algorithms of a bag that can be hashed here,
+    warning about the ones that are skipped"""
+    # bag.algorithms has the tag manifests too
+    algorithms = {x for entry in bag.payload_entries().values() for x in entry}
+    supported = []
+    for algorithm in sorted(algorithms):
+        try:
+            prsvchecksum.normalize(algorithm)
+            supported.append(algorithm)
+        except ValueError:
+            LOGGER.warning(f"{bag.path} manifest-{algorithm}.txt is not checked")
+    return supported
+
+
+def mismatched_files(
+    manifest: dict[str, dict[str, str]],
+    payload: dict[str, prsvtree.TreeEntry],
+    algorithms: list[str],
+    workers: int = DEFAULT_WORKERS,
+    progress: Callable[[int, int], None] | None = None,
+) -> list[str]:
+    """hash every file of a manifest in the given algorithms, up to workers
+    files at a time, and return the ones whose digests differ from it"""
+    total = sum(x.size for x in payload.values())
+    lock = threading.Lock()
+    done = [0]
+
+    def check(relpath: str) -> tuple[str, bool]:
+        # hex digests are case-insensitive, hashlib writes them in lowercase
+        expected = {
+            alg: x.lower() for alg, x in manifest[relpath].items() if alg in algorithms
+        }
+        found = prsvchecksum.hash_file(payload[relpath].path, list(expected))
+        if progress:
+            with lock:
+                done[0] += payload[relpath].size
+                progress(done[0], total)
+        return relpath, found == expected
+
+    with ThreadPoolExecutor(max(workers, 1)) as executor:
+        return [x for x, ok in executor.map(check, sorted(manifest)) if not ok]
+
+
+def validate_bag(
+    package: Path | prsvtree.PackageTree,
+    workers: int = DEFAULT_WORKERS,
+    progress: Callable[[int, int], None] | None = None,
+) -> list[tuple[str, list[Path]]]:
+    """
+    check the payload of a bag against its manifests and return every problem
+    with the paths it concerns, an empty list for a valid bag
+    the Payload-Oxum and the file list are compared first, from the package
+    index, so a bag with missing or resized files is not hashed at all
+    """
+    package = prsvtree.as_tree(package)
+    try:
+        bag = bagit.Bag(str(package.root))
+    except bagit.BagError as e:
+        return [(f"cannot be read as a bag, {e}", [package.root])]
+
+    manifest = bag.payload_entries()
+    payload = {str(x.relpath): x for x in package.files("data")}
+
+    problems = []
+    missing = sorted(set(manifest) - set(payload))
+    if missing:
+        problems.append(("is missing files", [package.root / x for x in missing]))
+    unlisted = sorted(set(payload) - set(manifest))
+    if unlisted:
+        problems.append(
+            ("has files not in a manifest", [payload[x].path for x in unlisted])
+        )
+
+    algorithms = supported_algorithms(bag)
+    if not algorithms:
+        problems.append(
+            (
+                "has no manifest in a supported algorithm",
+                sorted(package.root.glob("manifest-*.txt")),
+            )
+        )
+
+    total = sum(x.size for x in payload.values())
+    oxum = bag.info.get("Payload-Oxum")
+    if oxum and oxum != f"{total}.{len(payload)}":
+        problems.append(
+            (f"Payload-Oxum is {oxum}, found {total}.{len(payload)}", [package.root])
+        )
+    if problems:
+        return problems
+
+    mismatched = mismatched_files(manifest, payload, algorithms, workers, progress)
+    if mismatched:
+        problems.append(
+            (
+                "has files that do not match the manifest",
+                [payload[x].path for x in mismatched],
+            )
+        )
+    return problems
@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import formatdate
+from pathlib import Path
+
+CACHE_FILE = "entities.sqlite"
+# entities younger than this are used without asking Preservica
+DEFAULT_TTL = 24 * 60 * 60
+
+
+@dataclass
+class CachedEntity:
+    uuid: str
+    kind: str
+    data: dict
+    fetched: float
+
+
+class EntityCache:
+    """
+    parsed Preservica entities kept in SQLite, keyed by entity UUID
+    kind separates what different tools keep about the same entity
+    each thread and process opens its own connection to the shared file
+    """
+
+    def __init__(self, cache_dir: Path, ttl: float = DEFAULT_TTL):
+        self.path = Path(cache_dir) / CACHE_FILE
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entities (
+                    uuid TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    fetched REAL NOT NULL,
+                    PRIMARY KEY (uuid, kind)
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # connections must not be shared with forked children
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def lookup(self, uuid: str, kind: str) -> CachedEntity | None:
+        """return the cached entity whatever its age, None if it was never stored"""
+        row = (
+            self._connect()
+            .execute(
+                "SELECT data, fetched FROM entities WHERE uuid = ? AND kind = ?",
+                (uuid, kind),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return CachedEntity(uuid, kind, json.loads(row[0]), row[1])
+
+    def is_fresh(self, entry: CachedEntity) -> bool:
+        return time.time() - entry.fetched < self.ttl
+
+    def get(self, uuid: str, kind: str) -> dict | None:
+        """return the cached data if it is younger than the TTL"""
+        entry = self.lookup(uuid, kind)
+        if entry and self.is_fresh(entry):
+            return entry.data
+        return None
+
+    def put(self, uuid: str, kind: str, data: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)",
+                (uuid, kind, json.dumps(data), time.time()),
+            )
+
+    def touch(self, uuid: str, kind: str) -> None:
+        """mark an entity as checked now, e.g. after Preservica answered 304"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE entities SET fetched = ? WHERE uuid = ? AND kind = ?",
+                (time.time(), uuid, kind),
+            )
+
+
+def if_modified_since(entry: CachedEntity) -> dict:
+    """return the header asking Preservica for the entity only if it changed
+    after it was cached"""
+    return {"If-Modified-Since": formatdate(entry.fetched, usegmt=True)}
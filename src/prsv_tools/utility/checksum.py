@@ -0,0 +1,66 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+# every algorithm hashlib has on all platforms, e.g. the ones bagit writes,
+# except the shake ones that need a digest length
+ALGORITHMS = sorted(
+    x for x in hashlib.algorithms_guaranteed if not x.startswith("shake_")
+)
+# large reads keep a drive streaming, hashlib releases the GIL while hashing them
+BUFFER_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+
+
+def normalize(algorithm: str) -> str:
+    """return the hashlib name of an algorithm, e.g. SHA-256 is sha256 and
+    SHA3-256 is sha3_256"""
+    name = algorithm.lower()
+    for candidate in [name, name.replace("-", ""), name.replace("-", "_")]:
+        if candidate in ALGORITHMS:
+            return candidate
+    raise ValueError(f"{algorithm} is not one of {', '.join(ALGORITHMS)}")
+
+
+class MultiHash:
+    """every algorithm of a set updated from the same chunks"""
+
+    def __init__(self, algorithms: Iterable[str]):
+        self.hashes = {alg: hashlib.new(normalize(alg)) for alg in algorithms}
+
+    def update(self, chunk: bytes | memoryview) -> None:
+        for h in self.hashes.values():
+            h.update(chunk)
+
+    def hexdigests(self) -> dict[str, str]:
+        return {alg: h.hexdigest() for alg, h in self.hashes.items()}
+
+
+def hash_stream(f: BinaryIO, algorithms: Iterable[str]) -> dict[str, str]:
+    """return the digests of a binary stream for every algorithm, reading it once"""
+    hashes = MultiHash(algorithms)
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    while size := f.readinto(buffer):
+        hashes.update(view[:size])
+    return hashes.hexdigests()
+
+
+def hash_file(path: Path, algorithms: Iterable[str]) -> dict[str, str]:
+    """return the digests of a file for every algorithm, reading it once"""
+    with open(path, "rb") as f:
+        return hash_stream(f, algorithms)
+
+
+def hash_files(
+    paths: Iterable[Path],
+    algorithms: Iterable[str],
+    workers: int = DEFAULT_WORKERS,
+) -> dict[Path, dict[str, str]]:
+    """return the digests of many files, up to workers files hashed at a time"""
+    paths = list(paths)
+    algorithms = list(algorithms)
+    with ThreadPoolExecutor(max(workers, 1)) as executor:
+        digests = executor.map(lambda x: hash_file(x, algorithms), paths)
+        return dict(zip(paths, digests))
@@ -1,7 +1,9 @@
 import argparse
+import os
 import re
 import sys
 from pathlib import Path
+from typing import Iterable, Iterator
 
 
 class Parser(argparse.ArgumentParser):
@@ -45,6 +47,30 @@ class Parser(argparse.ArgumentParser):
             default=dir,
         )
 
+    def add_workers(self) -> None:
+        self.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Optional. Number of packages to work on in parallel, default 1",
+        )
+
+    def add_cachedirectory(self) -> None:
+        self.add_argument(
+            "--cache_dir",
+            type=extant_dir,
+            help="""Optional. Keep results in this directory,
+            so later runs only redo the work for what changed""",
+        )
+
+    def add_lintreport(self) -> None:
+        self.add_argument(
+            "--report",
+            type=Path,
+            help="""Optional. Write the failed checks of every package to this file,
+            as CSV if it ends in .csv, otherwise as JSON""",
+        )
+
     def add_id_search(self):
         ids = self.add_argument_group(
             description="IDs that can be searched. At least 1 ID is required"
@@ -96,21 +122,69 @@ class ExtendUnique(argparse.Action):
         items = getattr(namespace, self.dest, None)
 
         if items is None:
-            items = set(values)
-        elif isinstance(items, set):
-            items = items.union(values)
+            items = PackageSource()
+        items.extend(values)
 
         setattr(namespace, self.dest, items)
 
 
-def list_of_paths(p: str) -> list[Path]:
+class PackageDirectory:
+    """the child folders of a directory, listed with os.scandir each time it is
+    iterated, so packages are read as they are needed"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f"PackageDirectory({str(self.path)!r})"
+
+    def __iter__(self) -> Iterator[Path]:
+        with os.scandir(self.path) as it:
+            for entry in it:
+                # the type comes from the directory listing, no stat per child
+                if entry.is_dir():
+                    yield Path(entry.path)
+
+
+class PackageSource:
+    """
+    packages from --package and --directory in the order they were given,
+    each only once, directories are only listed when the packages are used
+    """
+
+    def __init__(self):
+        self.sources: list[Iterable[Path]] = []
+
+    def __repr__(self) -> str:
+        return f"PackageSource({self.sources!r})"
+
+    def extend(self, values: Iterable[Path]) -> None:
+        self.sources.append(values)
+
+    def __iter__(self) -> Iterator[Path]:
+        seen = set()
+        for source in self.sources:
+            for package in source:
+                if package not in seen:
+                    seen.add(package)
+                    yield package
+
+    def __contains__(self, package: object) -> bool:
+        return any(package == x for x in self)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return next(iter(self), None) is not None
+
+
+def list_of_paths(p: str) -> PackageDirectory:
     path = extant_dir(p)
-    child_dirs = []
-    for child in path.iterdir():
-        if child.is_dir():
-            child_dirs.append(child)
+    child_dirs = PackageDirectory(path)
 
-    if not child_dirs:
+    # only look as far as the first child directory
+    if next(iter(child_dirs), None) is None:
         raise argparse.ArgumentTypeError(f"{path} does not contain child directories")
 
     return child_dirs
@@ -0,0 +1,281 @@
+import csv
+import functools
+import hashlib
+import json
+import logging
+import logging.handlers
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Literal
+
+import prsv_tools.utility.tree as prsvtree
+
+# log record attributes kept in the cache, enough to replay a finding
+RECORD_FIELDS = ["name", "levelno", "levelname", "msg", "funcName", "module"]
+REPORT_FIELDS = ["package", "verdict", "check", "severity", "message", "paths"]
+
+Verdict = Literal["valid", "invalid", "needs review"]
+
+
+@dataclass
+class Finding:
+    """a failed check, with what it logged and the paths it named"""
+
+    check: str
+    severity: Verdict
+    messages: list[str] = field(default_factory=list)
+    paths: list[str] = field(default_factory=list)
+
+
+@dataclass
+class LintResult:
+    package: Path
+    verdict: Verdict
+    findings: list[Finding] = field(default_factory=list)
+
+    @property
+    def failed_checks(self) -> list[str]:
+        return [finding.check for finding in self.findings]
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "package": str(self.package)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LintResult":
+        return cls(
+            Path(data["package"]),
+            data["verdict"],
+            [Finding(**finding) for finding in data["findings"]],
+        )
+
+
+def _init_worker(queue: multiprocessing.Queue, level: int) -> None:
+    """send every log record of a worker back to the parent process"""
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(queue)]
+    root.setLevel(level)
+
+
+def lint_in_pool(
+    lint_package: Callable[[Path], str | LintResult],
+    packages: Iterable[Path],
+    workers: int = 1,
+) -> list[tuple[Path, str | LintResult]]:
+    """
+    lint packages in sorted order, with workers > 1 in a process pool
+    workers log through the handlers of this process, e.g. the dated log file,
+    so the log reads the same as a run in one process
+    """
+    packages = sorted(packages)
+    if workers <= 1:
+        return [(package, lint_package(package)) for package in packages]
+
+    root = logging.getLogger()
+    queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(
+        queue, *root.handlers, respect_handler_level=True
+    )
+    listener.start()
+    try:
+        with ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(queue, root.level)
+        ) as executor:
+            results = list(executor.map(lint_package, packages))
+    finally:
+        listener.stop()
+
+    return list(zip(packages, results))
+
+
+def fingerprint(package: prsvtree.PackageTree) -> str:
+    """return a hash of the paths, types, sizes and mtimes of a package,
+    it changes whenever a file is added, removed, renamed or modified"""
+    digest = hashlib.sha256(str(package.root.resolve()).encode())
+    for entry in sorted(package.walk(), key=lambda x: x.relpath):
+        digest.update(
+            f"{entry.relpath}\0{entry.is_dir}\0{entry.size}\0{entry.mtime}\n".encode()
+        )
+    return digest.hexdigest()
+
+
+class _RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(
+            {
+                **{field: getattr(record, field) for field in RECORD_FIELDS},
+                "msg": record.getMessage(),
+                # checks name the offending files with extra={"paths": [...]}
+                "paths": [str(x) for x in getattr(record, "paths", [])],
+            }
+        )
+
+
+def run_checks(
+    package: prsvtree.PackageTree,
+    strict_checks: list[Callable],
+    less_strict_checks: list[Callable],
+) -> LintResult:
+    """
+    run the checks against a package and return every failed check as a finding
+    a failed strict check makes the package invalid, a failed less strict check
+    makes it need review, the messages and paths of a finding are taken from
+    what the check logged
+    """
+    collector = _RecordCollector()
+    root = logging.getLogger()
+    root.addHandler(collector)
+    try:
+        failed = [
+            (check, "needs review")
+            for check in less_strict_checks
+            if not check(package)
+        ]
+        failed += [(check, "invalid") for check in strict_checks if not check(package)]
+    finally:
+        root.removeHandler(collector)
+
+    findings = []
+    for check, severity in failed:
+        records = [x for x in collector.records if x["funcName"] == check.__name__]
+        paths = [path for record in records for path in record["paths"]]
+        findings.append(
+            Finding(
+                check.__name__,
+                severity,
+                [record["msg"] for record in records],
+                # a check that names no file is about the package folder itself
+                paths or [str(package.root)],
+            )
+        )
+
+    severities = [severity for _, severity in failed]
+    if "invalid" in severities:
+        verdict = "invalid"
+    elif severities:
+        verdict = "needs review"
+    else:
+        verdict = "valid"
+    return LintResult(package.root, verdict, findings)
+
+
+def write_report(results: Iterable[LintResult], report: Path) -> None:
+    """write lint results as CSV, one row per finding, if the file ends
+    with .csv, otherwise as a JSON list"""
+    results = list(results)
+    if Path(report).suffix.lower() != ".csv":
+        Path(report).write_text(
+            json.dumps([result.as_dict() for result in results], indent=2)
+        )
+        return
+
+    with open(report, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            row = {"package": str(result.package), "verdict": result.verdict}
+            if not result.findings:
+                writer.writerow(row)
+            for finding in result.findings:
+                writer.writerow(
+                    {
+                        **row,
+                        "check": finding.check,
+                        "severity": finding.severity,
+                        "message": " ".join(finding.messages),
+                        "paths": ";".join(finding.paths),
+                    }
+                )
+
+
+def read_report(report: Path) -> list[LintResult]:
+    """read back the lint results of a JSON or CSV report"""
+    if Path(report).suffix.lower() != ".csv":
+        return [LintResult.from_dict(x) for x in json.loads(Path(report).read_text())]
+
+    results: dict[str, LintResult] = {}
+    with open(report, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            result = results.setdefault(
+                row["package"], LintResult(Path(row["package"]), row["verdict"])
+            )
+            if row["check"]:
+                result.findings.append(
+                    Finding(
+                        row["check"],
+                        row["severity"],
+                        [row["message"]] if row["message"] else [],
+                        row["paths"].split(";") if row["paths"] else [],
+                    )
+                )
+    return list(results.values())
+
+
+def _linter_name(lint_package: Callable) -> str:
+    # the options of a partial are part of the name, results with different
+    # options are cached apart
+    if isinstance(lint_package, functools.partial):
+        options = sorted(lint_package.keywords.items())
+        return f"{_linter_name(lint_package.func)}{options}"
+    return f"{lint_package.__module__}.{lint_package.__name__}"
+
+
+class CachedLint:
+    """
+    lint_package with its verdict and findings cached in a folder,
+    a package that has not changed since it was linted is not checked again,
+    its logged findings are replayed instead
+    """
+
+    def __init__(self, lint_package: Callable, cache_dir: Path):
+        self.lint_package = lint_package
+        self.cache_dir = Path(cache_dir)
+
+    def cache_file(self, package: Path) -> Path:
+        linter = _linter_name(self.lint_package)
+        key = hashlib.sha1(f"{linter}:{package.resolve()}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def __call__(self, package: Path) -> str | LintResult:
+        tree = prsvtree.PackageTree(package)
+        package_fingerprint = fingerprint(tree)
+        cache_file = self.cache_file(package)
+
+        try:
+            cached = json.loads(cache_file.read_text())
+        except (OSError, ValueError):
+            cached = {}
+
+        if cached.get("fingerprint") == package_fingerprint:
+            for record in cached["records"]:
+                logging.getLogger(record["name"]).handle(logging.makeLogRecord(record))
+            if isinstance(cached["result"], dict):
+                return LintResult.from_dict(cached["result"])
+            return cached["result"]
+
+        collector = _RecordCollector()
+        root = logging.getLogger()
+        root.addHandler(collector)
+        try:
+            result = self.lint_package(tree)
+        finally:
+            root.removeHandler(collector)
+
+        cache_file.write_text(
+            json.dumps(
+                {
+                    "package": str(package),
+                    "fingerprint": package_fingerprint,
+                    "result": (
+                        result.as_dict() if isinstance(result, LintResult) else result
+                    ),
+                    "records": collector.records,
+                }
+            )
+        )
+        return result
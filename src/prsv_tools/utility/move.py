@@ -0,0 +1,121 @@
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import prsv_tools.utility.tree as prsvtree
+
+LOGGER = logging.getLogger(__name__)
+
+# a copy in progress is hidden next to its target until it is verified
+PARTIAL_SUFFIX = ".partial"
+
+
+@dataclass(frozen=True)
+class Move:
+    source: Path
+    target: Path
+
+    @property
+    def same_device(self) -> bool:
+        return same_device(self.source, self.target.parent)
+
+
+def same_device(source: Path, folder: Path) -> bool:
+    """return True if source and folder, or its closest existing parent,
+    are on the same filesystem, so a rename can move source"""
+    folder = Path(folder)
+    while not folder.exists() and folder != folder.parent:
+        folder = folder.parent
+    return os.stat(source).st_dev == os.stat(folder).st_dev
+
+
+def verify_copy(source: Path, copy: Path) -> None:
+    """raise OSError unless copy has the same folders and file sizes as source"""
+
+    def contents(root):
+        tree = prsvtree.PackageTree(root)
+        return {(x.relpath, x.is_dir, x.size) for x in tree.walk()}
+
+    missing = contents(source) ^ contents(copy)
+    if missing:
+        raise OSError(f"{copy} does not match {source}: {sorted(missing)[:5]}")
+
+
+def move(source: Path, target: Path) -> None:
+    """
+    move a folder to target, with an atomic rename on the same filesystem,
+    otherwise copy it next to target, verify the copy, rename it into place
+    and only then delete the source
+    """
+    source, target = Path(source), Path(target)
+    if target.exists():
+        raise FileExistsError(f"{target} already exists")
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    if same_device(source, target.parent):
+        os.rename(source, target)
+        return
+
+    partial = target.with_name(f".{target.name}{PARTIAL_SUFFIX}")
+    if partial.exists():
+        # left by an interrupted move
+        shutil.rmtree(partial)
+    shutil.copytree(source, partial)
+    try:
+        verify_copy(source, partial)
+    except OSError:
+        shutil.rmtree(partial)
+        raise
+    os.rename(partial, target)
+    shutil.rmtree(source)
+
+
+def plan_moves(moves: Iterable[tuple[Path, Path]]) -> dict[Path, list[Move]]:
+    """group (source, target) pairs by destination folder"""
+    plan: dict[Path, list[Move]] = {}
+    for source, target in moves:
+        target = Path(target)
+        plan.setdefault(target.parent, []).append(Move(Path(source), target))
+    return plan
+
+
+def describe_plan(plan: dict[Path, list[Move]]) -> str:
+    lines = []
+    for folder, moves in plan.items():
+        lines.append(f"{folder}:")
+        for x in moves:
+            how = "rename" if x.same_device else "copy"
+            lines.append(f"    {how} {x.source}")
+    return "\n".join(lines)
+
+
+def run_moves(
+    plan: dict[Path, list[Move]], workers: int = 1
+) -> list[tuple[Move, OSError | None]]:
+    """
+    carry out a plan, renames first since they are instant,
+    then up to workers copies across filesystems at a time
+    returns every move with the error that stopped it, None if it was moved
+    """
+
+    def attempt(x: Move) -> tuple[Move, OSError | None]:
+        try:
+            move(x.source, x.target)
+        except OSError as e:
+            return x, e
+        LOGGER.info(f"{x.source} moved to {x.target}")
+        return x, None
+
+    moves = [x for folder in plan.values() for x in folder]
+    renames = [x for x in moves if x.same_device]
+    copies = [x for x in moves if not x.same_device]
+
+    outcomes = [attempt(x) for x in renames]
+    with ThreadPoolExecutor(max(workers, 1)) as executor:
+        outcomes += list(executor.map(attempt, copies))
+
+    return outcomes
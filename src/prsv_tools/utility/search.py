@@ -1,25 +1,54 @@
 import logging
-
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
 
 import prsv_tools.utility.api as prsvapi
 import prsv_tools.utility.opex as prsvopex
 
 LOGGER = logging.getLogger(__name__)
 
-TOKEN = prsvapi.get_token("prod-ingest")
-SEARCHURL = "https://nypl.preservica.com/api/content/search"
-SOURL = "https://nypl.preservica.com/api/entity/structural-objects"
+# nothing is requested until the first search, see configure()
+CREDENTIAL_SET: str | None = "prod-ingest"
+SEARCHURL = f"{prsvapi.BASE_URL}/api/content/search"
+SOURL = f"{prsvapi.BASE_URL}/api/entity/structural-objects"
+
+# hits requested per search request
+DEFAULT_PAGE_SIZE = 100
+
+METADATA = [
+    "xip.title",
+    "xip.identifier",
+    "xip.parent_ref",
+    "xip.securitytag",
+    "spec.specCollectionID",
+]
+
+ER_FIELD = "findingAid.erNumber"
+AMI_FIELD = "specObject.amiId"
+
+# IDs packed into the values of one multi-valued field query
+MAX_IDS_PER_QUERY = 100
 
-SESSION = requests.Session()
-SESSION.headers = {
-    "Preservica-Access-Token": TOKEN,
-    "Content-Type": "application/x-www-form-urlencoded",
-}
+
+def configure(
+    credential_set: str | None = "prod-ingest", base_url: str = prsvapi.BASE_URL
+) -> None:
+    """
+    choose the credential set and instance that searches go to
+    without a credential set no token is sent, e.g. to a local stand-in server
+    """
+    global CREDENTIAL_SET, SEARCHURL, SOURL
+    CREDENTIAL_SET = credential_set
+    SEARCHURL = f"{base_url}/api/content/search"
+    SOURL = f"{base_url}/api/entity/structural-objects"
 
 
 def get_response(url, data):
-    return SESSION.post(url, data=data).json()
+    # the shared client logs in on first use and renews the token as needed
+    client = prsvapi.get_client(CREDENTIAL_SET)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    return client.post(url, data=data, headers=headers).json()
 
 
 def search(
@@ -40,74 +69,161 @@ def search(
         return search_item({"specObject.amiId": ami_id})
 
 
+def _search_pages(
+    query: dict, page_size: int, prefetch: bool, limit: int | None, metadata: list
+) -> Iterator[tuple[list, list]]:
+    """yield the object ids and metadata of each page of search hits,
+    nothing past limit is requested"""
+    data = {"q": query, "max": str(page_size), "metadata": metadata}
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    def fetch(start: int) -> dict:
+        return get_response(SEARCHURL, {**data, "start": start})["value"]
+
+    try:
+        start = 0
+        next_page = None
+        while True:
+            page = next_page.result() if next_page else fetch(start)
+            # ignore ids beyond totalHits, the last page may be padded
+            remaining = max(page["totalHits"] - start, 0)
+            ids = page["objectIds"][:remaining]
+            start += len(ids)
+
+            wanted = page["totalHits"]
+            if limit is not None:
+                wanted = min(wanted, limit)
+            more = bool(ids) and start < wanted
+            next_page = executor.submit(fetch, start) if executor and more else None
+
+            yield ids, page["metadata"][: len(ids)]
+
+            if not more:
+                return
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_search(
+    query: dict,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    limit: int | None = None,
+    prefetch: bool = True,
+    metadata: list[str] = METADATA,
+) -> Iterator[prsvopex.Structural_Object]:
+    """
+    yield a Structural_Object for every hit of a search query, page by page
+    with prefetch, the next page is requested while the current one is used
+    stop after limit hits, or whenever the caller stops iterating
+    """
+    if limit is not None:
+        page_size = max(min(page_size, limit), 1)
+
+    objects = (
+        create_object_from_search_response(uuid, md)
+        for ids, metadata in _search_pages(query, page_size, prefetch, limit, metadata)
+        for uuid, md in zip(ids, metadata)
+    )
+    yield from islice(objects, limit)
+
+
 def search_item(ids) -> list[prsvopex.Structural_Object]:
     query = {"fields": []}
     for key, value in ids.items():
         query["fields"].append({"name": key, "values": value})
 
-    metadata = [
-        "xip.title",
-        "xip.identifier",
-        "xip.parent_ref",
-        "xip.securitytag",
-    ]
-
-    data = {"q": query, "start": 0, "max": "1000", "metadata": metadata}
-
-    response = get_response(SEARCHURL, data)
-    total = response["value"]["totalHits"]
+    # one hit is expected, a second one is enough to tell it is not unique
+    data = {"q": query, "start": 0, "max": "2", "metadata": METADATA}
+    page = get_response(SEARCHURL, data)["value"]
+    total = page["totalHits"]
 
     if total == 0:
         raise ValueError("expected one result, got none")
     if total != 1:
         raise ValueError(f"expected one result, got {total}")
 
-    so = create_object_from_search_response(
-        response["value"]["objectIds"][0], response["value"]["metadata"][0]
-    )
+    so = create_object_from_search_response(page["objectIds"][0], page["metadata"][0])
     return [so]
 
 
-def search_coll(coll_id: str, accepted: list()) -> list[prsvopex.Structural_Object]:
+def iter_coll(
+    coll_id: str, accepted: tuple[bool, bool], page_size: int = DEFAULT_PAGE_SIZE
+) -> Iterator[prsvopex.Structural_Object]:
+    """yield the accepted packages of a collection as they are found"""
     query = {"fields": [{"name": "spec.specCollectionID", "values": coll_id}]}
 
-    metadata = [
-        "xip.title",
-        "xip.identifier",
-        "xip.parent_ref",
-        "xip.securitytag",
-    ]
-
-    data = {"q": query, "start": 0, "max": "1000", "metadata": metadata}
+    accepted_so = []
+    if accepted[0]:
+        accepted_so.extend(["ERContainer", "EMContainer", "DIContainer"])
+    if accepted[1]:
+        accepted_so.extend(["AMIContainer"])
 
-    response = get_response(SEARCHURL, data)
+    found = False
+    for pkg in iter_search(query, page_size=page_size):
+        found = True
+        if pkg.soCategory in accepted_so:
+            yield pkg
 
-    total = response["value"]["totalHits"]
-    if total == 0:
+    if not found:
         raise ValueError("expected one result, got none")
 
-    packages = []
 
-    for i in range(0, response["value"]["totalHits"]):
-        packages.append(
-            create_object_from_search_response(
-                response["value"]["objectIds"][i], response["value"]["metadata"][i]
-            )
-        )
+def search_coll(coll_id: str, accepted: list()) -> list[prsvopex.Structural_Object]:
+    return list(iter_coll(coll_id, accepted))
 
-    accepted_so = []
-    if accepted[0]:
-        accepted_so.extend(["ERContainer", "EMContainer", "DIContainer"])
-    if accepted[1]:
-        accepted_so.extend(["AMIContainer"])
 
-    filtered_packages = [pkg for pkg in packages if pkg.soCategory in accepted_so]
-    return filtered_packages
+def _batched(ids: list[str], size: int) -> Iterator[list[str]]:
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def search_many(
+    coll_id: str = "",
+    er_ids: Iterable[str] = (),
+    ami_ids: Iterable[str] = (),
+    batch_size: int = MAX_IDS_PER_QUERY,
+) -> dict[str, list[prsvopex.Structural_Object]]:
+    """
+    search for many ER numbers and/or AMI IDs at once
+    IDs are packed batch_size at a time into one multi-valued field query
+    return the hits for each requested ID, an empty list if nothing was found
+    """
+    er_ids = list(dict.fromkeys(er_ids))
+    ami_ids = list(dict.fromkeys(ami_ids))
+    if er_ids and not coll_id:
+        raise ValueError("coll_id is blank")
+
+    results = {id: [] for id in er_ids + ami_ids}
+
+    queries = []
+    for batch in _batched(er_ids, batch_size):
+        fields = [
+            {"name": ER_FIELD, "values": batch},
+            {"name": "findingAid.faCollectionId", "values": coll_id},
+        ]
+        queries.append(({"fields": fields}, ER_FIELD, "erNumber"))
+    for batch in _batched(ami_ids, batch_size):
+        fields = [{"name": AMI_FIELD, "values": batch}]
+        queries.append(({"fields": fields}, AMI_FIELD, "amiId"))
+
+    for query, field, key in queries:
+        for so in iter_search(query, metadata=METADATA + [field]):
+            for id in _as_list(so.mdFragments.get(key)):
+                if id in results:
+                    results[id].append(so)
+
+    return results
 
 
 def create_object_from_search_response(
     uuid: str, md: dict
 ) -> prsvopex.Structural_Object:
+    md_fragments = {}
     for field in md:
         match field["name"]:
             case "xip.title":
@@ -117,7 +233,11 @@ def create_object_from_search_response(
             case "xip.parent_ref":
                 parent = field["value"]
             case "spec.specCollectionID":
-                spec_coll_id = field["value"]
+                md_fragments["specCollId"] = field["value"]
+            case "findingAid.erNumber":
+                md_fragments["erNumber"] = field["value"]
+            case "specObject.amiId":
+                md_fragments["amiId"] = field["value"]
             case "xip.identifier":
                 so_category = field["value"][0].split(" ")[1]
 
@@ -127,7 +247,7 @@ def create_object_from_search_response(
         securityTag=secTag,
         parent=parent,
         soCategory=so_category,
-        mdFragments={"specCollId": spec_coll_id},
+        mdFragments=md_fragments,
         children=None,
     )
     return so
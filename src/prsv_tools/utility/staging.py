@@ -0,0 +1,143 @@
+import errno
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+import prsv_tools.utility.checksum as prsvchecksum
+
+try:
+    import fcntl
+except ImportError:
+    # not on Windows, reflinks fall back to copies there
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+# linux/fs.h, clone a whole file on a copy-on-write filesystem
+FICLONE = 0x40049409
+MODES = ["auto", "hardlink", "reflink", "copy"]
+# the links each mode tries in order, a copy is the last resort of every mode
+MODE_LINKS = {
+    "auto": ["hardlink", "reflink"],
+    "hardlink": ["hardlink"],
+    "reflink": ["reflink"],
+    "copy": [],
+}
+
+
+def copy_and_hash(
+    source: Path, target: Path, algorithms: Iterable[str]
+) -> dict[str, str]:
+    """copy a file and return its digests, hashing each chunk as it is written"""
+    hashes = prsvchecksum.MultiHash(algorithms)
+    buffer = bytearray(prsvchecksum.BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        while size := src.readinto(buffer):
+            hashes.update(view[:size])
+            dst.write(view[:size])
+    shutil.copystat(source, target)
+    return hashes.hexdigests()
+
+
+def reflink(source: Path, target: Path) -> None:
+    """clone a file that shares its blocks with source until either is
+    written to, e.g. on btrfs or XFS, raise OSError where that is not possible"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported here")
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        Path(target).unlink(missing_ok=True)
+        raise
+    shutil.copystat(source, target)
+
+
+LINKS = {"hardlink": os.link, "reflink": reflink}
+
+
+class Stager:
+    """
+    stage the files of a package from one folder to another and keep their
+    fixities, so they are not read again to write the OPEX
+    depending on the mode a file is hardlinked or reflinked, and copied and
+    hashed in the same read when it cannot be linked, e.g. across filesystems
+    the fixities of a staged file follow it to the next stage
+    a staged tree may share its files with the source, so it is only changed
+    through remove, which unlinks the staged name and never touches the source
+    """
+
+    def __init__(
+        self,
+        algorithms: Iterable[str] = ("md5",),
+        mode: str = "auto",
+        workers: int = prsvchecksum.DEFAULT_WORKERS,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"{mode} is not one of {', '.join(MODES)}")
+        self.algorithms = list(algorithms)
+        self.mode = mode
+        self.workers = workers
+        self.fixities: dict[Path, dict[str, str]] = {}
+
+    def stage_file(self, source: Path, target: Path) -> dict[str, str]:
+        """stage one file and return its fixities"""
+        source, target = Path(source), Path(target)
+        if target.exists():
+            raise FileExistsError(f"{target} already exists")
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        digests = self.fixities.get(source)
+        linked = False
+        for name in MODE_LINKS[self.mode]:
+            try:
+                LINKS[name](source, target)
+                linked = True
+                break
+            except OSError as e:
+                # e.g. another filesystem, try the next link or a copy
+                LOGGER.debug(f"{source} cannot be {name}ed to {target}: {e}")
+
+        if linked:
+            if digests is None:
+                digests = prsvchecksum.hash_file(target, self.algorithms)
+        elif digests is None:
+            digests = copy_and_hash(source, target, self.algorithms)
+        else:
+            shutil.copy2(source, target)
+
+        self.fixities[target] = digests
+        return digests
+
+    def stage_tree(self, source: Path, target: Path) -> None:
+        """stage every file and folder below source into target, which must
+        not exist yet, up to workers files at a time"""
+        source, target = Path(source), Path(target)
+        if target.exists():
+            raise FileExistsError(f"{target} already exists")
+
+        pairs = []
+        for root, _, files in os.walk(source):
+            relroot = Path(root).relative_to(source)
+            (target / relroot).mkdir(parents=True, exist_ok=True)
+            pairs.extend((Path(root) / x, target / relroot / x) for x in files)
+
+        with ThreadPoolExecutor(max(self.workers, 1)) as executor:
+            # list() raises the first error of any file
+            list(executor.map(lambda x: self.stage_file(*x), pairs))
+
+    def remove(self, path: Path) -> None:
+        """delete a staged file, only its name in the staged tree is removed"""
+        path = Path(path)
+        if path not in self.fixities:
+            raise ValueError(f"{path} was not staged")
+        os.unlink(path)
+        del self.fixities[path]
+
+    def fixity(self, path: Path, algorithm: str) -> str | None:
+        """return the digest of a staged file, None if it was not staged"""
+        return self.fixities.get(Path(path), {}).get(algorithm)
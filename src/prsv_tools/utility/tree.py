@@ -0,0 +1,128 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(".")
+
+
+@dataclass(frozen=True)
+class TreeEntry:
+    path: Path
+    relpath: Path
+    is_dir: bool
+    is_file: bool
+    size: int = 0
+    mtime: float = 0.0
+    is_symlink: bool = False
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+
+class PackageTree:
+    """
+    index of a package, built with one os.scandir walk
+    names, types, sizes and relative paths are kept, so checks read the index
+    instead of going back to the filesystem, e.g. on NFS/ICA mounted shares
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.name = self.root.name
+        self._children: dict[Path, list[TreeEntry]] = {}
+        self._walk()
+
+    def _walk(self) -> None:
+        folders = [ROOT]
+        while folders:
+            relfolder = folders.pop()
+            try:
+                with os.scandir(self.root / relfolder) as it:
+                    dir_entries = sorted(it, key=lambda x: x.name)
+            except OSError:
+                continue
+
+            children = []
+            for dir_entry in dir_entries:
+                entry = _index_entry(dir_entry, relfolder / dir_entry.name)
+                children.append(entry)
+                # like rglob, symlinked folders are listed but not followed
+                if entry.is_dir and not entry.is_symlink:
+                    folders.append(entry.relpath)
+            self._children[relfolder] = children
+
+    def __repr__(self) -> str:
+        return f"PackageTree({str(self.root)!r})"
+
+    def children(self, relpath: Path | str = ROOT) -> list[TreeEntry]:
+        """return the entries directly in a folder, like Path.iterdir"""
+        relpath = Path(relpath)
+        if relpath not in self._children:
+            raise FileNotFoundError(f"{self.root / relpath} is not a folder")
+        return self._children[relpath]
+
+    def walk(self, relpath: Path | str = ROOT) -> list[TreeEntry]:
+        """return every entry below a folder, like Path.rglob("*")"""
+        entries = []
+        folders = [Path(relpath)]
+        while folders:
+            for entry in self._children.get(folders.pop(), []):
+                entries.append(entry)
+                if entry.relpath in self._children:
+                    folders.append(entry.relpath)
+        return entries
+
+    def files(self, relpath: Path | str = ROOT) -> list[TreeEntry]:
+        return [entry for entry in self.walk(relpath) if entry.is_file]
+
+    def entry(self, relpath: Path | str) -> TreeEntry | None:
+        relpath = Path(relpath)
+        siblings = self._children.get(relpath.parent, [])
+        return next((x for x in siblings if x.name == relpath.name), None)
+
+    def is_dir(self, relpath: Path | str) -> bool:
+        relpath = Path(relpath)
+        if relpath == ROOT:
+            return ROOT in self._children
+        entry = self.entry(relpath)
+        return bool(entry and entry.is_dir)
+
+    def is_empty(self, relpath: Path | str) -> bool:
+        """return whether a folder has nothing in it, a symlinked folder is
+        not indexed so it is looked at on the filesystem"""
+        relpath = Path(relpath)
+        entry = self.entry(relpath)
+        if entry and entry.is_symlink:
+            return not any(entry.path.iterdir())
+        return not self._children.get(relpath)
+
+    def exists(self, relpath: Path | str) -> bool:
+        relpath = Path(relpath)
+        return self.is_dir(relpath) if relpath == ROOT else bool(self.entry(relpath))
+
+
+def _index_entry(dir_entry: os.DirEntry, relpath: Path) -> TreeEntry:
+    is_dir = dir_entry.is_dir()
+    is_file = dir_entry.is_file()
+    size, mtime = 0, 0.0
+    if is_file:
+        stat = dir_entry.stat()
+        size, mtime = stat.st_size, stat.st_mtime
+
+    return TreeEntry(
+        Path(dir_entry.path),
+        relpath,
+        is_dir,
+        is_file,
+        size,
+        mtime,
+        dir_entry.is_symlink(),
+    )
+
+
+def as_tree(package: Path | PackageTree) -> PackageTree:
+    """return the index of a package, walking it only if it is a path"""
+    if isinstance(package, PackageTree):
+        return package
+    return PackageTree(package)
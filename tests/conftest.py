@@ -0,0 +1,24 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.utility.api as prsvapi
+
+
+def pytest_configure(config):
+    # test modules may look up the API version when they are collected,
+    # keep the token, lock and apiversion files that writes out of the repo
+    config.token_dir = Path(tempfile.mkdtemp(prefix="prsv-tokens-"))
+    prsvapi.TOKENS.token_dir = config.token_dir
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(config.token_dir, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def token_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(prsvapi.TOKENS, "token_dir", tmp_path)
+    return tmp_path
@@ -0,0 +1,256 @@
+import gc
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import prsv_tools.utility.api as prsvapi
+
+
+class FakeAdapter(BaseAdapter):
+    """answer every request locally and remember what was sent"""
+
+    def __init__(self, status_code: int = 200, text: str = ""):
+        super().__init__()
+        self.status_code = status_code
+        self.text = text
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = self.text.encode()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_adapter():
+    return FakeAdapter()
+
+
+def test_client_is_shared_per_credential_set():
+    assert prsvapi.get_client("test-ingest") is prsvapi.get_client("test-ingest")
+    assert prsvapi.get_client("test-ingest") is not prsvapi.get_client("prod-ingest")
+
+
+def test_client_pool_size_is_configurable():
+    client = prsvapi.PrsvClient(pool_size=3)
+
+    adapter = client.get_adapter(prsvapi.BASE_URL)
+
+    assert adapter._pool_maxsize == 3
+
+
+def test_client_adds_token(mocker, fake_adapter):
+    mocker.patch("prsv_tools.utility.api.get_token", return_value="token")
+    client = prsvapi.PrsvClient("test-ingest")
+    client.mount("https://", fake_adapter)
+
+    client.get(f"{prsvapi.BASE_URL}/api/admin/schemas")
+
+    assert fake_adapter.sent[0].headers[prsvapi.TOKEN_HEADER] == "token"
+
+
+def test_client_keeps_explicit_token(mocker, fake_adapter):
+    get_token = mocker.patch("prsv_tools.utility.api.get_token")
+    client = prsvapi.PrsvClient("test-ingest")
+    client.mount("https://", fake_adapter)
+
+    client.get(prsvapi.BASE_URL, headers={prsvapi.TOKEN_HEADER: "mine"})
+
+    assert fake_adapter.sent[0].headers[prsvapi.TOKEN_HEADER] == "mine"
+    get_token.assert_not_called()
+
+
+def test_client_without_credentials_adds_no_token(fake_adapter):
+    client = prsvapi.PrsvClient()
+    client.mount("https://", fake_adapter)
+
+    client.get(prsvapi.BASE_URL)
+
+    assert prsvapi.TOKEN_HEADER not in fake_adapter.sent[0].headers
+
+
+def test_client_calls_response_hook(fake_adapter):
+    timings = []
+    client = prsvapi.PrsvClient(response_hook=lambda r, **kwargs: timings.append(r))
+    client.mount("https://", fake_adapter)
+
+    client.get(prsvapi.BASE_URL)
+
+    assert len(timings) == 1
+
+
+@pytest.fixture
+def token_manager(tmp_path):
+    return prsvapi.TokenManager(token_dir=tmp_path, background_refresh=False)
+
+
+def test_token_is_kept_in_memory(mocker, token_manager):
+    create_token = mocker.patch(
+        "prsv_tools.utility.api.create_token", return_value="new"
+    )
+
+    assert token_manager.get("test-ingest") == "new"
+    assert token_manager.get("test-ingest") == "new"
+    create_token.assert_called_once()
+
+
+def test_token_is_read_from_fresh_token_file(mocker, token_manager):
+    create_token = mocker.patch("prsv_tools.utility.api.create_token")
+    token_file = token_manager.token_file("test-ingest")
+    token_file.write_text(f"{prsvapi.time.time()}\nstored")
+
+    assert token_manager.get("test-ingest") == "stored"
+    create_token.assert_not_called()
+
+
+def test_token_is_created_when_token_file_expires(mocker, token_manager):
+    mocker.patch("prsv_tools.utility.api.create_token", return_value="new")
+    token_file = token_manager.token_file("test-ingest")
+    token_file.write_text(f"{prsvapi.time.time() - prsvapi.TOKEN_LIFETIME}\nstale")
+
+    assert token_manager.get("test-ingest") == "new"
+
+
+def test_rejected_token_is_replaced(mocker, token_manager):
+    mocker.patch("prsv_tools.utility.api.create_token", return_value="new")
+    token_file = token_manager.token_file("test-ingest")
+    token_file.write_text(f"{prsvapi.time.time()}\nrejected")
+
+    assert token_manager.refresh("test-ingest", rejected="rejected") == "new"
+
+
+def test_token_refresh_is_scheduled(mocker, tmp_path):
+    mocker.patch("prsv_tools.utility.api.create_token", return_value="new")
+    token_manager = prsvapi.TokenManager(token_dir=tmp_path)
+
+    token_manager.get("test-ingest")
+    timer = token_manager._timers["test-ingest"]
+    timer.cancel()
+
+    assert timer.daemon
+
+
+def test_token_managers_share_one_fork_handler(tmp_path):
+    token_manager = prsvapi.TokenManager(token_dir=tmp_path)
+    guard = token_manager._guard
+    token_manager._lock_for("test-ingest")
+
+    prsvapi._reset_token_managers_after_fork()
+
+    assert token_manager._guard is not guard
+    assert token_manager._locks == {}
+
+
+def test_token_managers_are_not_kept_alive_for_forks(tmp_path):
+    token_manager = prsvapi.TokenManager(token_dir=tmp_path)
+    assert token_manager in prsvapi._TOKEN_MANAGERS
+
+    count = len(prsvapi._TOKEN_MANAGERS)
+    del token_manager
+    gc.collect()
+
+    assert len(prsvapi._TOKEN_MANAGERS) == count - 1
+
+
+class SequenceAdapter(FakeAdapter):
+    """answer with each status code in turn"""
+
+    def __init__(self, status_codes: list[int]):
+        super().__init__()
+        self.status_codes = status_codes
+
+    def send(self, request, **kwargs):
+        self.status_code = self.status_codes[len(self.sent)]
+        return super().send(request, **kwargs)
+
+
+def test_client_retries_once_on_401(mocker):
+    mocker.patch("prsv_tools.utility.api.get_token", return_value="expired")
+    refresh = mocker.patch.object(prsvapi.TOKENS, "refresh")
+    adapter = SequenceAdapter([401, 200])
+    client = prsvapi.PrsvClient("test-ingest")
+    client.mount("https://", adapter)
+
+    response = client.get(prsvapi.BASE_URL)
+
+    assert response.status_code == 200
+    assert len(adapter.sent) == 2
+    refresh.assert_called_once_with("test-ingest", rejected="expired")
+
+
+def test_client_does_not_retry_explicit_token(mocker):
+    refresh = mocker.patch.object(prsvapi.TOKENS, "refresh")
+    adapter = SequenceAdapter([401, 200])
+    client = prsvapi.PrsvClient("test-ingest")
+    client.mount("https://", adapter)
+
+    response = client.get(prsvapi.BASE_URL, headers={prsvapi.TOKEN_HEADER: "mine"})
+
+    assert response.status_code == 401
+    refresh.assert_not_called()
+
+
+SCHEMAS_RESPONSE = '<SchemasResponse xmlns="http://preservica.com/AdminAPI/v7.0"/>'
+
+
+@pytest.fixture
+def schemas_client(mocker, monkeypatch, tmp_path):
+    monkeypatch.setattr(prsvapi, "_APIVERSIONS", {})
+    monkeypatch.setattr(prsvapi.TOKENS, "token_dir", tmp_path)
+    client = mocker.patch("prsv_tools.utility.api.get_client").return_value
+    client.get.return_value.text = SCHEMAS_RESPONSE
+    return client
+
+
+def test_parse_apiversion():
+    tag = "{http://preservica.com/XIP/v7.0}Title"
+
+    assert prsvapi.parse_apiversion(tag) == "7.0"
+
+
+def test_apiversion_is_looked_up_once(schemas_client):
+    assert prsvapi.find_apiversion("test-ingest") == "7.0"
+    assert prsvapi.find_apiversion("test-ingest") == "7.0"
+    schemas_client.get.assert_called_once()
+
+
+def test_apiversion_is_reused_between_processes(schemas_client, monkeypatch):
+    prsvapi.find_apiversion("test-ingest")
+    monkeypatch.setattr(prsvapi, "_APIVERSIONS", {})
+
+    assert prsvapi.find_apiversion("test-ingest") == "7.0"
+    schemas_client.get.assert_called_once()
+
+
+def test_apiversion_is_not_persisted(schemas_client, monkeypatch):
+    prsvapi.find_apiversion("test-ingest", persist=False)
+    monkeypatch.setattr(prsvapi, "_APIVERSIONS", {})
+
+    prsvapi.find_apiversion("test-ingest", persist=False)
+
+    assert schemas_client.get.call_count == 2
+
+
+def test_expired_apiversion_is_looked_up_again(schemas_client, monkeypatch):
+    prsvapi.find_apiversion("test-ingest")
+    monkeypatch.setattr(prsvapi, "_APIVERSIONS", {})
+    monkeypatch.setattr(prsvapi, "APIVERSION_TTL", -1)
+
+    prsvapi.find_apiversion("test-ingest")
+
+    assert schemas_client.get.call_count == 2
+
+
+def test_namespaces_use_apiversion(schemas_client):
+    namespaces = prsvapi.get_namespaces("test-ingest")
+
+    assert namespaces["xip_ns"] == "{http://preservica.com/XIP/v7.0}"
+    assert namespaces["entity_ns"] == "{http://preservica.com/EntityAPI/v7.0}"
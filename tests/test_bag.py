@@ -0,0 +1,111 @@
+import shutil
+from pathlib import Path
+
+import bagit
+import pytest
+
+import prsv_tools.utility.bag as prsvbag
+import prsv_tools.utility.checksum as prsvchecksum
+
+
+@pytest.fixture
+def bag(tmp_path: Path):
+    pkg = tmp_path / "123456"
+    (pkg / "PreservationMasters").mkdir(parents=True)
+    (pkg / "PreservationMasters" / "mym_123456_v01_pm.flac").write_bytes(b"a" * 100)
+    (pkg / "PreservationMasters" / "mym_123456_v01_pm.json").write_bytes(b"{}")
+    bagit.make_bag(str(pkg), checksums=["md5", "sha256"])
+    return pkg
+
+
+def test_valid_bag_has_no_problems(bag: Path):
+    progress = []
+
+    problems = prsvbag.validate_bag(
+        bag, workers=2, progress=lambda done, total: progress.append((done, total))
+    )
+
+    assert problems == []
+    assert progress[-1] == (102, 102)
+
+
+def test_changed_file_does_not_match(bag: Path):
+    pm = bag / "data" / "PreservationMasters" / "mym_123456_v01_pm.flac"
+    pm.write_bytes(b"b" * 100)
+
+    problems = prsvbag.validate_bag(bag)
+
+    assert problems == [("has files that do not match the manifest", [pm])]
+
+
+def test_uppercase_manifest_is_valid(bag: Path):
+    for manifest in bag.glob("manifest-*.txt"):
+        lines = manifest.read_text().splitlines()
+        upper = [f"{digest.upper()} {path}" for digest, path in map(str.split, lines)]
+        manifest.write_text("\n".join(upper) + "\n")
+    bagit.Bag(str(bag)).save()
+    assert bagit.Bag(str(bag)).is_valid()
+
+    problems = prsvbag.validate_bag(bag)
+
+    assert problems == []
+
+
+def test_oxum_mismatch_is_not_hashed(bag: Path, mocker):
+    pm = bag / "data" / "PreservationMasters" / "mym_123456_v01_pm.flac"
+    pm.write_bytes(b"a" * 10)
+    spy = mocker.spy(prsvchecksum, "hash_file")
+
+    problems = prsvbag.validate_bag(bag)
+
+    assert "Payload-Oxum is 102.2, found 12.2" in problems[0][0]
+    spy.assert_not_called()
+
+
+def test_missing_and_unlisted_files(bag: Path):
+    (bag / "data" / "PreservationMasters" / "mym_123456_v01_pm.json").unlink()
+    (bag / "data" / "extra.txt").write_bytes(b"{}")
+
+    problems = prsvbag.validate_bag(bag)
+
+    assert [x for x, _ in problems] == [
+        "is missing files",
+        "has files not in a manifest",
+    ]
+
+
+def test_any_hashlib_manifest_algorithm_is_checked(tmp_path: Path, mocker):
+    pkg = tmp_path / "123456"
+    (pkg / "PreservationMasters").mkdir(parents=True)
+    (pkg / "PreservationMasters" / "mym_123456_v01_pm.flac").write_bytes(b"a" * 100)
+    bagit.make_bag(str(pkg), checksums=["sha224", "sha384"])
+    spy = mocker.spy(prsvchecksum, "hash_file")
+
+    problems = prsvbag.validate_bag(pkg)
+
+    assert problems == []
+    assert sorted(spy.call_args.args[1]) == ["sha224", "sha384"]
+
+
+def test_unsupported_manifest_algorithm_is_skipped(bag: Path, mocker):
+    shutil.copy(bag / "manifest-md5.txt", bag / "manifest-shake_128.txt")
+    spy = mocker.spy(prsvchecksum, "hash_file")
+
+    problems = prsvbag.validate_bag(bag)
+
+    assert problems == []
+    assert sorted(spy.call_args.args[1]) == ["md5", "sha256"]
+
+
+def test_bag_without_supported_manifest_is_not_hashed(bag: Path, mocker):
+    shutil.copy(bag / "manifest-md5.txt", bag / "manifest-shake_128.txt")
+    (bag / "manifest-md5.txt").unlink()
+    (bag / "manifest-sha256.txt").unlink()
+    spy = mocker.spy(prsvchecksum, "hash_file")
+
+    problems = prsvbag.validate_bag(bag)
+
+    assert problems == [
+        ("has no manifest in a supported algorithm", [bag / "manifest-shake_128.txt"])
+    ]
+    spy.assert_not_called()
@@ -0,0 +1,53 @@
+import pytest
+
+import prsv_tools.utility.cache as prsvcache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return prsvcache.EntityCache(tmp_path)
+
+
+def test_stored_entity_is_returned(cache):
+    cache.put("uuid", "so", {"title": "M1234_ER_1"})
+
+    assert cache.get("uuid", "so") == {"title": "M1234_ER_1"}
+
+
+def test_kinds_are_kept_apart(cache):
+    cache.put("uuid", "so", {"title": "M1234_ER_1"})
+
+    assert cache.get("uuid", "title") is None
+
+
+def test_entity_is_stale_after_ttl(tmp_path):
+    cache = prsvcache.EntityCache(tmp_path, ttl=-1)
+    cache.put("uuid", "so", {"title": "M1234_ER_1"})
+
+    assert cache.get("uuid", "so") is None
+    assert cache.lookup("uuid", "so").data == {"title": "M1234_ER_1"}
+
+
+def test_touch_renews_entity(tmp_path, monkeypatch):
+    cache = prsvcache.EntityCache(tmp_path, ttl=10)
+    monkeypatch.setattr(prsvcache.time, "time", lambda: 0)
+    cache.put("uuid", "so", {})
+    monkeypatch.setattr(prsvcache.time, "time", lambda: 20)
+
+    cache.touch("uuid", "so")
+
+    assert cache.get("uuid", "so") == {}
+
+
+def test_cache_is_shared_through_the_file(tmp_path):
+    prsvcache.EntityCache(tmp_path).put("uuid", "so", {"title": "M1234_ER_1"})
+
+    assert prsvcache.EntityCache(tmp_path).get("uuid", "so")
+
+
+def test_if_modified_since_header(cache):
+    cache.put("uuid", "so", {})
+
+    header = prsvcache.if_modified_since(cache.lookup("uuid", "so"))
+
+    assert header["If-Modified-Since"].endswith("GMT")
@@ -0,0 +1,65 @@
+import hashlib
+import io
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.utility.checksum as prsvchecksum
+
+
+@pytest.fixture
+def file(tmp_path: Path):
+    file = tmp_path / "file"
+    file.write_bytes(b"some bytes")
+    return file
+
+
+def test_hash_file_returns_every_algorithm(file: Path):
+    hashes = prsvchecksum.hash_file(file, ["md5", "sha256"])
+
+    assert hashes["md5"] == "9d0568469d206c1aedf1b71f12f474bc"
+    assert set(hashes) == {"md5", "sha256"}
+
+
+def test_hash_file_reads_the_file_once(file: Path, mocker):
+    spy = mocker.spy(prsvchecksum, "hash_stream")
+
+    prsvchecksum.hash_file(file, prsvchecksum.ALGORITHMS)
+
+    spy.assert_called_once()
+
+
+def test_hash_stream_spans_buffers(monkeypatch):
+    monkeypatch.setattr(prsvchecksum, "BUFFER_SIZE", 3)
+    data = b"abcdefghij"
+
+    hashes = prsvchecksum.hash_stream(io.BytesIO(data), ["sha512"])
+
+    assert hashes["sha512"] == hashlib.sha512(data).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "algorithm", ["MD5", "SHA-1", "sha-256", "SHA512", "sha224", "SHA-384", "SHA3-256"]
+)
+def test_normalize_accepts_manifest_names(algorithm):
+    assert prsvchecksum.normalize(algorithm) in prsvchecksum.ALGORITHMS
+
+
+def test_normalize_rejects_unknown_algorithm():
+    with pytest.raises(ValueError):
+        prsvchecksum.normalize("crc32")
+    with pytest.raises(ValueError):
+        prsvchecksum.normalize("shake_128")
+
+
+def test_hash_files_hashes_every_file(tmp_path: Path):
+    paths = []
+    for i in range(5):
+        paths.append(tmp_path / f"file_{i}")
+        paths[-1].write_bytes(bytes([i]) * 100)
+
+    digests = prsvchecksum.hash_files(paths, ["md5"], workers=3)
+
+    assert list(digests) == paths
+    for path in paths:
+        assert digests[path]["md5"] == hashlib.md5(path.read_bytes()).hexdigest()
@@ -410,3 +410,51 @@ def test_require_at_least_one_id(
     stderr = capsys.readouterr().err
 
     assert "at least one ID argument is required" in stderr
+
+
+def test_packages_keep_argument_order(
+    tmp_path: Path, directory_of_packages: Path, monkeypatch: pytest.MonkeyPatch
+):
+    fake_cli = prsvcli.Parser()
+    fake_cli.add_package()
+    fake_cli.add_packagedirectory()
+
+    two = directory_of_packages / "two"
+    one = directory_of_packages / "one"
+
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script",
+            "--package",
+            str(two),
+            str(one),
+            "--directory",
+            str(directory_of_packages),
+        ],
+    )
+
+    args = fake_cli.parse_args()
+
+    assert list(args.packages) == [two, one]
+
+
+def test_directory_is_listed_when_packages_are_used(
+    directory_of_packages: Path, monkeypatch: pytest.MonkeyPatch
+):
+    fake_cli = prsvcli.Parser()
+    fake_cli.add_packagedirectory()
+
+    monkeypatch.setattr(
+        "sys.argv", ["script", "--directory", str(directory_of_packages)]
+    )
+
+    args = fake_cli.parse_args()
+    (directory_of_packages / "three").mkdir()
+    (directory_of_packages / "file.txt").touch()
+
+    assert sorted(args.packages) == [
+        directory_of_packages / "one",
+        directory_of_packages / "three",
+        directory_of_packages / "two",
+    ]
@@ -0,0 +1,153 @@
+import functools
+import logging
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.ingest.lint_er as lint_er
+import prsv_tools.utility.lint as prsvlint
+import prsv_tools.utility.tree as prsvtree
+
+
+@pytest.fixture
+def packages(tmp_path: Path):
+    packages = []
+    for name in ["M12345_ER_0003", "M12345_ER_0001", "M12345_0002"]:
+        pkg = tmp_path / "packages" / name
+        (pkg / "objects").mkdir(parents=True)
+        (pkg / "objects" / "file.txt").write_bytes(b"some bytes")
+        (pkg / "metadata").mkdir()
+        (pkg / "metadata" / f"{name}.csv").write_bytes(b"some bytes")
+        packages.append(pkg)
+    return packages
+
+
+@pytest.fixture
+def log_file(tmp_path: Path):
+    log_file = tmp_path / "lint.log"
+    handler = logging.FileHandler(log_file)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    yield log_file
+    root.removeHandler(handler)
+    handler.close()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_are_in_sorted_order(packages, workers):
+    results = prsvlint.lint_in_pool(lint_er.lint_package, packages, workers)
+
+    assert results == [
+        (sorted(packages)[0], "invalid"),
+        (sorted(packages)[1], "valid"),
+        (sorted(packages)[2], "valid"),
+    ]
+
+
+def test_worker_logs_reach_parent_handlers(packages, log_file):
+    prsvlint.lint_in_pool(lint_er.lint_package, packages, workers=2)
+
+    assert "M12345_0002 does not conform" in log_file.read_text()
+
+
+def test_fingerprint_changes_with_package(packages):
+    package = packages[0]
+    before = prsvlint.fingerprint(prsvtree.PackageTree(package))
+
+    (package / "objects" / "new.txt").write_bytes(b"new")
+
+    assert before != prsvlint.fingerprint(prsvtree.PackageTree(package))
+
+
+def test_unchanged_package_is_not_linted_again(packages, tmp_path, mocker, caplog):
+    package = sorted(packages)[0]
+    lint = prsvlint.CachedLint(lint_er.lint_package, tmp_path)
+    assert lint(package) == "invalid"
+    caplog.clear()
+
+    spy = mocker.spy(lint_er, "package_has_valid_name")
+    assert lint(package) == "invalid"
+
+    spy.assert_not_called()
+    assert "M12345_0002 does not conform" in caplog.text
+
+
+def test_changed_package_is_linted_again(packages, tmp_path, mocker):
+    package = sorted(packages)[1]
+    lint = prsvlint.CachedLint(lint_er.lint_package, tmp_path)
+    assert lint(package) == "valid"
+
+    (package / "objects" / "empty.txt").touch()
+    spy = mocker.spy(lint_er, "package_has_valid_name")
+
+    assert lint(package) == "invalid"
+    spy.assert_called_once()
+
+
+def test_cached_lint_runs_in_pool(packages, tmp_path):
+    lint = prsvlint.CachedLint(lint_er.lint_package, tmp_path)
+
+    first = prsvlint.lint_in_pool(lint, packages, workers=2)
+
+    assert prsvlint.lint_in_pool(lint, packages, workers=2) == first
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+
+def test_lint_result_records_failed_checks_and_paths(packages):
+    package = sorted(packages)[1]
+    (package / "objects" / "empty.txt").touch()
+    (package / "objects" / ".DS_Store").write_bytes(b"some bytes")
+
+    result = lint_er.lint_result(package)
+
+    assert result.verdict == "invalid"
+    assert result.failed_checks == [
+        "package_has_no_hidden_file",
+        "package_has_no_zero_bytes_file",
+    ]
+    assert result.findings[0].severity == "needs review"
+    assert result.findings[1].paths == [str(package / "objects" / "empty.txt")]
+
+
+def test_finding_without_paths_names_package(packages):
+    package = sorted(packages)[0]
+
+    result = lint_er.lint_result(package)
+
+    assert result.failed_checks == [
+        "package_has_valid_name",
+        "metadata_FTK_file_has_valid_filename",
+    ]
+    assert result.findings[0].paths == [str(package)]
+    assert "does not conform" in result.findings[0].messages[0]
+
+
+@pytest.mark.parametrize("suffix", [".json", ".csv"])
+def test_report_round_trip(packages, tmp_path, suffix):
+    (sorted(packages)[1] / "objects" / "empty.txt").touch()
+    results = lint_er.lint_results(packages)
+    report = tmp_path / f"report{suffix}"
+
+    prsvlint.write_report(results, report)
+
+    assert prsvlint.read_report(report) == results
+
+
+def test_cached_lint_returns_lint_result(packages, tmp_path, mocker):
+    package = sorted(packages)[0]
+    lint = prsvlint.CachedLint(lint_er.lint_result, tmp_path)
+    first = lint(package)
+
+    spy = mocker.spy(lint_er, "package_has_valid_name")
+
+    assert lint(package) == first
+    spy.assert_not_called()
+
+
+def test_cached_lint_keeps_options_apart(packages, tmp_path):
+    plain = prsvlint.CachedLint(lint_er.lint_result, tmp_path)
+    option = prsvlint.CachedLint(
+        functools.partial(lint_er.lint_result, option=True), tmp_path
+    )
+
+    assert plain.cache_file(packages[0]) != option.cache_file(packages[0])
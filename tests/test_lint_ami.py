@@ -3,6 +3,7 @@ from pathlib import Path
 import pytest
 
 import prsv_tools.ingest.lint_ami as lint_ami
+import prsv_tools.utility.tree as prsvtree
 
 
 # Unit tests
@@ -171,6 +172,18 @@ def test_data_folder_has_empty_folder(good_package: Path):
     assert not result
 
 
+def test_data_folder_has_symlinked_folder(good_package: Path, tmp_path: Path):
+    """Test that a symlinked folder with files in it is not taken as empty"""
+    linked = tmp_path / "linked"
+    linked.mkdir()
+    (linked / "file.json").touch()
+    (good_package / "data" / "linkdir").symlink_to(linked)
+
+    result = lint_ami.data_folder_has_no_empty_folder(good_package)
+
+    assert result
+
+
 def test_data_folder_has_acceptable_extensions(good_package: Path):
     """The package should only have acceptable extensions"""
     result = lint_ami.data_files_are_expected_types(good_package)
@@ -459,3 +472,37 @@ def test_lint_invalid_package(monkeypatch, good_package, capsys, tmp_path):
     stdout = capsys.readouterr().out
 
     assert f"packages are invalid: {bad_package.name}" in stdout
+
+
+def test_data_file_names_are_classified_in_one_pass(good_package: Path):
+    pm_folder = good_package / "data" / "PreservationMasters"
+    part_stream = pm_folder / "mym_123456_v01p02s03_pm.flac"
+    region = pm_folder / "mym_123456_v01r04_pm.flac"
+    for file in [part_stream, region]:
+        file.write_bytes(b"some bytes")
+    tree = prsvtree.PackageTree(good_package)
+
+    issues = lint_ami.classify_data_files(tree)
+
+    assert issues["part"] == [part_stream]
+    assert issues["stream"] == [part_stream]
+    assert issues["region"] == [region]
+    assert lint_ami.classify_data_files(tree) is issues
+
+
+def test_lint_package_walks_package_once(good_package: Path, mocker):
+    scandir = mocker.spy(prsvtree.os, "scandir")
+
+    assert lint_ami.lint_package(good_package) == "valid"
+
+    # one scandir per folder: the package, data, its two folders and tags
+    assert scandir.call_count == 5
+
+
+def test_verify_bags_checks_manifests(good_package):
+    assert lint_ami.lint_result(good_package).verdict == "valid"
+
+    result = lint_ami.lint_result(good_package, verify_bags=True)
+
+    assert result.verdict == "invalid"
+    assert result.failed_checks == ["package_bag_is_valid"]
@@ -3,6 +3,7 @@ from pathlib import Path
 import pytest
 
 import prsv_tools.ingest.lint_er as lint_er
+import prsv_tools.utility.tree as prsvtree
 
 
 # Unit tests
@@ -431,3 +432,20 @@ def test_lint_invalid_package(monkeypatch, good_package, capsys, tmp_path):
     stdout = capsys.readouterr().out
 
     assert f"packages are invalid: {[str(bad_package.name)]}" in stdout
+
+
+def test_checks_accept_package_tree(good_package):
+    tree = prsvtree.PackageTree(good_package)
+
+    assert lint_er.package_has_valid_subfolder_names(tree)
+    assert lint_er.package_has_no_zero_bytes_file(tree)
+    assert lint_er.lint_package(tree) == "valid"
+
+
+def test_lint_package_walks_package_once(good_package, mocker):
+    scandir = mocker.spy(prsvtree.os, "scandir")
+
+    lint_er.lint_package(good_package)
+
+    # one scandir per folder: the package, objects and metadata
+    assert scandir.call_count == 3
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.utility.move as prsvmove
+
+
+@pytest.fixture
+def package(tmp_path: Path):
+    pkg = tmp_path / "source" / "123456"
+    (pkg / "data").mkdir(parents=True)
+    (pkg / "data" / "file.flac").write_bytes(b"some bytes")
+    (pkg / "bagit.txt").write_bytes(b"bag")
+    return pkg
+
+
+def test_move_renames_on_same_device(package: Path, tmp_path: Path, mocker):
+    copytree = mocker.spy(prsvmove.shutil, "copytree")
+    target = tmp_path / "destination" / "123" / "123456"
+
+    prsvmove.move(package, target)
+
+    assert (target / "data" / "file.flac").read_bytes() == b"some bytes"
+    assert not package.exists()
+    copytree.assert_not_called()
+
+
+def test_move_copies_and_verifies_across_devices(
+    package: Path, tmp_path: Path, monkeypatch
+):
+    monkeypatch.setattr(prsvmove, "same_device", lambda *args: False)
+    target = tmp_path / "destination" / "123" / "123456"
+
+    prsvmove.move(package, target)
+
+    assert (target / "data" / "file.flac").read_bytes() == b"some bytes"
+    assert not package.exists()
+    assert not list(target.parent.glob(f"*{prsvmove.PARTIAL_SUFFIX}"))
+
+
+def test_failed_verification_keeps_source(package: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(prsvmove, "same_device", lambda *args: False)
+
+    def short_copy(source, copy):
+        Path(copy).mkdir()
+
+    monkeypatch.setattr(prsvmove.shutil, "copytree", short_copy)
+    target = tmp_path / "destination" / "123456"
+
+    with pytest.raises(OSError, match="does not match"):
+        prsvmove.move(package, target)
+
+    assert package.exists()
+    assert not target.exists()
+    assert not list(target.parent.iterdir())
+
+
+def test_move_refuses_existing_target(package: Path, tmp_path: Path):
+    target = tmp_path / "destination" / "123456"
+    target.mkdir(parents=True)
+
+    with pytest.raises(FileExistsError):
+        prsvmove.move(package, target)
+
+    assert package.exists()
+
+
+def test_plan_groups_by_destination_folder(tmp_path: Path):
+    sources = [tmp_path / name for name in ["a", "b", "c"]]
+    for source in sources:
+        source.mkdir()
+
+    plan = prsvmove.plan_moves(
+        [
+            (sources[0], tmp_path / "x" / "a"),
+            (sources[1], tmp_path / "y" / "b"),
+            (sources[2], tmp_path / "x" / "c"),
+        ]
+    )
+
+    assert list(plan) == [tmp_path / "x", tmp_path / "y"]
+    assert [x.source for x in plan[tmp_path / "x"]] == [sources[0], sources[2]]
+    assert "rename" in prsvmove.describe_plan(plan)
+
+
+def test_run_moves_reports_each_outcome(package: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(prsvmove, "same_device", lambda *args: False)
+    taken = tmp_path / "destination" / "taken"
+    taken.mkdir(parents=True)
+    other = tmp_path / "source" / "taken"
+    other.mkdir()
+
+    plan = prsvmove.plan_moves(
+        [(package, tmp_path / "destination" / "123456"), (other, taken)]
+    )
+    outcomes = dict(prsvmove.run_moves(plan, workers=2))
+
+    assert outcomes[prsvmove.Move(package, tmp_path / "destination" / "123456")] is None
+    assert isinstance(outcomes[prsvmove.Move(other, taken)], FileExistsError)
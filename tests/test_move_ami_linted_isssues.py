@@ -4,7 +4,9 @@ from unittest.mock import Mock
 
 import pytest
 
+import prsv_tools.ingest.lint_ami as prsv_lint_ami
 import prsv_tools.ingest.move_ami_linted_issues as move_ami
+import prsv_tools.utility.lint as prsvlint
 
 
 def test_package_argument(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
@@ -151,3 +153,127 @@ def test_moved_package_exists(tmp_destination: Path, good_package: Path, caplog)
     )
 
     assert log_msg in caplog.text
+
+
+def test_route_follows_check_priority(good_package: Path):
+    result = prsvlint.LintResult(
+        good_package,
+        "invalid",
+        [
+            prsvlint.Finding("package_has_no_hidden_file", "needs review"),
+            prsvlint.Finding("package_is_a_bag", "invalid"),
+        ],
+    )
+
+    assert move_ami.route(result) == "not_bagged"
+
+
+def test_move_ifs_uses_lint_result(tmp_destination: Path, good_package: Path, mocker):
+    result = prsvlint.LintResult(
+        good_package, "invalid", [prsvlint.Finding("package_is_a_bag", "invalid")]
+    )
+    spy = mocker.spy(move_ami.prsvlintami, "package_is_a_bag")
+
+    assert move_ami.move_ifs(good_package, tmp_destination, result)[1] == "not_bagged"
+
+    spy.assert_not_called()
+    assert (tmp_destination / "not_bagged" / "123" / "123456").exists()
+
+
+def test_main_moves_packages_from_lint_report(
+    tmp_path: Path, tmp_destination: Path, good_package: Path, monkeypatch
+):
+    (good_package / "bagit.txt").unlink()
+    report = tmp_path / "report.csv"
+    prsvlint.write_report(prsv_lint_ami.lint_results([good_package]), report)
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script",
+            "--lint_report",
+            str(report),
+            "--destination",
+            str(tmp_destination),
+        ],
+    )
+
+    move_ami.main()
+
+    assert (tmp_destination / "not_bagged" / "123" / "123456").exists()
+
+
+def test_main_moves_needs_review_packages(
+    tmp_destination: Path, good_package: Path, monkeypatch
+):
+    (good_package / ".DS_Store").write_bytes(b"some bytes")
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script",
+            "--package",
+            str(good_package),
+            "--destination",
+            str(tmp_destination),
+        ],
+    )
+
+    move_ami.main()
+
+    assert (tmp_destination / "has_hidden_files" / "123" / "123456").exists()
+
+
+def test_dry_run_moves_nothing(
+    tmp_destination: Path, good_package: Path, monkeypatch, capsys
+):
+    (good_package / "bagit.txt").unlink()
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script",
+            "--package",
+            str(good_package),
+            "--destination",
+            str(tmp_destination),
+            "--dry_run",
+        ],
+    )
+
+    move_ami.main()
+
+    assert good_package.exists()
+    assert not (tmp_destination / "not_bagged").exists()
+    assert f"{tmp_destination / 'not_bagged' / '123'}:" in capsys.readouterr().out
+
+
+def test_main_moves_packages_with_unexpected_file_types(
+    tmp_destination: Path, good_package: Path, monkeypatch
+):
+    (good_package / "data" / "notes.txt").write_bytes(b"some bytes")
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script",
+            "--package",
+            str(good_package),
+            "--destination",
+            str(tmp_destination),
+        ],
+    )
+
+    assert prsv_lint_ami.lint_result(good_package).verdict == "valid"
+
+    move_ami.main()
+
+    assert (tmp_destination / "unexpected_file_types" / "123" / "123456").exists()
+
+
+def test_valid_packages_are_not_moved(
+    tmp_destination: Path, good_package: Path, caplog
+):
+    caplog.set_level(logging.INFO)
+    results = prsv_lint_ami.lint_results([good_package])
+
+    move_ami.move_results(results, tmp_destination)
+
+    assert good_package.exists()
+    assert "VALID, has not been moved" in caplog.text
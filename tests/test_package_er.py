@@ -1,8 +1,158 @@
+import inspect
+import os
 import sys
 
+import pytest
+
 
 def test_run():
     import prsv_tools.ingest.package_er
 
     assert prsv_tools.ingest.package_er.config_input == "DA_config.ini"
     assert "prsv_tools.ingest.package_er" in sys.modules
+
+
+def test_package_job_keeps_its_own_paths():
+    import prsv_tools.ingest.package_er as package_er
+
+    first = package_er.PackageJob("M1234_ER_1", "DigArch")
+    second = package_er.PackageJob("M1234_ER_2", "DigArch")
+
+    assert first.SOCategoryContainer == "ERContainer"
+    assert first.opex_title_content == "M1234_ER_1_contents"
+    assert first.workingf_wf_package != second.workingf_wf_package
+    assert first.workingf_wf == os.path.join(package_er.workingf, "M1234_ER_1")
+    assert first.workingPAXf_wf == os.path.join(package_er.workingPAXf, "M1234_ER_1")
+    assert first.container.startswith("Container_M1234_ER_1_")
+
+    first.list_contents_folder.append("a")
+    assert second.list_contents_folder == []
+
+
+def test_package_job_rejects_inconsistent_name():
+    import prsv_tools.ingest.package_er as package_er
+
+    with pytest.raises(ValueError):
+        package_er.PackageJob("M1234_ER", "DigArch")
+
+
+def test_get_packages_builds_every_package(tmp_path, mocker):
+    import prsv_tools.ingest.package_er as package_er
+
+    for name in ["M1234_ER_1", "M1234_ER_2", "M1234_ER_3"]:
+        (tmp_path / "DigArch" / name).mkdir(parents=True)
+    mocker.patch.object(package_er, "sourcef", str(tmp_path))
+    mocker.patch.object(package_er, "max_package_workers", 2)
+
+    def build(job):
+        job.timings["copy"] = 1.0
+        if job.package == "M1234_ER_2":
+            raise OSError("disk full")
+        return True
+
+    mocker.patch.object(package_er, "fBuildPackage", side_effect=build)
+
+    results = package_er.fGetPackages("DigArch")
+
+    assert sorted(job.package for job, built in results.items() if built) == [
+        "M1234_ER_1",
+        "M1234_ER_3",
+    ]
+    summary = package_er.fSummariseBuilds(results)
+    assert summary[0] == "fSummariseBuilds : 2 packages built, 1 failed"
+    assert "fSummariseBuilds : failed M1234_ER_2" in summary
+    assert "fSummariseBuilds : copy total 3.0s, slowest package 1.0s" in summary
+
+
+@pytest.mark.parametrize(
+    "sum_type, expected",
+    [
+        ("md5", "9d0568469d206c1aedf1b71f12f474bc"),
+        ("SHA-1", "f2497d87345140ed5bb53fa233aba45e1aefdd75"),
+    ],
+)
+def test_fv6checksum(tmp_path, sum_type, expected):
+    import prsv_tools.ingest.package_er as package_er
+
+    file = tmp_path / "file"
+    file.write_bytes(b"some bytes")
+
+    assert package_er.fv6Checksum(file, sum_type) == expected
+
+
+def test_scan_removes_non_approved_files_from_the_link_tree_only(tmp_path, mocker):
+    import prsv_tools.ingest.package_er as package_er
+
+    source = tmp_path / "source" / "DigArch" / "M1234_ER_1"
+    (source / "objects").mkdir(parents=True)
+    (source / "objects" / "a.txt").write_bytes(b"a")
+    (source / "objects" / "Thumbs.db").write_bytes(b"db")
+    mocker.patch.object(package_er, "sourcef", str(tmp_path / "source"))
+    mocker.patch.object(package_er, "workingf", str(tmp_path / "working"))
+    mocker.patch.object(package_er, "staging_mode", "hardlink")
+    job = package_er.PackageJob("M1234_ER_1", "DigArch")
+    job.stager.stage_tree(job.sourcef_wf_package, job.workingf_wf_package)
+
+    assert package_er.fScanSource_ApprovedFormats(job.workingf_wf_package, job)
+
+    working = tmp_path / "working" / "M1234_ER_1" / "M1234_ER_1" / "objects"
+    assert not (working / "Thumbs.db").exists()
+    assert (source / "objects" / "Thumbs.db").read_bytes() == b"db"
+    assert job.list_excepted_files == [str(working / "Thumbs.db")]
+    assert job.list_contents_folder == [str(working / "a.txt")]
+
+
+def test_credential_set_client_adds_its_own_token(mocker):
+    import prsv_tools.ingest.package_er as package_er
+
+    mocker.patch.object(package_er, "credential_set", "test-ingest")
+    securitytoken = mocker.patch.object(package_er, "securitytoken")
+
+    headers = package_er.fPreservicaHeaders({"Content-Type": "application/xml"})
+
+    assert headers == {"Content-Type": "application/xml"}
+    assert package_er.fPreservicaClient().credential_set == "test-ingest"
+    securitytoken.assert_not_called()
+
+
+def test_config_token_is_sent_without_credential_set(mocker):
+    import prsv_tools.ingest.package_er as package_er
+
+    mocker.patch.object(package_er, "credential_set", "")
+    mocker.patch.object(package_er, "securitytoken", return_value="token")
+
+    headers = package_er.fPreservicaHeaders({"Content-Type": "application/xml"})
+
+    assert headers["Preservica-Access-Token"] == "token"
+    assert package_er.fPreservicaClient().credential_set is None
+
+
+def test_build_stages_do_not_use_shared_package_state():
+    import prsv_tools.ingest.package_er as package_er
+
+    # configuration that every package reads
+    read_only = {"list_non_approved", "dict_frh_title", "dict_frh_description"}
+    shared = {
+        name
+        for name, value in vars(package_er).items()
+        if isinstance(value, (list, dict, set)) and name not in read_only
+    }
+
+    reached = set()
+    todo = [package_er.fBuildPackage]
+    while todo:
+        function = todo.pop()
+        if function.__name__ in reached:
+            continue
+        reached.add(function.__name__)
+        codes = [function.__code__]
+        codes += [x for x in function.__code__.co_consts if inspect.iscode(x)]
+        names = {x for code in codes for x in code.co_names}
+        for name in names:
+            assert name not in shared, f"{function.__name__} uses {name}"
+            value = getattr(package_er, name, None)
+            if inspect.isfunction(value) and value.__module__ == package_er.__name__:
+                todo.append(value)
+
+    assert "fScanSource_ApprovedFormats" in reached
+    assert "fCreateFileOpexFragments" in reached
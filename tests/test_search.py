@@ -75,3 +75,158 @@ def test_search_no_results(json_response, mocker):
         prsvsearch.search(coll_id="xxx", er_id="xxx", ami_id="xxx")
 
     assert "expected one result, got none" in exc_info.value.args[0]
+
+
+def paged_response(hits: int):
+    """answer a search request like the API, one page of hits at a time"""
+
+    def get_response(url, data):
+        start, page_size = data["start"], int(data["max"])
+        uuids = range(start, min(start + page_size, hits))
+        return {
+            "value": {
+                "totalHits": hits,
+                "objectIds": [f"sdb:SO|{uuid}" for uuid in uuids],
+                "metadata": [
+                    [
+                        {"name": "xip.title", "value": f"M1234_ER_{uuid}"},
+                        {"name": "xip.securitytag", "value": "open"},
+                        {"name": "xip.identifier", "value": ["soCategory ERContainer"]},
+                        {"name": "xip.parent_ref", "value": "parent"},
+                        {"name": "spec.specCollectionID", "value": "M1234"},
+                    ]
+                    for uuid in uuids
+                ],
+            }
+        }
+
+    return get_response
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_search_pages_through_all_hits(mocker, prefetch: bool):
+    get_response = mocker.patch(
+        "prsv_tools.utility.search.get_response", side_effect=paged_response(25)
+    )
+
+    results = list(prsvsearch.iter_search({}, page_size=10, prefetch=prefetch))
+
+    assert [so.uuid for so in results] == [str(i) for i in range(25)]
+    assert get_response.call_count == 3
+
+
+def test_iter_search_stops_at_limit(mocker):
+    get_response = mocker.patch(
+        "prsv_tools.utility.search.get_response", side_effect=paged_response(25)
+    )
+
+    results = list(prsvsearch.iter_search({}, page_size=10, limit=5))
+
+    assert len(results) == 5
+    get_response.assert_called_once()
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_search_stops_at_total_hits_below_limit(mocker, prefetch: bool):
+    get_response = mocker.patch(
+        "prsv_tools.utility.search.get_response", side_effect=paged_response(25)
+    )
+
+    results = list(
+        prsvsearch.iter_search({}, page_size=10, limit=30, prefetch=prefetch)
+    )
+
+    assert len(results) == 25
+    assert get_response.call_count == 3
+
+
+def test_search_item_requests_two_hits(mocker):
+    get_response = mocker.patch(
+        "prsv_tools.utility.search.get_response", side_effect=paged_response(2500)
+    )
+
+    with pytest.raises(ValueError) as exc_info:
+        prsvsearch.search(ami_id="123456")
+
+    assert "expected one result, got 2500" in exc_info.value.args[0]
+    get_response.assert_called_once()
+    assert get_response.call_args.args[1]["max"] == "2"
+
+
+def test_search_for_large_collection(mocker):
+    mocker.patch(
+        "prsv_tools.utility.search.get_response", side_effect=paged_response(2500)
+    )
+
+    results = prsvsearch.search(coll_id="M1234", er_id="all")
+
+    assert len(results) == 2500
+
+
+def id_response(url, data):
+    """answer a multi-valued ID query with one hit per requested ID"""
+    field = data["q"]["fields"][0]
+    hits = [id for id in field["values"] if id != "ER_404"]
+    return {
+        "value": {
+            "totalHits": len(hits),
+            "objectIds": [f"sdb:SO|{id}" for id in hits],
+            "metadata": [
+                [
+                    {"name": "xip.title", "value": id},
+                    {"name": "xip.securitytag", "value": "open"},
+                    {"name": "xip.identifier", "value": ["soCategory ERContainer"]},
+                    {"name": "xip.parent_ref", "value": "parent"},
+                    {"name": field["name"], "value": id},
+                ]
+                for id in hits
+            ],
+        }
+    }
+
+
+def test_search_many_batches_ids(mocker):
+    get_response = mocker.patch(
+        "prsv_tools.utility.search.get_response", side_effect=id_response
+    )
+    er_ids = [f"ER_{i}" for i in range(250)]
+    ami_ids = [f"{i:06}" for i in range(50)]
+
+    results = prsvsearch.search_many("M1234", er_ids=er_ids, ami_ids=ami_ids)
+
+    assert get_response.call_count == 4
+    assert len(results) == 300
+    assert results["ER_7"][0].uuid == "ER_7"
+    assert results["000049"][0].uuid == "000049"
+
+
+def test_search_many_reports_missing_ids(mocker):
+    mocker.patch("prsv_tools.utility.search.get_response", side_effect=id_response)
+
+    results = prsvsearch.search_many("M1234", er_ids=["ER_1", "ER_404"])
+
+    assert len(results["ER_1"]) == 1
+    assert results["ER_404"] == []
+
+
+def test_search_many_requires_collection_for_ers():
+    with pytest.raises(ValueError) as exc_info:
+        prsvsearch.search_many(er_ids=["ER_1"])
+
+    assert "coll_id is blank" in exc_info.value.args[0]
+
+
+def test_search_goes_to_configured_instance(mocker, monkeypatch):
+    monkeypatch.setattr(prsvsearch, "CREDENTIAL_SET", prsvsearch.CREDENTIAL_SET)
+    monkeypatch.setattr(prsvsearch, "SEARCHURL", prsvsearch.SEARCHURL)
+    monkeypatch.setattr(prsvsearch, "SOURL", prsvsearch.SOURL)
+    get_client = mocker.patch("prsv_tools.utility.api.get_client")
+    response = paged_response(0)(None, {"start": 0, "max": "1"})
+    get_client.return_value.post.return_value.json.return_value = response
+
+    prsvsearch.configure(credential_set=None, base_url="http://localhost:8080")
+    list(prsvsearch.iter_search("{}"))
+
+    get_client.assert_called_with(None)
+    url = get_client.return_value.post.call_args.args[0]
+    assert url == "http://localhost:8080/api/content/search"
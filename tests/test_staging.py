@@ -0,0 +1,161 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.utility.checksum as prsvchecksum
+import prsv_tools.utility.staging as prsvstaging
+
+
+@pytest.fixture
+def package(tmp_path: Path):
+    pkg = tmp_path / "source" / "M1234_ER_1"
+    (pkg / "objects" / "sub").mkdir(parents=True)
+    (pkg / "metadata").mkdir()
+    (pkg / "empty").mkdir()
+    (pkg / "objects" / "a.txt").write_bytes(b"a" * 100)
+    (pkg / "objects" / "sub" / "b.txt").write_bytes(b"b" * 10)
+    (pkg / "metadata" / "c.json").write_bytes(b"{}")
+    return pkg
+
+
+def md5(path: Path) -> str:
+    return hashlib.md5(path.read_bytes()).hexdigest()
+
+
+def test_copy_and_hash(package: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(prsvchecksum, "BUFFER_SIZE", 7)
+    source = package / "objects" / "a.txt"
+    target = tmp_path / "a.txt"
+
+    digests = prsvstaging.copy_and_hash(source, target, ["md5", "sha256"])
+
+    assert target.read_bytes() == source.read_bytes()
+    assert digests == {
+        "md5": md5(source),
+        "sha256": hashlib.sha256(source.read_bytes()).hexdigest(),
+    }
+
+
+@pytest.mark.parametrize("mode, link", [("hardlink", True), ("copy", False)])
+def test_stage_tree_keeps_fixities(package: Path, tmp_path: Path, mode, link):
+    stager = prsvstaging.Stager(["md5"], mode)
+    working = tmp_path / "working" / package.name
+
+    stager.stage_tree(package, working)
+
+    assert (working / "empty").is_dir()
+    for source in package.rglob("*.*"):
+        staged = working / source.relative_to(package)
+        assert staged.read_bytes() == source.read_bytes()
+        assert stager.fixity(staged, "md5") == md5(source)
+        assert os.path.samefile(source, staged) == link
+
+
+def test_copy_is_hashed_while_written(package: Path, tmp_path: Path, mocker):
+    spy = mocker.spy(prsvchecksum, "hash_file")
+    stager = prsvstaging.Stager(["md5"], "copy")
+
+    stager.stage_tree(package, tmp_path / "working")
+
+    spy.assert_not_called()
+
+
+def test_fixities_follow_the_file(package: Path, tmp_path: Path, mocker):
+    stager = prsvstaging.Stager(["md5"])
+    working = tmp_path / "working"
+    stager.stage_tree(package, working)
+    spy = mocker.spy(prsvchecksum, "hash_file")
+
+    target = tmp_path / "target" / "contents" / "a.txt"
+    stager.stage_file(working / "objects" / "a.txt", target)
+
+    spy.assert_not_called()
+    assert stager.fixity(target, "md5") == md5(package / "objects" / "a.txt")
+
+
+def test_link_falls_back_to_copy(package: Path, tmp_path: Path, mocker):
+    error = OSError(18, "Invalid cross-device link")
+    mocker.patch.dict(
+        prsvstaging.LINKS,
+        {"hardlink": mocker.Mock(side_effect=error), "reflink": mocker.Mock()},
+    )
+    target = tmp_path / "a.txt"
+
+    prsvstaging.Stager(["md5"], "hardlink").stage_file(
+        package / "objects" / "a.txt", target
+    )
+
+    prsvstaging.LINKS["reflink"].assert_not_called()
+    assert not os.path.samefile(package / "objects" / "a.txt", target)
+    assert target.read_bytes() == (package / "objects" / "a.txt").read_bytes()
+
+
+def test_auto_tries_hardlink_then_reflink(package: Path, tmp_path: Path, mocker):
+    tried = []
+
+    def cannot(name):
+        def link(source, target):
+            tried.append(name)
+            raise OSError(18, "Invalid cross-device link")
+
+        return link
+
+    mocker.patch.dict(
+        prsvstaging.LINKS,
+        {"hardlink": cannot("hardlink"), "reflink": cannot("reflink")},
+    )
+    stager = prsvstaging.Stager(["md5"], "auto")
+    target = tmp_path / "a.txt"
+
+    stager.stage_file(package / "objects" / "a.txt", target)
+
+    assert tried == ["hardlink", "reflink"]
+    assert stager.fixity(target, "md5") == md5(package / "objects" / "a.txt")
+
+
+def test_reflink_failure_leaves_no_file(package: Path, tmp_path: Path, mocker):
+    if prsvstaging.fcntl is None:
+        pytest.skip("reflinks need fcntl")
+    mocker.patch.object(
+        prsvstaging.fcntl, "ioctl", side_effect=OSError(95, "Not supported")
+    )
+    target = tmp_path / "a.txt"
+
+    with pytest.raises(OSError):
+        prsvstaging.reflink(package / "objects" / "a.txt", target)
+
+    assert not target.exists()
+
+
+def test_remove_only_unlinks_the_staged_file(package: Path, tmp_path: Path):
+    stager = prsvstaging.Stager(["md5"], "hardlink")
+    working = tmp_path / "working"
+    stager.stage_tree(package, working)
+
+    stager.remove(working / "objects" / "a.txt")
+
+    assert not (working / "objects" / "a.txt").exists()
+    assert (package / "objects" / "a.txt").read_bytes() == b"a" * 100
+    assert stager.fixity(working / "objects" / "a.txt", "md5") is None
+
+
+def test_remove_refuses_files_it_did_not_stage(package: Path):
+    with pytest.raises(ValueError):
+        prsvstaging.Stager().remove(package / "objects" / "a.txt")
+
+    assert (package / "objects" / "a.txt").exists()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        prsvstaging.Stager(mode="symlink")
+
+
+def test_stage_tree_does_not_overwrite(package: Path, tmp_path: Path):
+    working = tmp_path / "working"
+    working.mkdir()
+
+    with pytest.raises(FileExistsError):
+        prsvstaging.Stager().stage_tree(package, working)
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.utility.tree as prsvtree
+
+
+@pytest.fixture
+def package(tmp_path: Path):
+    pkg = tmp_path / "M12345_ER_0001"
+    (pkg / "objects" / "folder").mkdir(parents=True)
+    (pkg / "objects" / "folder" / "file.txt").write_bytes(b"some bytes")
+    (pkg / "objects" / "empty.txt").touch()
+    (pkg / "metadata").mkdir()
+    return pkg
+
+
+def test_tree_lists_children(package):
+    tree = prsvtree.PackageTree(package)
+
+    assert [x.name for x in tree.children()] == ["metadata", "objects"]
+
+
+def test_tree_walks_like_rglob(package):
+    tree = prsvtree.PackageTree(package)
+
+    assert sorted(x.path for x in tree.walk("objects")) == sorted(
+        (package / "objects").rglob("*")
+    )
+
+
+def test_tree_keeps_sizes(package):
+    tree = prsvtree.PackageTree(package)
+
+    sizes = {x.name: x.size for x in tree.files()}
+
+    assert sizes == {"file.txt": 10, "empty.txt": 0}
+
+
+def test_tree_relative_paths(package):
+    tree = prsvtree.PackageTree(package)
+
+    assert tree.is_dir("objects/folder")
+    assert tree.exists("objects/folder/file.txt")
+    assert not tree.exists("access")
+
+
+def test_tree_missing_folder_raises(package):
+    tree = prsvtree.PackageTree(package)
+
+    with pytest.raises(FileNotFoundError):
+        tree.children("access")
+
+
+def test_tree_tells_symlinked_folders_from_empty_ones(package, tmp_path):
+    (tmp_path / "empty").mkdir()
+    (package / "objects" / "link").symlink_to(package / "objects" / "folder")
+    (package / "objects" / "empty_link").symlink_to(tmp_path / "empty")
+    tree = prsvtree.PackageTree(package)
+
+    assert tree.entry("objects/link").is_symlink
+    assert not tree.is_empty("objects/link")
+    assert tree.is_empty("objects/empty_link")
+    assert tree.is_empty("metadata")
+    assert not tree.is_empty("objects/folder")
+
+
+def test_tree_walks_filesystem_once(package, mocker):
+    scandir = mocker.spy(prsvtree.os, "scandir")
+    tree = prsvtree.PackageTree(package)
+
+    tree.files()
+    tree.walk("objects")
+
+    assert scandir.call_count == 4
+
+
+def test_as_tree_reuses_tree(package):
+    tree = prsvtree.PackageTree(package)
+
+    assert prsvtree.as_tree(tree) is tree
+    assert prsvtree.as_tree(package).root == package
@@ -0,0 +1,495 @@
+import json
+from dataclasses import asdict
+
+import pytest
+
+import prsv_tools.ingest.validate_ingest as validate_ingest
+import prsv_tools.utility.api as prsvapi
+import prsv_tools.utility.cache as prsvcache
+
+# every Preservica request is mocked, nothing is looked up when this is collected
+
+test_digarch_uuid = "c0b9b47a-5552-4277-874e-092b3cc53af6"
+credentials = "test-ingest"
+collectionid = "M23385"
+version = "7.0"
+namespaces = {
+    "xip_ns": f"{{http://preservica.com/XIP/v{version}}}",
+    "entity_ns": f"{{http://preservica.com/EntityAPI/v{version}}}",
+    "spec_ns": "{http://nypl.org/prsv_schemas/specCollection}",
+    "fa_ns": "{http://nypl.org/prsv_schemas/findingAid}",
+}
+
+
+@pytest.fixture
+def valid_prsv_top():
+    return validate_ingest.prsv_Structural_Object(
+        uuid="70ecde98-d40e-4a6f-b5e4-dd6dda34443d",
+        title="M23385_ER_11",
+        type="soCategory",
+        securityTag="open",
+        soCategory="ERContainer",
+        mdFragments={"speccolID": "M23385"},
+        children={
+            "M23385_ER_11_contents": {
+                "objType": "SO",
+                "uuid": "70e2f9b8-10e7-4cc6-95cf-78755d03dfd7",
+            },
+            "M23385_ER_11_metadata": {
+                "objType": "SO",
+                "uuid": "d2bb302c-5e1b-477e-89ab-4436af786c53",
+            },
+        },
+    )
+
+
+@pytest.fixture
+def valid_prsv_contents_information_object():
+    return validate_ingest.prsv_Information_Object(
+        uuid="267bea1b-5f42-4c85-953c-c5127758df85",
+        title="angels logo.eps",
+        type="ioCategory",
+        securityTag="open",
+        ioCategory="ERElement",
+    )
+
+
+@pytest.fixture
+def source_er(tmp_path):
+    er_path = tmp_path / "M23385" / "M23385_ER_11"
+    contents_path = er_path / "objects" / "[root].12"
+    contents_path.mkdir(parents=True)
+    (contents_path / "HULBERT.BAK").touch()
+    (contents_path / "HULBERT").touch()
+    md_path = er_path / "metadata"
+    md_path.mkdir()
+    (md_path / "M23385_ER_11.tsv").touch()
+
+    return tmp_path
+
+
+def crawled_so(uuid: str, children: dict) -> validate_ingest.prsv_Structural_Object:
+    return validate_ingest.prsv_Structural_Object(
+        uuid, uuid, "soCategory", "open", "ERElement", None, children
+    )
+
+
+def crawled_io(uuid: str) -> validate_ingest.prsv_Information_Object:
+    return validate_ingest.prsv_Information_Object(
+        uuid, uuid, "ioCategory", "open", "ERElement"
+    )
+
+
+def test_get_contents_io_so_keeps_tree_order(mocker):
+    """test that the concurrent crawl returns elements depth-first,
+    like a serial walk of the tree"""
+    tree = {
+        "folder": crawled_so(
+            "folder",
+            {
+                "b": {"objType": "IO", "uuid": "b"},
+                "subfolder": {"objType": "SO", "uuid": "subfolder"},
+            },
+        ),
+        "subfolder": crawled_so("subfolder", {"c": {"objType": "IO", "uuid": "c"}}),
+    }
+    mocker.patch.object(
+        validate_ingest, "get_io", side_effect=lambda uuid, *args: crawled_io(uuid)
+    )
+    mocker.patch.object(
+        validate_ingest, "get_so", side_effect=lambda uuid, *args: tree[uuid]
+    )
+    contents = crawled_so(
+        "contents",
+        {
+            "a": {"objType": "IO", "uuid": "a"},
+            "folder": {"objType": "SO", "uuid": "folder"},
+            "d": {"objType": "IO", "uuid": "d"},
+        },
+    )
+
+    ios, sos = validate_ingest.get_contents_io_so(
+        contents, credentials, namespaces, workers=4
+    )
+
+    assert [io.uuid for io in ios] == ["a", "b", "c", "d"]
+    assert [so.uuid for so in sos] == ["folder", "subfolder"]
+
+
+def children_page(start: int, total: int, page_size: int) -> str:
+    ns = namespaces["entity_ns"][1:-1]
+    children = "".join(
+        f'<Child title="file{i}" ref="uuid{i}" type="IO">x</Child>'
+        for i in range(start, min(start + page_size, total))
+    )
+    next_link = "<Next>next</Next>" if start + page_size < total else ""
+    return (
+        f'<ChildrenResponse xmlns="{ns}"><Children>{children}</Children>'
+        f"<Paging>{next_link}<TotalResults>{total}</TotalResults></Paging>"
+        "</ChildrenResponse>"
+    )
+
+
+def test_get_so_children_fetches_all_pages(mocker):
+    mocker.patch.object(validate_ingest, "CHILDREN_PAGE_SIZE", 2)
+
+    def get_page(credentials, url):
+        start = int(url.split("start=")[1].split("&")[0])
+        return mocker.Mock(text=children_page(start, 5, 2))
+
+    get_api_results = mocker.patch.object(
+        validate_ingest, "get_api_results", side_effect=get_page
+    )
+
+    children = validate_ingest.get_so_children(credentials, "so", namespaces)
+
+    assert list(children) == [f"file{i}" for i in range(5)]
+    assert get_api_results.call_count == 3
+
+
+def search_hit(obj_id: str, title: str, identifier: str, parent: str) -> tuple:
+    metadata = [
+        {"name": "xip.title", "value": title},
+        {"name": "xip.identifier", "value": [identifier]},
+        {"name": "xip.securitytag", "value": "open"},
+        {"name": "xip.parent_ref", "value": parent},
+        {"name": "findingAid.faComponentId", "value": "M23385_ER_11"},
+        {"name": "findingAid.faCollectionId", "value": "M23385"},
+        {"name": "findingAid.erNumber", "value": "ER_11"},
+    ]
+    return obj_id, metadata
+
+
+@pytest.fixture
+def package_search_response(mocker):
+    hits = [
+        search_hit(
+            "sdb:SO|contents", "M23385_ER_11_contents", "soCategory ERContents", "top"
+        ),
+        search_hit(
+            "sdb:SO|metadata", "M23385_ER_11_metadata", "soCategory ERMetadata", "top"
+        ),
+        search_hit("sdb:SO|folder", "[root].12", "soCategory ERElement", "contents"),
+        search_hit("sdb:IO|file", "HULBERT", "ioCategory ERElement", "folder"),
+        search_hit(
+            "sdb:IO|report", "M23385_ER_11.tsv", "ioCategory FTK report", "metadata"
+        ),
+    ]
+    value = {
+        "objectIds": [obj_id for obj_id, _ in hits],
+        "metadata": [metadata for _, metadata in hits],
+    }
+    return mocker.Mock(text=json.dumps({"value": value}))
+
+
+def test_parse_search_entities(package_search_response):
+    entities = dict(
+        (entity.uuid, (entity, parent))
+        for entity, parent in validate_ingest.parse_search_entities(
+            package_search_response
+        )
+    )
+
+    contents, parent = entities["contents"]
+    assert parent == "top"
+    assert contents.type == "soCategory"
+    assert contents.soCategory == "ERContents"
+    assert contents.mdFragments == {
+        "faComponentId": "M23385_ER_11",
+        "faCollectionId": "M23385",
+        "erNumber": "ER_11",
+    }
+    assert entities["report"][0].ioCategory == "FTK report"
+
+
+def test_parse_search_entities_fills_in_fragments(package_search_response):
+    entities = dict(
+        (entity.uuid, entity)
+        for entity, _ in validate_ingest.parse_search_entities(package_search_response)
+    )
+
+    assert entities["folder"].mdFragments == {}
+    assert not validate_ingest.validate_mdfrag(entities["folder"], "erNumber", "ER_11")
+
+
+def test_validate_mdfrag_records_missing_fragments(valid_prsv_top):
+    valid_prsv_top.mdFragments = None
+
+    with validate_ingest.collect_check_results() as results:
+        validate_ingest.validate_mdfrag(valid_prsv_top, "speccolID", "M23385")
+
+    assert results[0]["check"] == "validate_mdfrag"
+    assert not results[0]["valid"]
+
+
+def test_search_package_is_one_request(mocker, package_search_response):
+    get_api_results = mocker.patch.object(
+        validate_ingest, "get_api_results", return_value=package_search_response
+    )
+    top = crawled_so("top", {})
+
+    entities = validate_ingest.search_package(top, credentials)
+    ios, sos = validate_ingest.collect_contents_io_so(entities["contents"], entities)
+
+    assert list(top.children) == ["M23385_ER_11_contents", "M23385_ER_11_metadata"]
+    assert [io.title for io in ios] == ["HULBERT"]
+    assert [so.title for so in sos] == ["[root].12"]
+    get_api_results.assert_called_once()
+
+
+def test_checks_are_recorded(valid_prsv_top):
+    with validate_ingest.collect_check_results() as results:
+        validate_ingest.valid_sectag(valid_prsv_top, "preservation")
+
+    assert results == [
+        {
+            "check": "valid_sectag",
+            "valid": False,
+            "uuid": valid_prsv_top.uuid,
+            "title": valid_prsv_top.title,
+            "messages": ["Security tag is not preservation, but open"],
+        }
+    ]
+
+
+def test_checks_are_not_recorded_outside_collection(valid_prsv_top):
+    assert validate_ingest.valid_sectag(valid_prsv_top, "open")
+
+
+def test_validate_collection_yields_results_in_package_order(
+    mocker, package_search_response, source_er
+):
+    mocker.patch.object(
+        validate_ingest, "search_within", return_value=package_search_response
+    )
+
+    def validate(uuid, top_level_so, collection_id):
+        return [{"check": "fake", "package": top_level_so.title}]
+
+    results = list(
+        validate_ingest.validate_collection(
+            collectionid, credentials, test_digarch_uuid, source_er, validate
+        )
+    )
+
+    assert results[0]["check"] == "ingest_has_correct_ER_number"
+    assert results[0]["collection"] == collectionid
+    assert [result["package"] for result in results[1:]] == [
+        "M23385_ER_11_contents",
+        "M23385_ER_11_metadata",
+        "[root].12",
+        "HULBERT",
+        "M23385_ER_11.tsv",
+    ]
+
+
+def test_validate_collection_continues_after_package_error(
+    mocker, package_search_response, source_er
+):
+    mocker.patch.object(
+        validate_ingest, "search_within", return_value=package_search_response
+    )
+
+    def validate(uuid, top_level_so, collection_id):
+        if top_level_so.title == "[root].12":
+            raise RuntimeError("worker died")
+        return [{"check": "fake", "package": top_level_so.title}]
+
+    results = list(
+        validate_ingest.validate_collection(
+            collectionid, credentials, test_digarch_uuid, source_er, validate
+        )
+    )
+
+    assert [result["package"] for result in results[1:]] == [
+        "M23385_ER_11_contents",
+        "M23385_ER_11_metadata",
+        "[root].12",
+        "HULBERT",
+        "M23385_ER_11.tsv",
+    ]
+    failed = results[3]
+    assert failed["check"] == "validate_package"
+    assert not failed["valid"]
+    assert failed["messages"] == ["RuntimeError: worker died"]
+
+
+def test_validate_package_uuid_records_error(mocker, valid_prsv_top, source_er):
+    mocker.patch.object(
+        validate_ingest, "search_package", side_effect=ValueError("bad xml")
+    )
+
+    results = validate_ingest.validate_package_uuid(
+        valid_prsv_top.uuid,
+        valid_prsv_top,
+        collectionid,
+        credentials,
+        namespaces,
+        source_er,
+        entity_api=False,
+        threads=1,
+    )
+
+    assert results == [
+        {
+            "check": "validate_package",
+            "valid": False,
+            "uuid": valid_prsv_top.uuid,
+            "title": valid_prsv_top.title,
+            "messages": ["ValueError: bad xml"],
+            "collection": collectionid,
+            "package": valid_prsv_top.title,
+        }
+    ]
+
+
+def test_report_keeps_info_messages_and_failed_collections(mocker, tmp_path, caplog):
+    report = tmp_path / "report.jsonl"
+    mocker.patch(
+        "sys.argv",
+        [
+            "validate_ingest",
+            "--credentials",
+            "test-ingest",
+            "--source",
+            str(tmp_path),
+            "--collectionID",
+            "M1234",
+            "M5678",
+            "--report",
+            str(report),
+        ],
+    )
+    mocker.patch.object(prsvapi, "get_namespaces", return_value=namespaces)
+    console = validate_ingest.logging.StreamHandler()
+    root = validate_ingest.logging.getLogger()
+    mocker.patch.object(
+        root, "handlers", [console, validate_ingest.CheckMessageHandler()]
+    )
+    caplog.set_level(validate_ingest.logging.INFO)
+
+    def validate_collection(collection_id, *args):
+        if collection_id == "M1234":
+            raise ConnectionError("search failed")
+        with validate_ingest.collect_check_results() as results:
+            validate_ingest.valid_contents_count(1, 0, 1, 0)
+        yield from results
+
+    mocker.patch.object(
+        validate_ingest, "validate_collection", side_effect=validate_collection
+    )
+
+    validate_ingest.main()
+
+    lines = [json.loads(line) for line in report.read_text().splitlines()]
+    assert lines[0]["check"] == "validate_collection"
+    assert lines[0]["collection"] == "M1234"
+    assert lines[1]["check"] == "valid_contents_count"
+    assert "IOs and SOs counts" in lines[1]["messages"][0]
+    assert console.level == validate_ingest.logging.WARNING
+    assert root.level == validate_ingest.logging.INFO
+
+
+def test_collection_ids_from_file(mocker, tmp_path):
+    collection_file = tmp_path / "collections.txt"
+    collection_file.write_text("M1234\n\nM5678\nM1234\n")
+    mocker.patch(
+        "sys.argv",
+        [
+            "validate_ingest",
+            "--credentials",
+            "test-ingest",
+            "--source",
+            str(tmp_path),
+            "--collectionID",
+            "M1234",
+            "--collection_file",
+            str(collection_file),
+        ],
+    )
+
+    args = validate_ingest.parse_args()
+
+    assert args.collection_ids == ["M1234", "M5678"]
+
+
+def test_get_io_uses_fresh_cache(
+    mocker, tmp_path, valid_prsv_contents_information_object
+):
+    cache = prsvcache.EntityCache(tmp_path)
+    io = valid_prsv_contents_information_object
+    cache.put(io.uuid, "io", asdict(io))
+    get_api_results = mocker.patch.object(validate_ingest, "get_api_results")
+
+    cached = validate_ingest.get_io(io.uuid, credentials, namespaces, cache)
+
+    assert asdict(cached) == asdict(io)
+    get_api_results.assert_not_called()
+
+
+def test_get_io_revalidates_stale_cache(
+    mocker, tmp_path, valid_prsv_contents_information_object
+):
+    cache = prsvcache.EntityCache(tmp_path, ttl=-1)
+    io = valid_prsv_contents_information_object
+    cache.put(io.uuid, "io", asdict(io))
+    get_api_results = mocker.patch.object(
+        validate_ingest, "get_api_results", return_value=mocker.Mock(status_code=304)
+    )
+
+    cached = validate_ingest.get_io(io.uuid, credentials, namespaces, cache)
+
+    assert asdict(cached) == asdict(io)
+    headers = get_api_results.call_args.args[2]
+    assert "If-Modified-Since" in headers
+
+
+def test_cache_dir_requires_entity_api(mocker, tmp_path):
+    mocker.patch(
+        "sys.argv",
+        [
+            "validate_ingest",
+            "--credentials",
+            "test-ingest",
+            "--source",
+            str(tmp_path),
+            "--collectionID",
+            "M1234",
+            "--cache_dir",
+            str(tmp_path),
+        ],
+    )
+
+    with pytest.raises(SystemExit):
+        validate_ingest.parse_args()
+
+
+def test_cached_entities_are_revalidated_by_default(
+    mocker, tmp_path, valid_prsv_contents_information_object
+):
+    mocker.patch(
+        "sys.argv",
+        [
+            "validate_ingest",
+            "--credentials",
+            "test-ingest",
+            "--source",
+            str(tmp_path),
+            "--collectionID",
+            "M1234",
+            "--entity_api",
+            "--cache_dir",
+            str(tmp_path),
+        ],
+    )
+    args = validate_ingest.parse_args()
+    cache = prsvcache.EntityCache(args.cache_dir, args.cache_ttl)
+    io = valid_prsv_contents_information_object
+    cache.put(io.uuid, "io", asdict(io))
+    get_api_results = mocker.patch.object(
+        validate_ingest, "get_api_results", return_value=mocker.Mock(status_code=304)
+    )
+
+    validate_ingest.get_io(io.uuid, credentials, namespaces, cache)
+
+    assert "If-Modified-Since" in get_api_results.call_args.args[2]
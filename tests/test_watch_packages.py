@@ -0,0 +1,156 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import prsv_tools.ingest.lint_er as lint_er
+import prsv_tools.ingest.watch_packages as watch
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def staging(tmp_path: Path):
+    staging = tmp_path / "staging"
+    pkg = staging / "M12345_ER_0001"
+    (pkg / "objects").mkdir(parents=True)
+    (pkg / "objects" / "file.txt").write_bytes(b"some bytes")
+    (pkg / "metadata").mkdir()
+    (pkg / "metadata" / "M12345_ER_0001.csv").write_bytes(b"some bytes")
+    return staging
+
+
+def test_package_is_ready_after_quiet_period(staging: Path):
+    clock = Clock()
+    watcher = watch.PackageWatcher([staging], quiet_period=60, clock=clock)
+
+    assert watcher.poll() == []
+    clock.now = 30
+    assert watcher.poll() == []
+    clock.now = 60
+    assert watcher.poll() == [staging / "M12345_ER_0001"]
+
+
+def test_changing_package_is_not_ready(staging: Path):
+    clock = Clock()
+    watcher = watch.PackageWatcher([staging], quiet_period=60, clock=clock)
+    watcher.poll()
+
+    clock.now = 60
+    (staging / "M12345_ER_0001" / "objects" / "more.txt").write_bytes(b"more")
+    assert watcher.poll() == []
+
+    clock.now = 120
+    assert watcher.poll() == [staging / "M12345_ER_0001"]
+
+
+def test_package_is_linted_once_until_it_changes(staging: Path):
+    clock = Clock()
+    watcher = watch.PackageWatcher([staging], quiet_period=0, clock=clock)
+    watcher.poll()
+
+    results = watch.lint_ready(watcher, lint_er)
+    assert [x.verdict for x in results] == ["valid"]
+    assert watch.lint_ready(watcher, lint_er) == []
+
+    (staging / "M12345_ER_0001" / "objects" / "empty.txt").touch()
+    watcher.poll()
+    results = watch.lint_ready(watcher, lint_er)
+    assert results[0].failed_checks == ["package_has_no_zero_bytes_file"]
+
+
+def test_linted_package_is_not_walked_until_its_top_level_changes(
+    staging: Path, monkeypatch
+):
+    clock = Clock()
+    watcher = watch.PackageWatcher([staging], quiet_period=0, clock=clock)
+    watcher.poll()
+    watch.lint_ready(watcher, lint_er)
+
+    walked = []
+    fingerprint = watch.prsvlint.fingerprint
+    monkeypatch.setattr(
+        watch.prsvlint,
+        "fingerprint",
+        lambda tree: walked.append(tree.root) or fingerprint(tree),
+    )
+    assert watcher.poll() == []
+    assert walked == []
+
+    pkg = staging / "M12345_ER_0001"
+    os.utime(pkg / "metadata", ns=(0, 0))
+    assert watcher.poll() == []
+    assert walked == [pkg]
+
+    # unchanged content, so it is not walked again
+    assert watcher.poll() == []
+    assert walked == [pkg]
+
+
+def test_destination_requires_ami(staging: Path, monkeypatch):
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script",
+            "--watch",
+            str(staging),
+            "--type",
+            "er",
+            "--destination",
+            str(staging),
+        ],
+    )
+
+    with pytest.raises(SystemExit):
+        watch.parse_args()
+
+
+def test_file_deleted_during_walk_restarts_quiet_period(staging: Path, monkeypatch):
+    clock = Clock()
+    watcher = watch.PackageWatcher([staging], quiet_period=60, clock=clock)
+    watcher.poll()
+    scandir = os.scandir
+    file = staging / "M12345_ER_0001" / "objects" / "file.txt"
+
+    class DeletingScandir:
+        # list the folder, then delete a file before its entry is stat'ed
+        def __init__(self, path):
+            self.it = scandir(path)
+            self.entries = list(self.it)
+            if Path(path) == file.parent and file.exists():
+                file.unlink()
+
+        def __enter__(self):
+            return iter(self.entries)
+
+        def __exit__(self, *args):
+            self.it.close()
+
+    monkeypatch.setattr(os, "scandir", DeletingScandir)
+    clock.now = 60
+    assert watcher.poll() == []
+    monkeypatch.setattr(os, "scandir", scandir)
+
+    clock.now = 100
+    assert watcher.poll() == []
+    clock.now = 160
+    assert watcher.poll() == [staging / "M12345_ER_0001"]
+
+
+def test_main_keeps_watching_after_an_error(staging: Path, monkeypatch, mocker):
+    monkeypatch.setattr("sys.argv", ["script", "--watch", str(staging), "--type", "er"])
+    lint_ready = mocker.patch.object(
+        watch, "lint_ready", side_effect=[OSError("mid copy"), []]
+    )
+    mocker.patch.object(watch.time, "sleep", side_effect=[None, KeyboardInterrupt])
+
+    with pytest.raises(KeyboardInterrupt):
+        watch.main()
+
+    assert lint_ready.call_count == 2